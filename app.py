@@ -1,31 +1,302 @@
 #This is the EOSCA API running on Flask.
 
 #Importing pip libraries
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, g
 import sys
+import os
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
 from flask_cors import CORS
 
 #Importing classes from model directory
 from models.DBConnection import DBRead, DBWrite, DBConnTest
 from models.RiskAssessment import CollisionRiskAssessor
 from models.SpaceObjects import  SatelliteElement
+from models.CZMLCache import CZMLCache
+from models.JobQueue import JobQueue
+from models.ResultCache import ResultCache
+from models.PayloadCache import PayloadCache
+from models.CatalogSearch import FIELDS
+from models.EphemerisStore import EphemerisStore, OpenEphemerisStore, LoadCatalog
+from models.Metrics import Registry, Observe, Timed, RequestProfile
 
 #Function definition for refreshing telemetry
-def refreshTelemetry():
+@Timed()
+def refreshTelemetry(full=False):
 
-    #Recreate the telemetry table
-    DBWriteConnection.ClearSpaceObjectTelemetry()
-    DBWriteConnection.CopySpaceObjectTelemetry()
-    
+    if full:
+        #Recreate the telemetry table
+        GetDBWriteConnection().ClearSpaceObjectTelemetry()
+        GetDBWriteConnection().CopySpaceObjectTelemetry()
+    else:
+        #Upsert only the objects that changed since the last refresh
+        GetDBWriteConnection().SyncSpaceObjectTelemetry()
+
+    #Serve the new catalog from this process straight away instead of waiting for the next cache probe
+    DBReadConnection.CheckReplica(force=True)
+    DBReadConnection.cache.Invalidate()
+
+    #Results are keyed by catalog version, the ones for the old version will not be asked for again
+    AssessmentResults.Clear()
+
+    #Publish the new catalog version to the workers and precompute its ephemerides in the background
+    GetEphemeris(GetCatalogKey())
+
+    #Rebuild the CZML of the most viewed satellites for the new element sets in the background
+    threading.Thread(target=PrewarmCZML, daemon=True).start()
+
+#Function definition for the write connection. With lazystartup=1 it is only opened when the first refresh runs.
+def GetDBWriteConnection():
+
+    global DBWriteConnection
+
+    with DBWriteLock:
+        if DBWriteConnection is None:
+            DBWriteConnection = DBWrite()
+
+    return DBWriteConnection
+
+#Function definition for pre-warming the CZML cache with the most requested satellites
+def PrewarmCZML():
+
+    def GetSatelliteElement(SatelliteID):
+        SatelliteTLE = DBReadConnection.GetSatelliteTLE(SatelliteID)
+        return SatelliteElement(SatelliteTLE) if SatelliteTLE else None
+
+    CZMLPacketCache.Prewarm(GetSatelliteElement, int(os.getenv('czmlprewarmcount', 50)), datetime.now(timezone.utc), OpenEphemerisStore(GetCatalogKey()))
+
+#Function definition for the current catalog version. The first call for a version publishes its TLEs for the worker pool.
+@Timed()
+def GetCatalogKey():
+
+    CatalogKey = EphemerisStore.GetVersionKey(DBReadConnection.GetCatalogVersion())
+
+    if not EphemerisBuilder.IsCatalogPublished(CatalogKey):
+        EphemerisBuilder.PublishCatalog(CatalogKey, DBReadConnection.GetAllTLEs())
+
+    return CatalogKey
+
+#Function definition for the precomputed ephemerides of a catalog version. Returns None (and starts building them) if they are not ready yet.
+def GetEphemeris(CatalogKey):
+
+    Ephemeris = OpenEphemerisStore(CatalogKey)
+
+    if Ephemeris is None:
+        EphemerisBuilder.BuildInBackground(CatalogKey, lambda: LoadCatalog(CatalogKey))
+
+    return Ephemeris
+
+#Function definition for the risk assessment against every debris object in the satellite's altitude band.
+#Progress, if given, is called with (objects processed, total objects) as the assessment goes.
+@Timed()
+def RunRiskAssessment(SatelliteID, TimeInterval=1, MaxResults=50, Progress=None):
+
+    #Read the TLE data from the database for the chosen satellite
+    SatelliteTLE = DBReadConnection.GetSatelliteTLE(SatelliteID)
+
+    #Initiate the RiskAssessor Object, keeping the MaxResults closest debris
+    RiskAssessor = CollisionRiskAssessor() 
+    RiskAssessor.max_results = MaxResults
+
+    #Read the TLE data from the database for the Debris objects whose orbital shell overlaps the satellite's
+    LowerAltitude, UpperAltitude = RiskAssessor.GetAltitudeBand(SatelliteTLE)
+    DebrisTLEs = DBReadConnection.GetDebrisTLEsInAltitudeBand(LowerAltitude, UpperAltitude)
+
+    #The same TLEs, keyed by ObjectID, are carried through to the CZML instead of being read again
+    DebrisTLEsByID = {DebrisTLE[0]: DebrisTLE for DebrisTLE in DebrisTLEs}
+
+    #Initiate the SatelliteObject
+    SatelliteObject = SatelliteElement(SatelliteTLE)
+
+    #Current catalog version and its precomputed ephemerides, if they have been built
+    CatalogKey = GetCatalogKey()
+    Ephemeris = GetEphemeris(CatalogKey)
+
+    #Retrieve risk assessment results between the satellite and all of the debris
+    RiskAssessments = RiskAssessor.AssessCollisionRiskParallel(SatelliteTLE, DebrisTLEs, TimeInterval=TimeInterval, Ephemeris=Ephemeris, CatalogKey=CatalogKey, Progress=Progress)
+
+    #Convert risk assessment results to JSON
+    RiskAssessmentsJSON = RiskAssessor.GetAssessmentJSON(RiskAssessments)
+
+    #Get the updated CZML after the risk assessment with the top 50 debris objects and the satellite
+    UpdatedCZML = RiskAssessor.UpdateCZMLPostAssessment(DebrisTLEsByID, SatelliteObject, RiskAssessmentsJSON, RiskAssessor.start_time, Ephemeris, CZMLPacketCache)
+
+    return RiskAssessmentsJSON, UpdatedCZML
+
+#Function definition for the refined risk assessment against a list of selected debris objects
+@Timed()
+def RunRefineAssessment(SatelliteID, DebrisIDs, TimeInterval=1, MaxResults=50, Progress=None):
+
+    #Read the TLE data from the database for the chosen satellite
+    SatelliteTLE = DBReadConnection.GetSatelliteTLE(SatelliteID)
+
+    #Retrieve Debris TLEs in one batch, keyed by ObjectID. IDs that are not in the catalog are skipped.
+    DebrisTLEsByID = DBReadConnection.GetTLEsForObjects(DebrisIDs)
+    DebrisTLEs = [DebrisTLEsByID[DebrisID] for DebrisID in DebrisIDs if DebrisID in DebrisTLEsByID]
+
+    #Initiate the RiskAssessor Object. Every local minimum of the coarse scan is refined to sub-second precision by the closest approach solver.
+    RiskAssessor = CollisionRiskAssessor() 
+    RiskAssessor.max_results = MaxResults
+
+    #Current catalog version and its precomputed ephemerides, if they have been built
+    CatalogKey = GetCatalogKey()
+    Ephemeris = GetEphemeris(CatalogKey)
+
+    #Retrieve enhanced risk assessment results between the satellite and all of the selected debris
+    RiskAssessments = RiskAssessor.AssessCollisionRiskParallel(SatelliteTLE, DebrisTLEs, TimeInterval=TimeInterval, Ephemeris=Ephemeris, CatalogKey=CatalogKey, Progress=Progress)
+
+    #Convert risk assessment results to JSON
+    RiskAssessmentsJSON = RiskAssessor.GetAssessmentJSON(RiskAssessments)
+
+    #Initiate the SatelliteObject
+    SatelliteObject = SatelliteElement(SatelliteTLE)
+
+    #Get the updated CZML after the risk assessment with the top 50 debris objects and the satellite
+    UpdatedCZML = RiskAssessor.UpdateCZMLPostAssessment(DebrisTLEsByID, SatelliteObject, RiskAssessmentsJSON, RiskAssessor.start_time, Ephemeris, CZMLPacketCache)
+
+    return RiskAssessmentsJSON, UpdatedCZML
+
+#Function definition for the risk assessment of a whole fleet. The debris in the altitude bands of all the satellites are read and propagated once,
+#and every satellite is assessed against them in the same pass. Returns (SatelliteID, RiskAssessmentsJSON, UpdatedCZML or None) per known satellite
+#and the IDs that are not in the catalog.
+@Timed()
+def RunFleetAssessment(SatelliteIDs, TimeInterval=1, MaxResults=50, IncludeCZML=False, Progress=None):
+
+    #Read the TLE data of the whole fleet in one batch
+    SatelliteTLEsByID = DBReadConnection.GetTLEsForObjects(SatelliteIDs)
+    KnownIDs = [SatelliteID for SatelliteID in SatelliteIDs if SatelliteID in SatelliteTLEsByID]
+    UnknownIDs = [SatelliteID for SatelliteID in SatelliteIDs if SatelliteID not in SatelliteTLEsByID]
+    SatelliteTLEs = [SatelliteTLEsByID[SatelliteID] for SatelliteID in KnownIDs]
+
+    if not SatelliteTLEs:
+        return [], UnknownIDs
+
+    #Initiate the RiskAssessor Object, keeping the MaxResults closest debris of each satellite
+    RiskAssessor = CollisionRiskAssessor()
+    RiskAssessor.max_results = MaxResults
+
+    #Read the Debris TLEs once for the band covering every satellite's altitude band
+    LowerAltitude, UpperAltitude = RiskAssessor.GetFleetAltitudeBand(SatelliteTLEs)
+    DebrisTLEs = DBReadConnection.GetDebrisTLEsInAltitudeBand(LowerAltitude, UpperAltitude)
+    DebrisTLEsByID = {DebrisTLE[0]: DebrisTLE for DebrisTLE in DebrisTLEs}
+
+    #Current catalog version and its precomputed ephemerides, if they have been built
+    CatalogKey = GetCatalogKey()
+    Ephemeris = GetEphemeris(CatalogKey)
+
+    FleetAssessments = RiskAssessor.AssessFleetRiskParallel(SatelliteTLEs, DebrisTLEs, TimeInterval=TimeInterval, Ephemeris=Ephemeris, CatalogKey=CatalogKey, Progress=Progress)
+
+    Results = []
+    for SatelliteTLE, RiskAssessments in zip(SatelliteTLEs, FleetAssessments):
+
+        RiskAssessmentsJSON = RiskAssessor.GetAssessmentJSON(RiskAssessments)
+
+        #The CZML of every satellite's scene is optional, building it costs far more than the tables for a large fleet
+        UpdatedCZML = None
+        if IncludeCZML:
+            UpdatedCZML = RiskAssessor.UpdateCZMLPostAssessment(DebrisTLEsByID, SatelliteElement(SatelliteTLE), RiskAssessmentsJSON, RiskAssessor.start_time, Ephemeris, CZMLPacketCache)
+
+        Results.append((SatelliteTLE[0], RiskAssessmentsJSON, UpdatedCZML))
+
+    return Results, UnknownIDs
+
+#Function definitions for cached assessments. Identical requests against the same catalog version in the same time bucket
+#share one result, and requests that arrive while it is being computed wait for it instead of computing it again.
+def GetRiskAssessment(SatelliteID, TimeInterval=1, MaxResults=50, Progress=None):
+
+    Key = AssessmentResults.GetKey("riskassessment", SatelliteID, GetCatalogKey(), TimeInterval, MaxResults)
+
+    return AssessmentResults.GetOrCompute(Key, lambda: RunRiskAssessment(SatelliteID, TimeInterval, MaxResults, Progress))
+
+def GetRefineAssessment(SatelliteID, DebrisIDs, TimeInterval=1, MaxResults=50, Progress=None):
+
+    Key = AssessmentResults.GetKey("reassessment", SatelliteID, GetCatalogKey(), TimeInterval, MaxResults, tuple(sorted(DebrisIDs)))
+
+    return AssessmentResults.GetOrCompute(Key, lambda: RunRefineAssessment(SatelliteID, DebrisIDs, TimeInterval, MaxResults, Progress))
+
+def GetFleetAssessment(SatelliteIDs, TimeInterval=1, MaxResults=50, IncludeCZML=False, Progress=None):
+
+    Key = AssessmentResults.GetKey("fleetassessment", tuple(sorted(SatelliteIDs)), GetCatalogKey(), TimeInterval, MaxResults, IncludeCZML)
+
+    return AssessmentResults.GetOrCompute(Key, lambda: RunFleetAssessment(SatelliteIDs, TimeInterval, MaxResults, IncludeCZML, Progress))
+
+#Function definition for the catalog listings. They only change at refresh, so the JSON is serialized and compressed once per catalog version
+#and every later request is answered from the stored bytes, or with a 304 when the client still holds the current version.
+def GetListingResponse(Name, GetRows):
+
+    Payload = ListingPayloads.GetPayload(Name, DBReadConnection.GetCatalogVersion(), lambda: json.dumps(GetRows()).encode())
+
+    if Payload.IsNotModified(request.if_none_match):
+        response = Response(status=304)
+    else:
+        Encoding = Payload.GetEncoding(request.accept_encodings)
+        response = Response(Payload.encodings[Encoding], mimetype='application/json')
+        if Encoding != "identity":
+            response.headers['Content-Encoding'] = Encoding
+
+    #Clients keep the listing but revalidate it, the answer is a 304 until the next refresh
+    response.set_etag(Payload.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+
+    return response
+
+#Positive integer request parameter (k, interval) no larger than Maximum. Raises ValueError with the message for the 400 response.
+def GetIntegerParameter(Parameters, Name, Default, Maximum):
+
+    try:
+        Value = int(str(Parameters.get(Name, Default)))
+    except ValueError:
+        raise ValueError("%s must be an integer" % Name)
+
+    if not 1 <= Value <= Maximum:
+        raise ValueError("%s must be between 1 and %d" % (Name, Maximum))
+
+    return Value
+
+#Function definition for the risk assessment response body. The CZML is already serialized, so it is spliced into the JSON as is.
+@Timed()
+def GetAssessmentBody(RiskAssessmentsJSON, UpdatedCZML):
+
+    return b'{"risk_assessment_tabledata": ' + json.dumps(RiskAssessmentsJSON).encode() + b', "updated_czml": ' + UpdatedCZML + b'}'
+
+
+#Function definition for the fleet assessment response body: the table (and CZML, when it was built) of every satellite, and the unknown IDs
+@Timed()
+def GetFleetAssessmentBody(Results, UnknownIDs):
+
+    Satellites = []
+    for SatelliteID, RiskAssessmentsJSON, UpdatedCZML in Results:
+        Satellites.append(b'{"satellite_id": ' + json.dumps(SatelliteID).encode() + b', "risk_assessment_tabledata": ' + json.dumps(RiskAssessmentsJSON).encode()
+                          + (b', "updated_czml": ' + UpdatedCZML if UpdatedCZML is not None else b'') + b'}')
+
+    return b'{"satellites": [' + b', '.join(Satellites) + b'], "unknown_satellites": ' + json.dumps(UnknownIDs).encode() + b'}'
 
 #Initializing Flask instance
 app = Flask(__name__)
 CORS(app)
 
+#Lazy startup: nothing waits on the database at import. The read pool fills in the background, the write connection
+#is opened by the first refresh and /readiness/ reports when the database can be reached.
+LazyStartup = os.getenv('lazystartup', '0') == '1'
+
 #Instantiating Database Write & Read Connections
 DBReadConnection = DBRead()
-DBWriteConnection = DBWrite()
+DBWriteConnection = None if LazyStartup else DBWrite()
+DBWriteLock = threading.Lock()
 DBConnectionTest = DBConnTest()
+EphemerisBuilder = EphemerisStore()
+CZMLPacketCache = CZMLCache()
+AssessmentJobs = JobQueue()
+AssessmentResults = ResultCache()
+ListingPayloads = PayloadCache()
+MaxPageSize = int(os.getenv('maxpagesize', 500))
+MaxFleetSize = int(os.getenv('maxfleetsize', 500))
+MaxResultCount = int(os.getenv('maxresults', 500))
+MaxTimeInterval = int(os.getenv('maxinterval', 60))
 
 runrefreshflag = 0 #ONLY CHANGE TO 1 IF REFRESHING THE TELEMETRY IS REQUIRED. IF THIS WAS HOSTED ON A WEB SERVER, AUTOMATION WOULD BE IN PLACE TO REFRESH TELEMETRY EVERY 24 HOURS
 
@@ -33,6 +304,37 @@ if(runrefreshflag==1):
 
     refreshTelemetry()
 
+#Per-request metrics. Profiling is opt-in twice: the requestprofiling env var allows it and the request asks for it with an
+#X-Profile header, "timing" for a Server-Timing breakdown of the stages or "cprofile" to also dump a cProfile file to profiledir.
+RequestProfiling = os.getenv('requestprofiling', '0') == '1'
+ProfileDirectory = os.getenv('profiledir', 'profiles')
+
+@app.before_request
+def StartRequestMetrics():
+
+    g.request_start = time.perf_counter()
+    g.request_profile = None
+
+    ProfileMode = request.headers.get('X-Profile')
+    if RequestProfiling and ProfileMode in ('timing', 'cprofile'):
+        g.request_profile = RequestProfile(use_cprofile=ProfileMode == 'cprofile')
+
+@app.after_request
+def RecordRequestMetrics(response):
+
+    #Routes rather than raw paths keep the label set small, e.g. /jobs/<job_id>
+    Endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    Observe("eosca_request_seconds", time.perf_counter() - g.request_start, endpoint=Endpoint, method=request.method, status=response.status_code)
+
+    Profile = g.request_profile
+    if Profile is not None:
+        Profile.Finish()
+        response.headers['Server-Timing'] = Profile.GetServerTiming()
+        if Profile.profiler is not None:
+            response.headers['X-Profile-File'] = Profile.Dump(ProfileDirectory, request.endpoint or 'unmatched')
+
+    return response
+
 #App routes
 
 @app.route("/", methods=['GET'])
@@ -44,6 +346,36 @@ def home():
 def HealthCheck():
     return jsonify({'message': "I'm up and running :)"})
 
+@app.route("/readiness/", methods=['GET'])
+
+def Readiness(): #Unlike /healthcheck/ (the process is up), ready means requests that read the database can be served
+
+    Ready, Reason = DBReadConnection.CheckReadiness()
+
+    if not Ready:
+        return jsonify({'ready': False, 'message': Reason}), 503
+
+    return jsonify({'ready': True, 'pool': DBReadConnection.pool.GetStats()})
+
+@app.route("/metrics", methods=['GET'])
+
+def GetMetrics(): #Latency histograms and sgp4 counters in the Prometheus text format, with the pool and cache statistics as gauges
+
+    DBPoolStats = DBReadConnection.pool.GetStats()
+    ResultCacheStats = AssessmentResults.GetStats()
+    JobStats = AssessmentJobs.GetStats()
+
+    Gauges = {
+        "eosca_db_pool_connections": ("Open pooled database connections.", DBPoolStats["size"]),
+        "eosca_db_pool_in_use": ("Pooled database connections in use.", DBPoolStats["in_use"]),
+        "eosca_result_cache_entries": ("Assessment results held by the result cache.", ResultCacheStats["results"]),
+        "eosca_result_cache_in_flight": ("Assessments being computed for the result cache.", ResultCacheStats["in_flight"]),
+        "eosca_jobs_queued": ("Assessment jobs waiting for a runner.", JobStats["queued"]),
+        "eosca_jobs_running": ("Assessment jobs being run.", JobStats["running"])
+    }
+
+    return Response(Registry.GetPrometheusText(Gauges), mimetype='text/plain; version=0.0.4')
+
 @app.route("/refresh/status", methods=['GET'])
 
 def GetRefreshStatus():
@@ -69,9 +401,34 @@ def GetLastRefresh():
 
 def GetSatellites():
 
-    Satellites = DBReadConnection.GetSatellites() #Get a list of all satellites
+    return GetListingResponse("satellites", DBReadConnection.GetSatellites) #Get a list of all satellites
+
+@app.route('/objects/list', methods = ['GET'])
+
+def SearchObjects(): #One page of the catalog listing, searched, filtered and projected on the server for pickers and typeahead
+
+    #q searches OBJECT_NAME, OBJECT_ID and NORAD_CAT_ID by prefix (match=substring for anywhere in them), type filters by OBJECT_TYPE
+    #(comma separated), minalt and maxalt by altitude band in km, fields picks the keys of every item and cursor is the next_cursor of the previous page
+    Fields = request.args.get('fields', 'ObjectID,ObjectName').split(',')
+    ObjectTypes = [ObjectType for ObjectType in request.args.get('type', '').split(',') if ObjectType]
 
-    return jsonify(Satellites)
+    if any(Field not in FIELDS for Field in Fields):
+        return jsonify({'message': "fields must be among " + ", ".join(FIELDS)}), 400
+
+    try:
+        Limit = int(request.args.get('limit', 20))
+        MinAltitude = float(request.args['minalt']) if 'minalt' in request.args else None
+        MaxAltitude = float(request.args['maxalt']) if 'maxalt' in request.args else None
+    except ValueError:
+        return jsonify({'message': "limit, minalt and maxalt must be numbers"}), 400
+
+    if not 1 <= Limit <= MaxPageSize:
+        return jsonify({'message': "limit must be between 1 and %d" % MaxPageSize}), 400
+
+    Items, NextCursor, Total = DBReadConnection.GetSearchIndex().Search(request.args.get('q', ''), request.args.get('match') == 'substring', ObjectTypes,
+                                                                        MinAltitude, MaxAltitude, Fields, Limit, request.args.get('cursor'))
+
+    return jsonify({'items': Items, 'next_cursor': NextCursor, 'total': Total})
 
 @app.route('/satellite/ephemeris',methods = ['POST'])
 
@@ -86,15 +443,17 @@ def SatelliteEphemeris(): #Retrieves ephemeris in CZML format for the chosen sat
     #Create a SatelliteElement object for the satellite using the TLE data that is retrieved
     SatelliteObject = SatelliteElement(SatelliteTLE)
 
-    return SatelliteObject.GetCZMLString()
+    #Count the view, so popular satellites are pre-warmed after the next refresh
+    CZMLPacketCache.RecordRequest(SatelliteID)
+
+    #The scene starts now, like the window of an assessment made now
+    return Response(SatelliteObject.GetCZMLString(datetime.now(timezone.utc), GetEphemeris(GetCatalogKey()), CZMLPacketCache), mimetype='application/json')
 
 @app.route('/debris/list', methods = ['GET'])
 
 def GetDebris():
 
-    debris = DBReadConnection.GetDebris() #Get a list of all the Debris
-
-    return jsonify(debris)
+    return GetListingResponse("debris", DBReadConnection.GetDebris) #Get a list of all the Debris
 
 @app.route('/satellite/riskassessment',methods = ['POST'])
 
@@ -103,35 +462,25 @@ def RiskAssessment():
     #Get the satellite id from frontend
     SatelliteID = request.form['satid']
 
-    #Read the TLE data from the database for the chosen satellite
-    SatelliteTLE = DBReadConnection.GetSatelliteTLE(SatelliteID)
-
-    #Read the TLE data from the database for all of the Debris objects
-    DebrisTLEs = DBReadConnection.GetDebrisTLEs()
-
-    #Initiate the SatelliteObject
-    SatelliteObject = SatelliteElement(SatelliteTLE)
-
-    #Initiate the RiskAssessor Object
-    RiskAssessor = CollisionRiskAssessor() 
+    try:
+        MaxResults = GetIntegerParameter(request.form, 'k', 50, MaxResultCount)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-    #Retrieve risk assessment results between the satellite and all of the debris
-    RiskAssessments = RiskAssessor.AssessCollisionRiskParallel(SatelliteTLE, DebrisTLEs, TimeInterval=1)
+    #Run the assessment against the debris in the satellite's altitude band
+    RiskAssessmentsJSON, UpdatedCZML = GetRiskAssessment(SatelliteID, MaxResults=MaxResults)
 
-    #Convert risk assessment results to JSON
-    RiskAssessmentsJSON = RiskAssessor.GetAssessmentJSON(RiskAssessments)
+    #Create a nested JSON for the response
+    return Response(GetAssessmentBody(RiskAssessmentsJSON, UpdatedCZML), mimetype='application/json')
 
-    #Get the updated CZML after the risk assessment with the top 50 debris objects and the satellite
-    UpdatedCZML = RiskAssessor.UpdateCZMLPostAssessment(DBReadConnection, SatelliteObject, RiskAssessmentsJSON)
+@app.route('/satellite/conjunctions',methods = ['POST'])
 
-    #Create a nested JSON for the response
-    RiskAssessmentResponse = {
+def GetConjunctions(): #Conjunctions of the chosen satellite found by the last catalog-wide screening run (screening.py)
 
-        "risk_assessment_tabledata": RiskAssessmentsJSON,
-        "updated_czml": UpdatedCZML
-    }
+    #Get the satellite id from frontend
+    SatelliteID = request.form['satid']
 
-    return jsonify(RiskAssessmentResponse)
+    return jsonify(DBReadConnection.GetConjunctions(SatelliteID))
 
 @app.route('/reassess/debris',methods = ['POST'])
 
@@ -140,50 +489,155 @@ def RefineAssessment():
     #Get the ObjectIDs from frontend
     ObjectIDs = request.get_json()
 
-    OneSecondInterval = 0.0167
+    try:
+        MaxResults = GetIntegerParameter(ObjectIDs, 'k', 50, MaxResultCount)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-    #Read the TLE data from the database for the chosen satellite
-    SatelliteTLE = DBReadConnection.GetSatelliteTLE(ObjectIDs['SatelliteID'])
+    #Run the refined assessment against the selected debris
+    RiskAssessmentsJSON, UpdatedCZML = GetRefineAssessment(ObjectIDs['SatelliteID'], ObjectIDs['DebrisIDs'], MaxResults=MaxResults)
 
-    #Retrieve Debris TLEs
-    DebrisTLEs = []
-    for DebrisID in ObjectIDs['DebrisIDs']:
-      DebrisTLEObject = DBReadConnection.GetDebrisTLEForObject(DebrisID)
-      DebrisTLEs.append(DebrisTLEObject)
+    #Create a nested JSON for the response
+    return Response(GetAssessmentBody(RiskAssessmentsJSON, UpdatedCZML), mimetype='application/json')
 
-    #Initiate the RiskAssessor Object
-    RiskAssessor = CollisionRiskAssessor() 
+@app.route('/fleet/riskassessment',methods = ['POST'])
 
-    #Retrieve enhanced risk assessment results between the satellite and all of the debris for 1 second intervals
-    RiskAssessments = RiskAssessor.AssessCollisionRiskParallel(SatelliteTLE, DebrisTLEs, TimeInterval=OneSecondInterval)
+def FleetRiskAssessment(): #Assesses a list of satellites against the debris catalog in one pass, with a top k table per satellite
 
-    #Convert risk assessment results to JSON
-    RiskAssessmentsJSON = RiskAssessor.GetAssessmentJSON(RiskAssessments)
+    #Parameters come as JSON: satids, optionally interval (coarse step in minutes), k (number of closest debris kept per satellite) and czml
+    Parameters = request.get_json(silent=True) or {}
+    SatelliteIDs = Parameters.get('satids')
 
-    #Initiate the SatelliteObject
-    SatelliteObject = SatelliteElement(SatelliteTLE)
+    if not isinstance(SatelliteIDs, list) or not SatelliteIDs:
+        return jsonify({'message': "satids must be a non-empty list"}), 400
 
-    #Get the updated CZML after the risk assessment with the top 50 debris objects and the satellite
-    UpdatedCZML = RiskAssessor.UpdateCZMLPostAssessment(DBReadConnection, SatelliteObject, RiskAssessmentsJSON)
+    if len(SatelliteIDs) > MaxFleetSize:
+        return jsonify({'message': "At most %d satellites can be assessed at once." % MaxFleetSize}), 400
 
-    #Create a nested JSON for the response
-    RiskAssessmentResponse = {
+    try:
+        TimeInterval = GetIntegerParameter(Parameters, 'interval', 1, MaxTimeInterval)
+        MaxResults = GetIntegerParameter(Parameters, 'k', 50, MaxResultCount)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
 
-        "risk_assessment_tabledata": RiskAssessmentsJSON,
-        "updated_czml": UpdatedCZML
-    }
+    SatelliteIDs = list(dict.fromkeys(str(SatelliteID) for SatelliteID in SatelliteIDs))
+    Results, UnknownIDs = GetFleetAssessment(SatelliteIDs, TimeInterval, MaxResults, bool(Parameters.get('czml', False)))
+
+    return Response(GetFleetAssessmentBody(Results, UnknownIDs), mimetype='application/json')
+
+@app.route('/satellite/riskassessment/stream',methods = ['POST'])
+
+def StreamRiskAssessment(): #Streams the assessment as NDJSON: a running top k every time a chunk of debris finishes, then the final table and CZML
+
+    #Get the satellite id (and optionally the coarse step in minutes and the number of closest debris kept) from frontend
+    SatelliteID = request.form['satid']
+
+    try:
+        TimeInterval = GetIntegerParameter(request.form, 'interval', 1, MaxTimeInterval)
+        MaxResults = GetIntegerParameter(request.form, 'k', 50, MaxResultCount)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    #Lines are produced on a background thread and handed to the response as they come
+    Lines = queue.Queue()
+
+    def Progress(Processed, Total, RiskAssessments):
+        Lines.put(json.dumps({
+            "type": "progress",
+            "processed": Processed,
+            "total": Total,
+            "risk_assessment_tabledata": CollisionRiskAssessor.GetAssessmentJSON(RiskAssessments)
+        }).encode() + b'\n')
+
+    def Run():
+        try:
+            RiskAssessmentsJSON, UpdatedCZML = GetRiskAssessment(SatelliteID, TimeInterval, MaxResults, Progress)
+            Lines.put(b'{"type": "result", "risk_assessment_tabledata": ' + json.dumps(RiskAssessmentsJSON).encode() + b', "updated_czml": ' + UpdatedCZML + b'}\n')
+        except Exception as e:
+            Lines.put(json.dumps({"type": "error", "message": str(e)}).encode() + b'\n')
+        finally:
+            Lines.put(None)
+
+    threading.Thread(target=Run, daemon=True).start()
+
+    def Stream():
+        while True:
+            Line = Lines.get()
+            if Line is None:
+                return
+            yield Line
+
+    return Response(Stream(), mimetype='application/x-ndjson')
+
+@app.route('/jobs/riskassessment',methods = ['POST'])
+
+def SubmitAssessmentJob(): #Queues a risk assessment and returns its job id straight away
+
+    #Parameters come as JSON or as a form: satid, optionally interval (coarse step in minutes), k (number of closest debris kept) and debrisids (refines those debris only)
+    Parameters = request.get_json(silent=True) or request.form.to_dict()
 
-    return jsonify(RiskAssessmentResponse)
+    if 'satid' not in Parameters:
+        return jsonify({'message': "satid is required"}), 400
+
+    SatelliteID = Parameters['satid']
+
+    try:
+        TimeInterval = GetIntegerParameter(Parameters, 'interval', 1, MaxTimeInterval)
+        MaxResults = GetIntegerParameter(Parameters, 'k', 50, MaxResultCount)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    DebrisIDs = Parameters.get('debrisids')
+
+    if DebrisIDs:
+        Kind = "reassessment"
+        Run = lambda Job: GetAssessmentBody(*GetRefineAssessment(SatelliteID, DebrisIDs, TimeInterval, MaxResults, Job.SetProgress))
+    else:
+        Kind = "riskassessment"
+        Run = lambda Job: GetAssessmentBody(*GetRiskAssessment(SatelliteID, TimeInterval, MaxResults, Job.SetProgress))
+
+    try:
+        Job = AssessmentJobs.Submit(Kind, {'satid': SatelliteID, 'interval': TimeInterval, 'k': MaxResults, 'debrisids': DebrisIDs}, Run)
+    except queue.Full:
+        return jsonify({'message': "Too many queued jobs, please try again later."}), 503
+
+    return jsonify({'job_id': Job.job_id}), 202
+
+@app.route('/jobs/<job_id>',methods = ['GET'])
+
+def GetJobStatus(job_id):
+
+    Job = AssessmentJobs.GetJob(job_id)
+
+    if Job is None:
+        return jsonify({'message': "Unknown job"}), 404
+
+    return jsonify(Job.GetStatus())
+
+@app.route('/jobs/<job_id>/result',methods = ['GET'])
+
+def GetJobResult(job_id):
+
+    Job = AssessmentJobs.GetJob(job_id)
+
+    if Job is None:
+        return jsonify({'message': "Unknown job"}), 404
+
+    if Job.status == "failed":
+        return jsonify(Job.GetStatus()), 500
+
+    #Not finished yet, the status tells the client how far along it is
+    if Job.status != "done":
+        return jsonify(Job.GetStatus()), 202
+
+    return Response(Job.result, mimetype='application/json')
 
 #Running the Flask instance
 if __name__ == '__main__':
-    
-    DBConnectionTest = DBConnTest()
-    if not DBConnectionTest.TestConnection():
+
+    #Starting lazily, the app comes up straight away and /readiness/ reports when the database is reachable
+    if not LazyStartup and not DBConnectionTest.TestConnection():
         print("Unable to connect to the database after multiple retries. Please check the database status.")
         sys.exit(1)
-        
-    else:
-        # Proceed with running the Flask app if the connection is successful
-        if __name__ == '__main__':
-            app.run()
\ No newline at end of file
+
+    app.run()
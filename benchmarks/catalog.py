@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+import math
+import numpy as np
+
+from models.OrbitalElements import MU_EARTH, RADIUS_EARTH
+
+#Synthetic but valid catalogs for benchmarks: Space-Track style GP records whose TLE lines carry correct columns and checksums.
+#The same seed always gives the same orbits. The epoch defaults to the start of the current day, so the assessment window
+#never starts far from the element sets.
+
+#Altitude (km), inclination (degrees) and eccentricity ranges of the populations the catalog is drawn from, with their share
+POPULATIONS = [
+    (0.4, (540.0, 570.0), (53.0, 53.2), (0.0, 0.0005)),   # constellation shells
+    (0.4, (600.0, 900.0), (97.0, 99.0), (0.0, 0.02)),     # sun-synchronous debris
+    (0.2, (300.0, 2000.0), (0.0, 100.0), (0.0, 0.05))     # everything else in low earth orbit
+]
+
+OBJECT_TYPES = [(0.3, "PAYLOAD"), (0.6, "DEBRIS"), (0.1, "ROCKET BODY")]
+
+def GetChecksum(line):
+
+    return sum(int(character) if character.isdigit() else 1 if character == '-' else 0 for character in line) % 10
+
+#Drag term in TLE exponent notation, e.g. 0.00012345 -> " 12345-3"
+def FormatExponent(value):
+
+    if value == 0:
+        return " 00000-0"
+
+    exponent = math.floor(math.log10(abs(value))) + 1
+    mantissa = int(round(abs(value) / 10**exponent * 1e5))
+    if mantissa == 100000:
+        mantissa, exponent = 10000, exponent + 1
+
+    return ("-" if value < 0 else " ") + "%05d" % mantissa + ("-" if exponent < 0 else "+") + str(abs(exponent))
+
+def FormatTLE(norad_id, international_designator, epoch, mean_motion_dot, bstar, inclination, raan, eccentricity, argument_of_perigee, mean_anomaly, mean_motion, revolution):
+
+    day_of_year = (epoch - datetime(epoch.year, 1, 1, tzinfo=epoch.tzinfo)).total_seconds() / 86400.0 + 1.0
+    mean_motion_dot_text = ("-" if mean_motion_dot < 0 else " ") + ("%.8f" % abs(mean_motion_dot))[1:]
+
+    line1 = "1 %05dU %-8s %02d%012.8f %s  00000-0 %s 0  999" % (norad_id, international_designator, epoch.year % 100, day_of_year, mean_motion_dot_text, FormatExponent(bstar))
+    line2 = "2 %05d %8.4f %8.4f %07d %8.4f %8.4f %11.8f%5d" % (norad_id, inclination, raan, int(round(eccentricity * 1e7)), argument_of_perigee, mean_anomaly, mean_motion, revolution)
+
+    return line1 + str(GetChecksum(line1)), line2 + str(GetChecksum(line2))
+
+#GP records (the fields SpaceObjectTelemetry is loaded from) of `count` objects
+def GenerateCatalog(count, seed=0, epoch=None):
+
+    rng = np.random.default_rng(seed)
+    epoch = epoch or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    shares = np.array([population[0] for population in POPULATIONS])
+    populations = rng.choice(len(POPULATIONS), size=count, p=shares / shares.sum())
+    type_shares = np.array([object_type[0] for object_type in OBJECT_TYPES])
+    object_types = rng.choice(len(OBJECT_TYPES), size=count, p=type_shares / type_shares.sum())
+
+    records = []
+    for i in range(count):
+
+        _, altitudes, inclinations, eccentricities = POPULATIONS[populations[i]]
+        altitude = rng.uniform(*altitudes)
+        eccentricity = rng.uniform(*eccentricities)
+
+        #Altitude is taken as the perigee, so nothing starts inside the atmosphere
+        semi_major_axis = (RADIUS_EARTH + altitude) / (1.0 - eccentricity)
+        mean_motion = math.sqrt(MU_EARTH / semi_major_axis**3) * 86400.0 / (2.0 * math.pi) # revolutions per day
+
+        norad_id = 10000 + i
+        launch = 1990 + i % 35
+        international_designator = "%02d%03d%s" % (launch % 100, i // 26 % 1000 + 1, chr(ord('A') + i % 26))
+        object_epoch = epoch - timedelta(seconds=float(rng.uniform(0.0, 43200.0)))
+
+        line1, line2 = FormatTLE(norad_id, international_designator, object_epoch, float(rng.uniform(-1e-5, 1e-4)),
+                                 float(rng.uniform(1e-5, 5e-4)), rng.uniform(*inclinations), rng.uniform(0.0, 360.0), eccentricity,
+                                 rng.uniform(0.0, 360.0), rng.uniform(0.0, 360.0), mean_motion, int(rng.integers(1, 99999)))
+
+        name = "BENCH %s %d" % (OBJECT_TYPES[object_types[i]][1], i)
+        records.append({
+            "CREATION_DATE": object_epoch.strftime("%Y-%m-%dT%H:%M:%S"),
+            "OBJECT_NAME": name,
+            "OBJECT_ID": "%d-%03d%s" % (launch, i // 26 % 1000 + 1, chr(ord('A') + i % 26)),
+            "NORAD_CAT_ID": str(norad_id),
+            "OBJECT_TYPE": OBJECT_TYPES[object_types[i]][1],
+            "TLE_LINE0": "0 " + name,
+            "TLE_LINE1": line1,
+            "TLE_LINE2": line2
+        })
+
+    return records
+
+#[OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2] rows, as the API reads them from SpaceObjectTelemetry
+def GetTLERows(records):
+
+    return [[record["OBJECT_ID"], record["TLE_LINE0"], record["TLE_LINE1"], record["TLE_LINE2"]] for record in records]
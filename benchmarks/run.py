@@ -0,0 +1,175 @@
+#Performance benchmarks for EOSCA on synthetic catalogs. Everything runs offline: no SQL Server, no Space-Track.
+#
+#    python -m benchmarks.run --sizes 1000 10000 50000 --workers 1 2 4 --repeats 5 --output results.json
+#
+#Every stage is timed `repeats` times per catalog size and reported as machine-readable JSON (p50/p95 latency, objects/sec,
+#peak RSS), so runs on different commits can be compared stage by stage.
+
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+#The worker pool reads its size from the environment when it is first created
+os.environ.setdefault('maxworkers', str(os.cpu_count() or 1))
+
+from models.DBConnection import DBWrite, TELEMETRY_INSERT
+from models.RiskAssessment import CollisionRiskAssessor
+from models.SpaceObjects import SatelliteElement
+from models.StorageBackend import SQLiteBackend
+from models.WorkerPool import WorkerPool
+from benchmarks.catalog import GenerateCatalog, GetTLERows
+
+#Peak resident set size in MB of this process and of its worker processes (ru_maxrss is in KB on Linux, bytes on macOS)
+def GetPeakRSS():
+
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+
+    return {
+        "self_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)
+    }
+
+def GetCommit():
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#Runs stage() `repeats` times and summarises the wall clock times. stage() returns nothing, setup() runs untimed before each repeat.
+def TimeStage(name, objects, repeats, stage, setup=None):
+
+    timings = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter()
+        stage()
+        timings.append(time.perf_counter() - start)
+
+    timings = np.array(timings)
+    result = {
+        "stage": name,
+        "objects": objects,
+        "repeats": repeats,
+        "p50_seconds": float(np.percentile(timings, 50)),
+        "p95_seconds": float(np.percentile(timings, 95)),
+        "mean_seconds": float(timings.mean()),
+        "objects_per_second": objects / float(np.percentile(timings, 50)) if timings.min() > 0 else None,
+        "peak_rss": GetPeakRSS()
+    }
+
+    print("%-40s %8d objects  p50 %8.3f s  p95 %8.3f s" % (name, objects, result["p50_seconds"], result["p95_seconds"]), file=sys.stderr)
+
+    return result
+
+#The refresh path against the embedded SQLite backend standing in for SQL Server: deduplication, shell derivation and the
+#batched insert of DBWrite.CopySpaceObjectTelemetry, without the Space-Track download.
+def BenchmarkBulkInsert(records, repeats):
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        writer = DBWrite(SQLiteBackend(os.path.join(directory, "benchmark.db")))
+
+        def Stage():
+            unique_records = writer.DeduplicateRecords(records)
+            writer.BulkInsert(TELEMETRY_INSERT, [writer.GetTelemetryRow(item) for item in unique_records.values()])
+            writer.conn.commit()
+
+        result = TimeStage("bulk_insert", len(records), repeats, Stage, writer.ClearSpaceObjectTelemetry)
+        writer.conn.close()
+
+    return result
+
+def BenchmarkCatalog(size, workers, repeats, seed, time_interval):
+
+    records = GenerateCatalog(size, seed)
+    tles = GetTLERows(records)
+
+    #The first payload is assessed against everything else
+    satellite = next(i for i, record in enumerate(records) if record["OBJECT_TYPE"] == "PAYLOAD")
+    satellite_tle = tles[satellite]
+    debris_tles = tles[:satellite] + tles[satellite + 1:]
+
+    assessor = CollisionRiskAssessor()
+    results = []
+
+    results.append(TimeStage("assess_risk_for_single_debris", 1, repeats,
+                             lambda: assessor.assess_risk_for_single_debris(satellite_tle, debris_tles[0], time_interval)))
+
+    pool = WorkerPool.GetInstance()
+    risk_assessments = []
+    for count in workers:
+        if pool.workers != count:
+            pool.Resize(count)
+
+        def Stage():
+            risk_assessments[:] = assessor.AssessCollisionRiskParallel(satellite_tle, debris_tles, time_interval)
+
+        #One untimed run starts the worker processes
+        Stage()
+        result = TimeStage("AssessCollisionRiskParallel", len(debris_tles), repeats, Stage)
+        result["workers"] = count
+        results.append(result)
+
+    risk_assessments_json = []
+
+    def AssessmentJSON():
+        risk_assessments_json[:] = CollisionRiskAssessor.GetAssessmentJSON(risk_assessments)
+
+    results.append(TimeStage("GetAssessmentJSON", len(risk_assessments), repeats, AssessmentJSON))
+
+    #Without a cache or ephemeris store every packet is propagated and serialised on each repeat
+    debris_tles_by_id = {tle[0]: tle for tle in debris_tles}
+    results.append(TimeStage("UpdateCZMLPostAssessment", len(risk_assessments_json) + 1, repeats,
+                             lambda: CollisionRiskAssessor.UpdateCZMLPostAssessment(debris_tles_by_id, SatelliteElement(satellite_tle), risk_assessments_json)))
+
+    results.append(BenchmarkBulkInsert(records, repeats))
+
+    return {"catalog_size": size, "stages": results}
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Benchmark EOSCA on synthetic catalogs.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000], help="catalog sizes to benchmark")
+    parser.add_argument("--workers", type=int, nargs="+", default=[int(os.environ['maxworkers'])], help="worker counts for AssessCollisionRiskParallel")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per stage")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic catalogs")
+    parser.add_argument("--interval", type=int, default=1, help="assessment time step in minutes")
+    parser.add_argument("--output", help="file to write the JSON report to, stdout when omitted")
+    args = parser.parse_args()
+
+    report = {
+        "commit": GetCommit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "repeats": args.repeats,
+        "time_interval_minutes": args.interval,
+        "catalogs": [BenchmarkCatalog(size, args.workers, args.repeats, args.seed, args.interval) for size in args.sizes],
+        "peak_rss": GetPeakRSS()
+    }
+
+    WorkerPool.GetInstance().Shutdown()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output)
+    else:
+        print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+from collections import Counter, OrderedDict
+import os
+import threading
+
+#LRU cache of per-object CZML packets (serialized bytes), bounded by the size of the packets it holds.
+#Keys are (OBJECT_ID, TLE epoch, time window, style), so a new element set or a different look never reuses a stale packet.
+class CZMLCache:
+
+    def __init__(self, budget_bytes=None):
+
+        self.budget_bytes = budget_bytes if budget_bytes is not None else int(os.getenv('czmlcachebytes', 64 * 1024 * 1024))
+
+        self._packets = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        #How often each object was viewed, used to pick what to pre-warm after a refresh
+        self._requests = Counter()
+
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def GetKey(element, start_time, outline_color=None):
+
+        epoch = element.TLE[1][18:32] if len(element.TLE) > 1 else ""
+
+        return (element.object_id, epoch, start_time.isoformat(), element.window_duration.total_seconds(), element.GetStyleKey(outline_color))
+
+    #Packet of an element over the window starting at start_time
+    def GetPacket(self, element, start_time, build, outline_color=None):
+
+        key = self.GetKey(element, start_time, outline_color)
+
+        with self._lock:
+            entry = self._packets.get(key)
+            if entry is not None:
+                self._packets.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        #Built outside the lock, two threads racing on the same miss simply build it twice
+        packet = build()
+        self.Put(key, packet)
+
+        return packet
+
+    def Put(self, key, packet, size=None):
+
+        size = size if size is not None else len(packet)
+        if size > self.budget_bytes:
+            return
+
+        with self._lock:
+            previous = self._packets.pop(key, None)
+            if previous is not None:
+                self._size -= previous[1]
+
+            self._packets[key] = (packet, size)
+            self._size += size
+
+            #Evict least recently used packets until the cache fits its memory budget again
+            while self._size > self.budget_bytes:
+                self._size -= self._packets.popitem(last=False)[1][1]
+
+    def RecordRequest(self, object_id):
+
+        with self._lock:
+            self._requests[object_id] += 1
+
+    def GetMostRequested(self, count):
+
+        with self._lock:
+            return [object_id for object_id, requests in self._requests.most_common(count)]
+
+    #Builds packets for the most requested objects ahead of time, e.g. right after a refresh. GetElement(object_id) returns an element or None.
+    #Packets cover the window of a request made at start_time.
+    def Prewarm(self, GetElement, count, start_time, ephemeris=None):
+
+        for object_id in self.GetMostRequested(count):
+            element = GetElement(object_id)
+            if element is not None:
+                window_start = element.GetWindowStart(start_time, ephemeris)
+                self.GetPacket(element, window_start, lambda: element.GetCZMLPacket(window_start, ephemeris))
+
+    def GetStats(self):
+
+        with self._lock:
+            return {"packets": len(self._packets), "bytes": self._size, "budget_bytes": self.budget_bytes, "hits": self.hits, "misses": self.misses}
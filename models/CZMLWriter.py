@@ -0,0 +1,134 @@
+from datetime import timedelta
+import json
+import math
+import os
+import numpy as np
+
+#Compact separators, CZML is read by machines only
+SEPARATORS = (',', ':')
+
+#Writes CZML packets straight to bytes from sampled position arrays (time x xyz, km).
+#Positions use the cartesian epoch-offset form [t0, x0, y0, z0, t1, ...], so a packet is one header and one flat list of numbers.
+class CZMLWriter:
+
+    def __init__(self, start_time, end_time, sample_step=None):
+
+        self.start_time = start_time
+        self.end_time = end_time
+        self.sample_step = sample_step or timedelta(seconds=float(os.getenv('czmlsampleseconds', 300)))
+        self.position_precision = int(os.getenv('czmlpositionprecision', 0)) # decimals kept on positions in m
+
+        #Lagrange interpolation of degree 5 needs a few samples past the end of the window
+        self.extra_samples = 5
+
+    def GetInterval(self, start_time=None, end_time=None):
+
+        return (start_time or self.start_time).isoformat() + "/" + (end_time or self.end_time).isoformat()
+
+    #Times to sample an object at: the window plus the samples the interpolation needs past its end
+    def GetSampleDuration(self):
+
+        return self.end_time - self.start_time + self.extra_samples * self.sample_step
+
+    def GetDocumentPacket(self, speed_multiplier=1):
+
+        return json.dumps({
+            "id": "document",
+            "version": "1.0",
+            "clock": {
+                "interval": self.GetInterval(),
+                "currentTime": self.start_time.isoformat(),
+                "multiplier": speed_multiplier,
+                "range": "LOOP_STOP",
+                "step": "SYSTEM_CLOCK_MULTIPLIER"
+            }
+        }, separators=SEPARATORS).encode()
+
+    #Position property from positions sampled every sample_step from epoch. Samples that failed to propagate (NaN) are left out.
+    def GetPosition(self, epoch, positions):
+
+        positions = np.asarray(positions, dtype=np.float64)
+        offsets = np.arange(len(positions), dtype=np.float64) * self.sample_step.total_seconds()
+
+        valid = ~np.isnan(positions).any(axis=1)
+        samples = np.column_stack((offsets[valid], np.round(positions[valid] * 1000, self.position_precision))) # converts km's to m's
+
+        #Whole numbers are written as integers, which keeps the payload small
+        if self.position_precision == 0 and self.sample_step.total_seconds().is_integer():
+            cartesian = json.dumps(samples.astype(np.int64).ravel().tolist(), separators=SEPARATORS)
+        else:
+            cartesian = json.dumps(samples.ravel().tolist(), separators=SEPARATORS)
+
+        return ('{"interpolationAlgorithm":"LAGRANGE","interpolationDegree":5,"referenceFrame":"INERTIAL","epoch":'
+                + json.dumps(epoch.isoformat()) + ',"cartesian":' + cartesian + '}').encode()
+
+    #Lead and trail times that draw one orbit of path ahead of and behind the object, as satellite_czml builds them
+    def GetLeadTrailTimes(self, orbital_time):
+
+        minutes_in_window = int((self.end_time - self.start_time).total_seconds() / 60)
+        left_over_minutes = minutes_in_window % orbital_time
+        number_of_full_orbits = math.floor(minutes_in_window / orbital_time)
+        orbital_time_in_seconds = orbital_time * 60.0
+
+        section_start = self.start_time
+        section_end = section_start + timedelta(minutes=left_over_minutes)
+
+        lead_times = []
+        trail_times = []
+        for _ in range(number_of_full_orbits + 1):
+            interval = self.GetInterval(section_start, section_end)
+            lead_times.append({"interval": interval, "epoch": section_start.isoformat(),
+                               "number": [0, orbital_time_in_seconds, orbital_time_in_seconds, 0]})
+            trail_times.append({"interval": interval, "epoch": section_start.isoformat(),
+                                "number": [0, 0, orbital_time_in_seconds, orbital_time_in_seconds]})
+
+            section_start = section_end
+            section_end = section_start + timedelta(minutes=orbital_time)
+
+        return lead_times, trail_times
+
+    #Packet for a design element (point marker, label and path) with its positions sampled every sample_step from epoch
+    def GetObjectPacket(self, element, epoch, positions, outline_color=None):
+
+        color = list(element.color) + [255] if len(element.color) == 3 else list(element.color)
+        orbital_time = 24.0 / float(element.TLE[2][52:63]) * 60.0 # minutes per orbit, from the mean motion
+        lead_times, trail_times = self.GetLeadTrailTimes(orbital_time)
+
+        header = {
+            "id": int(element.TLE[1][2:7]),
+            "description": element.description,
+            "availability": self.GetInterval(),
+            "label": {
+                "show": element.show_label,
+                "text": element.TLE[0],
+                "horizontalOrigin": "LEFT",
+                "pixelOffset": {"cartesian2": [12, 0]},
+                "fillColor": {"rgba": color},
+                "font": "11pt Lucida Console",
+                "outlineColor": {"rgba": [0, 0, 0, 255]},
+                "outlineWidth": 2
+            },
+            "point": {
+                "show": True,
+                "color": {"rgba": color},
+                "pixelSize": element.marker_scale,
+                "outlineColor": {"rgba": list(outline_color) if outline_color is not None else [255, 255, 255, 128]},
+                "outlineWidth": 2
+            },
+            "path": {
+                "show": [{"interval": self.GetInterval(), "boolean": element.show_path}],
+                "width": 1,
+                "leadTime": lead_times,
+                "trailTime": trail_times,
+                "resolution": 120,
+                "material": {"solidColor": {"color": {"rgba": color}}}
+            }
+        }
+
+        #The header is closed by the position property, appended without going through a dict
+        return json.dumps(header, separators=SEPARATORS)[:-1].encode() + b',"position":' + self.GetPosition(epoch, positions) + b'}'
+
+    @staticmethod
+    def GetDocument(packets):
+
+        return b"[" + b",".join(packets) + b"]"
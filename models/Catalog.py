@@ -0,0 +1,116 @@
+import numpy as np
+from sgp4.api import Satrec
+
+from models.OrbitalElements import MU_EARTH, RADIUS_EARTH
+
+#A catalog version as parallel NumPy arrays (struct of arrays) instead of a list of [OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2] lists.
+#Ids, names and TLE lines are fixed-width byte strings, the mean elements the assessor filters on are parsed once when the catalog
+#is built, and the Satrecs are only parsed by the processes that propagate. Pickling and saving send the flat arrays alone.
+class Catalog:
+
+    ARRAYS = ("object_ids", "names", "line1", "line2", "epochs", "inclination", "eccentricity", "mean_motion", "perigee", "apogee")
+
+    def __init__(self, **arrays):
+
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+        self._satrecs = None
+        self._index = None
+
+    @classmethod
+    def FromTLEs(cls, TLEs):
+
+        #Ids and names are stored UTF-8 encoded, TLE lines are ASCII. Each array's width comes from its longest encoded value, so a
+        #name with non-ASCII characters (more than one byte each) is never cut short.
+        line1 = np.array([TLE[2].encode() for TLE in TLEs], dtype=np.bytes_)
+        line2 = np.array([TLE[3].encode() for TLE in TLEs], dtype=np.bytes_)
+
+        #Mean elements: epoch, inclination (degrees), eccentricity, mean motion (revolutions per day), perigee and apogee altitudes (km)
+        year = _GetColumn(line1, 18, 20).astype(np.int64)
+        year += np.where(year >= 57, 1900, 2000)
+        day_of_year = _GetColumn(line1, 20, 32).astype(np.float64)
+        epochs = (year - 1970).astype('datetime64[Y]').astype('datetime64[us]') + np.round((day_of_year - 1.0) * 86400e6).astype('timedelta64[us]')
+
+        inclination = _GetColumn(line2, 8, 16).astype(np.float64)
+        eccentricity = _GetColumn(line2, 26, 33).astype(np.float64) / 1e7 # the leading decimal point is implied
+        mean_motion = _GetColumn(line2, 52, 63).astype(np.float64)
+
+        semi_major_axis = (MU_EARTH / (mean_motion * 2.0 * np.pi / 86400.0)**2) ** (1.0 / 3.0)
+
+        return cls(object_ids=np.array([TLE[0].encode() for TLE in TLEs], dtype=np.bytes_),
+                   names=np.array([TLE[1].encode() for TLE in TLEs], dtype=np.bytes_),
+                   line1=line1, line2=line2, epochs=epochs, inclination=inclination, eccentricity=eccentricity, mean_motion=mean_motion,
+                   perigee=semi_major_axis * (1.0 - eccentricity) - RADIUS_EARTH,
+                   apogee=semi_major_axis * (1.0 + eccentricity) - RADIUS_EARTH)
+
+    #Parsed Satrecs and the id index are rebuilt by whoever needs them, they never travel
+    def __getstate__(self):
+
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    def __setstate__(self, state):
+
+        self.__init__(**state)
+
+    def __len__(self):
+
+        return len(self.object_ids)
+
+    def GetObjectIDs(self):
+
+        return [object_id.decode() for object_id in self.object_ids.tolist()]
+
+    #[OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2] row of one object, the shape the rest of the code passes TLEs around in
+    def GetTLE(self, row):
+
+        return [self.object_ids[row].decode(), self.names[row].decode(), self.line1[row].decode(), self.line2[row].decode()]
+
+    def GetTLEs(self, rows=None):
+
+        return [self.GetTLE(row) for row in (range(len(self)) if rows is None else rows)]
+
+    #Row of every object id
+    def GetIndex(self):
+
+        if self._index is None:
+            self._index = {object_id: row for row, object_id in enumerate(self.GetObjectIDs())}
+
+        return self._index
+
+    #Satrecs of some rows, parsed on the spot and not kept (e.g. to propagate a catalog block by block)
+    def ParseSatrecs(self, rows):
+
+        return [Satrec.twoline2rv(self.line1[row].decode(), self.line2[row].decode()) for row in rows]
+
+    #Satrecs of some rows (every row when None). The whole catalog is parsed on first use and kept, for processes that propagate it repeatedly.
+    def GetSatrecs(self, rows=None):
+
+        if self._satrecs is None:
+            self._satrecs = self.ParseSatrecs(range(len(self)))
+
+        if rows is None:
+            return self._satrecs
+
+        return [self._satrecs[row] for row in rows]
+
+    def Save(self, path):
+
+        with open(path, "wb") as catalog_file:
+            np.savez(catalog_file, **{name: getattr(self, name) for name in self.ARRAYS})
+
+    @classmethod
+    def Load(cls, path):
+
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(**{name: arrays[name] for name in cls.ARRAYS})
+
+#Fixed columns [start, end) of every TLE line as a byte string array, without splitting the lines one by one
+def _GetColumn(lines, start, end):
+
+    if len(lines) == 0:
+        return np.empty(0, dtype='S%d' % (end - start))
+
+    characters = lines.view(np.uint8).reshape(len(lines), lines.itemsize)
+
+    return np.ascontiguousarray(characters[:, start:end]).view('S%d' % (end - start)).ravel()
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+import numpy as np
+
+from models.CatalogSearch import CatalogSearchIndex
+
+#Immutable, in-memory copy of SpaceObjectTelemetry for one catalog version (one LastRefresh.Refresh_Time)
+class CatalogSnapshot:
+
+    def __init__(self, refresh_time, rows):
+
+        self.refresh_time = refresh_time
+
+        #rows: OBJECT_ID, OBJECT_NAME, OBJECT_TYPE, TLE_LINE0, TLE_LINE1, TLE_LINE2, PERIGEE, APOGEE, NORAD_CAT_ID
+        rows = sorted(rows, key=lambda row: row[0])
+
+        self.tles = {row[0]: [row[0], row[3], row[4], row[5]] for row in rows}
+        self.all_tles = [self.tles[row[0]] for row in rows]
+        self.object_types = {row[0]: row[2] for row in rows}
+        self.satellites = [{"ObjectName": row[1], "ObjectID": row[0]} for row in rows if row[2] == 'PAYLOAD']
+        self.debris = [{"ObjectName": row[1], "ObjectID": row[0]} for row in rows if row[2] == 'DEBRIS']
+
+        debris_rows = [row for row in rows if row[2] == 'DEBRIS']
+        self.debris_tles = [self.tles[row[0]] for row in debris_rows]
+        self.debris_perigee = np.array([np.nan if row[6] is None else row[6] for row in debris_rows], dtype=np.float64)
+        self.debris_apogee = np.array([np.nan if row[7] is None else row[7] for row in debris_rows], dtype=np.float64)
+
+        #Built with every new version, so the listing search never waits on the database
+        self.search_index = CatalogSearchIndex.FromCatalogRows(rows)
+
+    def GetTLE(self, ObjectID):
+
+        TLE = self.tles.get(ObjectID)
+
+        return list(TLE) if TLE else []
+
+    def GetDebrisTLEsInAltitudeBand(self, LowerAltitude, UpperAltitude):
+
+        #Same rule as the SQL query: overlapping shells, and debris without a shell are always kept
+        overlaps = (self.debris_perigee <= UpperAltitude) & (self.debris_apogee >= LowerAltitude)
+        unknown = np.isnan(self.debris_perigee) | np.isnan(self.debris_apogee)
+
+        return [self.debris_tles[i] for i in np.flatnonzero(overlaps | unknown)]
+
+#Process-local catalog cache. The table is loaded once per catalog version and a cheap probe of the refresh time,
+#at most once every probe interval, decides when it has to be loaded again.
+class CatalogCache:
+
+    def __init__(self, LoadRows, GetRefreshTime, GetRefreshState):
+
+        self.enabled = os.getenv('catalogcache', '1') != '0'
+        self.probe_interval = float(os.getenv('catalogprobeseconds', 30))
+
+        self._LoadRows = LoadRows
+        self._GetRefreshTime = GetRefreshTime
+        self._GetRefreshState = GetRefreshState
+
+        self._catalog = None
+        self._last_probe = float('-inf')
+        self._lock = threading.Lock()
+
+    #Current snapshot, or None when the cache is disabled
+    def GetCatalog(self):
+
+        if not self.enabled:
+            return None
+
+        catalog = self._catalog
+        if catalog is not None and time.monotonic() - self._last_probe < self.probe_interval:
+            return catalog
+
+        #One thread probes (and reloads if needed), the others keep serving the snapshot they already have
+        if not self._lock.acquire(blocking=catalog is None):
+            return catalog
+
+        try:
+            if self._catalog is None or time.monotonic() - self._last_probe >= self.probe_interval:
+                self._Probe()
+        finally:
+            self._lock.release()
+
+        return self._catalog
+
+    def _Probe(self):
+
+        refresh_time = self._GetRefreshTime()
+        self._last_probe = time.monotonic()
+
+        if self._catalog is not None and self._catalog.refresh_time == refresh_time:
+            return
+
+        #The table is being rewritten: keep the previous version until the refresh has finished
+        refreshing = self._GetRefreshState() == 1
+        if refreshing and self._catalog is not None:
+            return
+
+        catalog = CatalogSnapshot(refresh_time, self._LoadRows())
+
+        #A snapshot read mid-refresh may be partial, leaving it without a version makes the next probe load it again
+        if refreshing:
+            catalog.refresh_time = None
+
+        self._catalog = catalog
+
+    #Forces the next read to probe the refresh time, e.g. right after this process refreshed the telemetry
+    def Invalidate(self):
+
+        self._last_probe = float('-inf')
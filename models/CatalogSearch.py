@@ -0,0 +1,102 @@
+import bisect
+import numpy as np
+
+#Fields a listing can be projected to, and the catalog column each one comes from
+FIELDS = ("ObjectID", "ObjectName", "NoradCatID", "ObjectType", "Perigee", "Apogee")
+
+#In-memory search index of one catalog version, built with the catalog snapshot at each refresh. Rows are kept in OBJECT_ID order,
+#which is also the listing order, so a page is a slice of sorted row numbers and the cursor is simply the last OBJECT_ID served.
+#Prefix search bisects a sorted copy of each searchable field, substring search scans all of them at once.
+class CatalogSearchIndex:
+
+    def __init__(self, rows):
+
+        #rows: OBJECT_ID, OBJECT_NAME, OBJECT_TYPE, PERIGEE, APOGEE, NORAD_CAT_ID, sorted by OBJECT_ID
+        self.object_ids = [row[0] for row in rows]
+        self.names = [row[1] or "" for row in rows]
+        self.object_types = np.array([row[2] or "" for row in rows], dtype=np.str_)
+        self.perigee = np.array([np.nan if row[3] is None else row[3] for row in rows], dtype=np.float64)
+        self.apogee = np.array([np.nan if row[4] is None else row[4] for row in rows], dtype=np.float64)
+        self.norad_ids = ["" if row[5] is None else str(row[5]) for row in rows]
+
+        #Projected values, as they appear in the JSON
+        self.columns = {
+            "ObjectID": self.object_ids,
+            "ObjectName": self.names,
+            "NoradCatID": self.norad_ids,
+            "ObjectType": self.object_types.tolist(),
+            "Perigee": [row[3] for row in rows],
+            "Apogee": [row[4] for row in rows]
+        }
+
+        #Searchable fields are matched case-insensitively
+        self.keys = [np.array([key.lower() for key in keys], dtype=np.str_) for keys in (self.names, self.object_ids, self.norad_ids)]
+
+        #Sorted keys and the rows they belong to, one pair per field, for prefix search
+        self.sorted_keys = []
+        for keys in self.keys:
+            order = np.argsort(keys, kind='stable')
+            self.sorted_keys.append((keys[order].tolist(), order))
+
+    #From catalog cache rows: OBJECT_ID, OBJECT_NAME, OBJECT_TYPE, TLE_LINE0, TLE_LINE1, TLE_LINE2, PERIGEE, APOGEE, NORAD_CAT_ID
+    @classmethod
+    def FromCatalogRows(cls, rows):
+
+        return cls([(row[0], row[1], row[2], row[6], row[7], row[8]) for row in sorted(rows, key=lambda row: row[0])])
+
+    def __len__(self):
+
+        return len(self.object_ids)
+
+    #Rows whose name, id or NORAD id starts with (or, with substring, contains) the query, in listing order
+    def Match(self, query, substring=False):
+
+        query = query.lower()
+        matches = np.zeros(len(self), dtype=bool)
+
+        if substring:
+            for keys in self.keys:
+                matches |= np.char.find(keys, query) >= 0
+
+            return np.flatnonzero(matches)
+
+        for keys, order in self.sorted_keys:
+            matches[order[bisect.bisect_left(keys, query):bisect.bisect_left(keys, query + "\uffff")]] = True
+
+        return np.flatnonzero(matches)
+
+    #Rows that pass the type and altitude band filters. The band keeps objects whose perigee/apogee shell overlaps it, like the
+    #risk assessment prefilter, and objects without a shell only when no band is asked for.
+    def Filter(self, rows, object_types=None, min_altitude=None, max_altitude=None):
+
+        if object_types:
+            rows = rows[np.isin(self.object_types[rows], list(object_types))]
+
+        if min_altitude is not None:
+            rows = rows[self.apogee[rows] >= min_altitude]
+
+        if max_altitude is not None:
+            rows = rows[self.perigee[rows] <= max_altitude]
+
+        return rows
+
+    def GetItem(self, row, fields):
+
+        return {field: self.columns[field][row] for field in fields}
+
+    #One page of the listing: up to limit objects after the cursor (the last OBJECT_ID of the previous page), projected to fields.
+    #Returns the items, the cursor of the next page (None on the last page) and the number of objects that match in total.
+    def Search(self, query="", substring=False, object_types=None, min_altitude=None, max_altitude=None, fields=FIELDS, limit=50, cursor=None):
+
+        rows = self.Match(query, substring) if query else np.arange(len(self))
+        rows = self.Filter(rows, object_types, min_altitude, max_altitude)
+
+        #Keyset pagination: a refresh between two pages neither repeats nor skips the objects that are still in the catalog
+        start = 0
+        if cursor is not None:
+            start = np.searchsorted(rows, bisect.bisect_right(self.object_ids, cursor))
+
+        page = rows[start:start + limit]
+        next_cursor = self.object_ids[page[-1]] if start + limit < len(rows) else None
+
+        return [self.GetItem(row, fields) for row in page], next_cursor, len(rows)
@@ -0,0 +1,173 @@
+import numpy as np
+
+from models.Metrics import Increment
+from models.OrbitalElements import MU_EARTH
+
+#Two-body acceleration, only used for the derivative of range-rate inside the Newton step
+def _TwoBodyAcceleration(r):
+
+    norm = np.linalg.norm(r, axis=-1, keepdims=True)
+
+    return -MU_EARTH * r / norm**3
+
+#Lower and upper bounds on the miss distance of every object from its relative states (N x T x 3) sampled every 2 * half_step seconds.
+#Around each sample the relative motion is linear up to a remainder of at most a * tau^2 / 2, where a bounds the relative acceleration:
+#the sum of both objects' gravity at their lowest radius, or the gravity gradient times the separation when that is smaller.
+def GetMissDistanceBounds(relative_positions, relative_velocities, half_step, lowest_radii, satellite_lowest_radius, margin=1.05):
+
+    ranges = np.linalg.norm(relative_positions, axis=2)
+    speeds_squared = np.einsum('ntk,ntk->nt', relative_velocities, relative_velocities)
+    closing = np.einsum('ntk,ntk->nt', relative_positions, relative_velocities)
+
+    #Closest point of the straight-line relative motion within half a step of the sample
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = np.clip(np.where(speeds_squared > 0, -closing / speeds_squared, 0.0), -half_step, half_step)
+    linear_ranges = np.linalg.norm(relative_positions + relative_velocities * tau[:, :, np.newaxis], axis=2)
+
+    lowest_radii = np.minimum(lowest_radii, satellite_lowest_radius)[:, np.newaxis]
+    acceleration = margin * MU_EARTH * (1.0 / satellite_lowest_radius**2 + 1.0 / lowest_radii**2)
+    remainder = 0.5 * acceleration * half_step**2
+
+    #The gradient of gravity is at most 2 mu / r^3, r being the lowest radius on the segment between the two objects
+    separation = ranges + np.sqrt(speeds_squared) * half_step + remainder
+    segment_radii = np.sqrt(np.maximum(lowest_radii**2 - (separation / 2)**2, 1.0))
+    remainder = np.minimum(remainder, 0.5 * margin * 2.0 * MU_EARTH / segment_radii**3 * separation * half_step**2)
+
+    #Samples where either object failed to propagate say nothing about the miss distance
+    lower = np.where(np.isnan(linear_ranges), np.inf, linear_ranges - remainder)
+    upper = np.where(np.isnan(ranges), np.inf, ranges)
+
+    return lower.min(axis=1), upper.min(axis=1)
+
+#Local minima of range on the coarse grid. Returns (object index, grid index) pairs, keeping the lowest few per object.
+def FindCoarseMinima(ranges, candidates_per_object=None):
+
+    count = ranges.shape[1]
+    minima = np.full(ranges.shape, np.inf)
+
+    if count == 1:
+        minima[:] = ranges
+    else:
+        interior = (ranges[:, 1:-1] <= ranges[:, :-2]) & (ranges[:, 1:-1] < ranges[:, 2:])
+        minima[:, 1:-1] = np.where(interior, ranges[:, 1:-1], np.inf)
+
+        #A range still decreasing at the end of the window (or increasing from its start) has its minimum on the boundary
+        minima[:, 0] = np.where(ranges[:, 0] < ranges[:, 1], ranges[:, 0], np.inf)
+        minima[:, -1] = np.where(ranges[:, -1] <= ranges[:, -2], ranges[:, -1], np.inf)
+
+    if candidates_per_object is not None and candidates_per_object < count:
+        columns = np.argpartition(minima, candidates_per_object - 1, axis=1)[:, :candidates_per_object]
+        rows = np.repeat(np.arange(ranges.shape[0]), candidates_per_object)
+        columns = columns.ravel()
+    else:
+        rows, columns = np.nonzero(np.isfinite(minima))
+
+    keep = np.isfinite(minima[rows, columns])
+
+    return rows[keep], columns[keep]
+
+#Relative position and velocity (debris - satellite) of every candidate at its own time offset
+def _RelativeState(satellite_satrec, debris_satrecs, rows, grid, offsets):
+
+    jd = np.full(len(offsets), grid.jd[0])
+    fr = grid.fr[0] + offsets / 86400.0
+
+    e, r_satellite, v_satellite = satellite_satrec.sgp4_array(jd, fr)
+    r_debris = np.empty_like(r_satellite)
+    v_debris = np.empty_like(v_satellite)
+
+    #One vectorized sgp4 call per debris object, covering all of that object's candidates
+    order = np.argsort(rows, kind='stable')
+    boundaries = np.flatnonzero(np.diff(rows[order])) + 1
+    for group in np.split(order, boundaries):
+        if len(group) == 0:
+            continue
+        e, r_debris[group], v_debris[group] = debris_satrecs[rows[group[0]]].sgp4_array(jd[group], fr[group])
+
+    Increment("eosca_sgp4_calls_total", 2 * len(offsets))
+
+    return r_debris - r_satellite, v_debris - v_satellite, _TwoBodyAcceleration(r_debris) - _TwoBodyAcceleration(r_satellite)
+
+#Refines coarse range minima to the root of range-rate (relative position . relative velocity = 0) with a bracketed Newton solver.
+#Returns the refined time offsets (seconds from grid start) and miss distances (km) for every candidate.
+#Each candidate stops iterating once its own Newton step is below tolerance, and the result is the closest range actually evaluated
+#(the coarse sample included), so a candidate can never end up further away than a point it has already visited.
+def RefineMinima(satellite_satrec, debris_satrecs, grid, ranges, rows, columns, tolerance=1e-3, max_iterations=8):
+
+    last = grid.count - 1
+    coarse_offsets = grid.offsets[columns]
+    coarse_distances = ranges[rows, columns]
+
+    refined_offsets = coarse_offsets.copy()
+    refined_distances = coarse_distances.copy()
+
+    #Boundary minima stay where they are, the true minimum lies outside the window
+    interior = np.flatnonzero((columns > 0) & (columns < last))
+
+    lo = grid.offsets[np.clip(columns[interior] - 1, 0, last)]
+    hi = grid.offsets[np.clip(columns[interior] + 1, 0, last)]
+    t = coarse_offsets[interior].copy()
+    active = np.ones(len(interior), dtype=bool)
+
+    #Keeps the closest evaluated point of every candidate
+    def Record(candidates, offsets, dr):
+
+        distances = np.linalg.norm(dr, axis=1)
+        improved = np.isfinite(distances) & (distances < refined_distances[interior[candidates]])
+        refined_offsets[interior[candidates[improved]]] = offsets[improved]
+        refined_distances[interior[candidates[improved]]] = distances[improved]
+
+    for _ in range(max_iterations):
+
+        candidates = np.flatnonzero(active)
+        if len(candidates) == 0:
+            break
+
+        dr, dv, da = _RelativeState(satellite_satrec, debris_satrecs, rows[interior[candidates]], grid, t[candidates])
+        Record(candidates, t[candidates], dr)
+
+        g = np.einsum('ij,ij->i', dr, dv)
+        g_prime = np.einsum('ij,ij->i', dv, dv) + np.einsum('ij,ij->i', dr, da)
+
+        #Range is shrinking before the root and growing after it, so the sign of g tightens the bracket
+        lo[candidates] = np.where(g < 0, t[candidates], lo[candidates])
+        hi[candidates] = np.where(g > 0, t[candidates], hi[candidates])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = g / g_prime
+        t_next = t[candidates] - step
+
+        #A Newton step below tolerance means the candidate sits on the root: it is taken and the candidate stops there
+        converged = np.isfinite(step) & (g_prime > 0) & (np.abs(step) < tolerance)
+
+        #Otherwise fall back to bisection whenever the Newton step leaves the bracket or is undefined
+        bisect = ~converged & (~np.isfinite(t_next) | (g_prime <= 0) | (t_next <= lo[candidates]) | (t_next >= hi[candidates]))
+        t_next = np.where(bisect, 0.5 * (lo[candidates] + hi[candidates]), t_next)
+
+        converged |= np.abs(t_next - t[candidates]) < tolerance
+        t[candidates] = t_next
+        active[candidates[converged]] = False
+
+    #The last step of every candidate has not been evaluated yet
+    if len(interior):
+        candidates = np.arange(len(interior))
+        dr, dv, da = _RelativeState(satellite_satrec, debris_satrecs, rows[interior], grid, t)
+        Record(candidates, t, dr)
+
+    return refined_offsets, refined_distances
+
+#Closest approach of every debris object: coarse scan for minima, refinement of each minimum, then the best refined minimum per object.
+#Objects that never propagated successfully get an infinite distance and a NaN offset.
+def SolveClosestApproaches(satellite_satrec, debris_satrecs, grid, ranges, candidates_per_object=None):
+
+    rows, columns = FindCoarseMinima(ranges, candidates_per_object)
+    offsets, distances = RefineMinima(satellite_satrec, debris_satrecs, grid, ranges, rows, columns)
+
+    best_distances = np.full(len(debris_satrecs), np.inf)
+    best_offsets = np.full(len(debris_satrecs), np.nan)
+
+    np.minimum.at(best_distances, rows, distances)
+    best = distances == best_distances[rows]
+    best_offsets[rows[best]] = offsets[best]
+
+    return best_offsets, best_distances
@@ -1,41 +1,49 @@
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 import os
-import pyodbc
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
+import threading
+from collections import deque
+from contextlib import contextmanager
 
 from models.SpacetrackAPI import SpaceTrackAPI 
+from models.OrbitalElements import GetOrbitalShell
+from models.CatalogCache import CatalogCache
+from models.CatalogSearch import CatalogSearchIndex
+from models.StorageBackend import GetStorageBackend, GetReplicaBackend
+from models.Metrics import Increment, Observe, Timed
+
+#Insert of one SpaceObjectTelemetry row, in the column order of DBWrite.GetTelemetryRow
+TELEMETRY_INSERT = '''
+                INSERT INTO SpaceObjectTelemetry (CREATION_DATE, OBJECT_NAME, OBJECT_ID, NORAD_CAT_ID, OBJECT_TYPE, TLE_LINE0, TLE_LINE1, TLE_LINE2, PERIGEE, APOGEE, INCLINATION, EPOCH)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                '''
+
+#Every SpaceObjectTelemetry column, in the order of TELEMETRY_INSERT, to copy the table into the read replica
+TELEMETRY_SELECT = "SELECT CREATION_DATE, OBJECT_NAME, OBJECT_ID, NORAD_CAT_ID, OBJECT_TYPE, TLE_LINE0, TLE_LINE1, TLE_LINE2, PERIGEE, APOGEE, INCLINATION, EPOCH FROM SpaceObjectTelemetry"
+
+#Conjunctions in both directions, rows as DBWrite.ReplaceConjunctions builds them
+CONJUNCTIONS_INSERT = '''
+                INSERT INTO Conjunctions (SATELLITE_ID, OBJECT_ID, CLOSEST_APPROACH_TIME, CLOSEST_APPROACH_DISTANCE, PROBABILITY, RISK_LEVEL, REFRESH_TIME)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                '''
+CONJUNCTIONS_SELECT = "SELECT SATELLITE_ID, OBJECT_ID, CLOSEST_APPROACH_TIME, CLOSEST_APPROACH_DISTANCE, PROBABILITY, RISK_LEVEL, REFRESH_TIME FROM Conjunctions"
+
+#Orbital shell columns of SpaceObjectTelemetry, added to tables created before the shell prefilter existed
+SHELL_COLUMNS = (("PERIGEE", "FLOAT"), ("APOGEE", "FLOAT"), ("INCLINATION", "FLOAT"), ("EPOCH", "DATETIME2"))
 
-#Defining the connection string to the DB that can be utilized by multiple DB connection objects - reducing code duplication
-class DBConnectionString:
-
-    def __init__(self):
-        
-        #Load Env Variables and Construct Connection String
-        load_dotenv()
-        self.__driver=os.getenv('driver')
-        self.__server = os.getenv('server')
-        self.__database = os.getenv('database')
-        self.__sqlusername = os.getenv('sqlusername')
-        self.__sqlpassword = os.getenv('sqlpassword')
-        self.__conn_string = 'DRIVER='+self.__driver+';SERVER=tcp:'+self.__server+';PORT=1433;DATABASE='+self.__database+';UID='+self.__sqlusername+';PWD='+ self.__sqlpassword + ';TrustServerCertificate=yes;'
-
-
-    def GetConnectionString(self):
-        return self.__conn_string
-    
 class DBConnTest:
     def __init__(self):
-        self.conn_string = DBConnectionString().GetConnectionString()
+        self.backend = GetStorageBackend()
 
     def TestConnection(self):
         max_retries = 10
         attempt_count = 0
         while attempt_count < max_retries:
             try:
-                conn = pyodbc.connect(self.conn_string, timeout=10)
+                conn = self.backend.Connect(timeout=10)
                 conn.close()
-                print("Connected to SQL successfully.")
+                print(f"Connected to {self.backend.name} successfully.")
                 return True
             except Exception as e:
                 print(f"Connection failed: {e}")
@@ -50,23 +58,42 @@ class DBConnTest:
 class DBWrite:
     _instance = None
 
-    def __init__(self):
+    #The singleton writes the primary database. A writer for the read replica is created by it, with the replica's backend.
+    def __init__(self, backend=None):
 
-        if DBWrite._instance != None:
-            raise Exception("%s is a Singleton object. It can only be instantiated once." % type(self).__name__)
-        else:
-            DBWrite._instance = self
+        if backend is None:
+            if DBWrite._instance != None:
+                raise Exception("%s is a Singleton object. It can only be instantiated once." % type(self).__name__)
+            else:
+                DBWrite._instance = self
 
-        self.conn = DBConnectionString()
-        self.conn_string = self.conn.GetConnectionString()
-        self.conn = pyodbc.connect(self.conn_string)
+        self.backend = backend or GetStorageBackend()
+        self.conn = self.backend.Connect()
         self.cursor = self.conn.cursor()
 
+        # Rows sent per executemany batch during bulk loads
+        self.insert_batch_size = int(os.getenv('insertbatchsize', 5000))
+
+        # Incremental refresh window and retention of the telemetry table
+        self.incremental_lookback = timedelta(hours=float(os.getenv('incrementallookbackhours', 72)))
+        self.retention = timedelta(days=30)
+
+        # Local read replica, filled from the primary after every refresh
+        replica_backend = GetReplicaBackend() if backend is None else None
+        self.replica = DBWrite(replica_backend) if replica_backend is not None else None
+
+        # Conjunctions are read before the first screening run has written any
+        self.EnsureConjunctions()
+
     def ClearSpaceObjectTelemetry(self):
 
         #Drop the table
         self.conn.execute("DROP TABLE IF EXISTS SpaceObjectTelemetry;")
 
+        self.CreateSpaceObjectTelemetry()
+
+    def CreateSpaceObjectTelemetry(self):
+
         #Create the table. Object ID is the primary key.
         self.conn.execute(""" CREATE TABLE SpaceObjectTelemetry (
                                     CREATION_DATE DATETIME2,
@@ -76,213 +103,850 @@ class DBWrite:
                                     OBJECT_TYPE VARCHAR(50),
                                     TLE_LINE0 VARCHAR(255),
                                     TLE_LINE1 VARCHAR(255),
-                                    TLE_LINE2 VARCHAR(255)
+                                    TLE_LINE2 VARCHAR(255),
+                                    PERIGEE FLOAT,
+                                    APOGEE FLOAT,
+                                    INCLINATION FLOAT,
+                                    EPOCH DATETIME2
                             )""")
+
+        self.CreateShellIndex()
         self.conn.commit()
 
-    def CopySpaceObjectTelemetry(self):
+    #Index on the orbital shell so risk assessments can skip debris whose altitude band cannot reach the satellite
+    def CreateShellIndex(self):
 
-        APISession = SpaceTrackAPI()
-        APIResponse = APISession.GetResponse()
+        self.conn.execute("CREATE INDEX IX_SpaceObjectTelemetry_Shell ON SpaceObjectTelemetry (OBJECT_TYPE, PERIGEE, APOGEE, INCLINATION, EPOCH);")
 
-        # Function to parse and return datetime object from string
-        def parse_datetime(datetime_str):
-            try:
-                return datetime.strptime(datetime_str, "%Y-%m-%dT%H:%M:%S")
-            except ValueError:  # Adjust the format if it doesn't match
-                return datetime.strptime(datetime_str, "%Y-%m-%dT%H:%M:%S.%f")
+    #Creates the table if it is missing and brings an older one up to date, without touching existing rows
+    def EnsureSpaceObjectTelemetry(self):
+
+        if not self.backend.TableExists(self.cursor, 'SpaceObjectTelemetry'):
+            self.CreateSpaceObjectTelemetry()
+            return
+
+        self.MigrateSpaceObjectTelemetry()
+
+    #A table created before the shell prefilter lacks the shell columns and their index. They are added, and the shell of every
+    #stored object is computed from its TLE, so an incremental refresh can carry on from the old table.
+    def MigrateSpaceObjectTelemetry(self):
+
+        missing_columns = [(column, column_type) for column, column_type in SHELL_COLUMNS
+                           if column not in self.backend.GetColumns(self.cursor, 'SpaceObjectTelemetry')]
+
+        try:
+            for column, column_type in missing_columns:
+                self.backend.AddColumn(self.cursor, 'SpaceObjectTelemetry', column, column_type)
 
-        # Deduplication logic
+            if missing_columns:
+                self.cursor.execute("SELECT OBJECT_ID, TLE_LINE1, TLE_LINE2 FROM SpaceObjectTelemetry WHERE TLE_LINE1 IS NOT NULL AND TLE_LINE2 IS NOT NULL")
+                shells = [(GetOrbitalShell(row[1], row[2]), row[0]) for row in self.cursor.fetchall()]
+
+                self.BulkInsert("UPDATE SpaceObjectTelemetry SET PERIGEE = ?, APOGEE = ?, INCLINATION = ?, EPOCH = ? WHERE OBJECT_ID = ?",
+                                [(shell["perigee"], shell["apogee"], shell["inclination"], shell["epoch"], object_id) for shell, object_id in shells])
+
+            if not self.backend.IndexExists(self.cursor, 'SpaceObjectTelemetry', 'IX_SpaceObjectTelemetry_Shell'):
+                self.CreateShellIndex()
+
+            self.conn.commit()
+
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        if missing_columns:
+            print(f"SpaceObjectTelemetry migrated: added {', '.join(column for column, column_type in missing_columns)}.")
+
+    # Function to parse and return datetime object from string
+    @staticmethod
+    def parse_datetime(datetime_str):
+        try:
+            return datetime.strptime(datetime_str, "%Y-%m-%dT%H:%M:%S")
+        except ValueError:  # Adjust the format if it doesn't match
+            return datetime.strptime(datetime_str, "%Y-%m-%dT%H:%M:%S.%f")
+
+    # Parameters of one SpaceObjectTelemetry row for a Space-Track GP record
+    @staticmethod
+    def GetTelemetryRow(item):
+
+        # Orbital shell derived from the TLE, used to prefilter debris during risk assessment
+        shell = GetOrbitalShell(item.get("TLE_LINE1"), item.get("TLE_LINE2"))
+
+        return (
+            item.get("CREATION_DATE"),
+            item.get("OBJECT_NAME"),
+            item.get("OBJECT_ID"),
+            int(item["NORAD_CAT_ID"]) if item.get("NORAD_CAT_ID") is not None else None,
+            item.get("OBJECT_TYPE"),
+            item.get("TLE_LINE0"),
+            item.get("TLE_LINE1"),
+            item.get("TLE_LINE2"),
+            shell["perigee"],
+            shell["apogee"],
+            shell["inclination"],
+            shell["epoch"]
+        )
+
+    # Inserts rows in batches of parameter arrays. Nothing is committed here, the caller owns the transaction.
+    @Timed()
+    def BulkInsert(self, sql_query, rows):
+
+        self.backend.PrepareBulkInsert(self.cursor)
+
+        for i in range(0, len(rows), self.insert_batch_size):
+            self.cursor.executemany(sql_query, rows[i:i + self.insert_batch_size])
+
+    # Keeps the newest record per OBJECT_ID. Records that are not newer than stored_dates[OBJECT_ID] are dropped as they stream in.
+    @Timed()
+    def DeduplicateRecords(self, records, stored_dates=None):
+
+        # The parsed CREATION_DATE of the kept record is stored so it is never parsed twice
         unique_records = {}
-        for item in APIResponse:
+        creation_dates = {}
+        for item in records:
             object_id = item["OBJECT_ID"]
-            creation_date = parse_datetime(item["CREATION_DATE"])
-            if object_id not in unique_records or creation_date > parse_datetime(unique_records[object_id]["CREATION_DATE"]):
+            creation_date = self.parse_datetime(item["CREATION_DATE"])
+            if stored_dates is not None and object_id in stored_dates and stored_dates[object_id] is not None and creation_date <= stored_dates[object_id]:
+                continue
+            if object_id not in unique_records or creation_date > creation_dates[object_id]:
                 unique_records[object_id] = item
+                creation_dates[object_id] = creation_date
 
-        sql_query = '''
-                INSERT INTO SpaceObjectTelemetry (CREATION_DATE, OBJECT_NAME, OBJECT_ID, NORAD_CAT_ID, OBJECT_TYPE, TLE_LINE0, TLE_LINE1, TLE_LINE2)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                ''' 
-        # Iterate over each item in the JSON data and insert it into the database
-        for item in unique_records.values():
-            self.conn.execute(sql_query, (
-                item.get("CREATION_DATE"),
-                item.get("OBJECT_NAME"),
-                item.get("OBJECT_ID"),
-                item.get("NORAD_CAT_ID"),
-                item.get("OBJECT_TYPE"),
-                item.get("TLE_LINE0"),
-                item.get("TLE_LINE1"),
-                item.get("TLE_LINE2")
-            ))
-
-            # Commit the transaction for each insert to ensure data integrity
-            self.conn.commit()
+        return unique_records
+
+    def SetLastRefreshTime(self):
 
         sql_query = "UPDATE LastRefresh SET Refresh_Time = ? WHERE Refresh_ID = 1"
-        self.conn.execute(sql_query, (datetime.now()))
+        self.cursor.execute(sql_query, (datetime.now(),))
+
+    @Timed()
+    def CopySpaceObjectTelemetry(self):
+
+        APISession = SpaceTrackAPI()
+
+        # Deduplicate while the response streams in, so only one record per object is ever held in memory
+        unique_records = self.DeduplicateRecords(APISession.StreamResponse())
+
+        # Insert every record and the new refresh time in a single transaction, so the refresh time only advances once every row is in
+        try:
+            self.BulkInsert(TELEMETRY_INSERT, [self.GetTelemetryRow(item) for item in unique_records.values()])
+            self.SetLastRefreshTime()
+            self.conn.commit()
+
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        self.SyncReplica()
+
+    # Copies the telemetry table, refresh time and refresh state of the primary into the read replica. A full copy rather than the
+    # changed rows keeps the replica identical to the primary, even one that was created after earlier refreshes.
+    @Timed()
+    def SyncReplica(self):
+
+        if self.replica is None:
+            return
+
+        self.cursor.execute(TELEMETRY_SELECT)
+        rows = [tuple(row) for row in self.cursor.fetchall()]
+
+        self.cursor.execute("SELECT Refresh_Time FROM LastRefresh WHERE Refresh_ID = 1")
+        row = self.cursor.fetchone()
+
+        self.replica.ReplaceSpaceObjectTelemetry(rows, row[0] if row else None, self.GetRefreshState())
+
+    # Refresh state (1 while a refresh is rewriting the table) and refresh time of this database
+    def GetRefreshState(self):
+
+        self.cursor.execute("SELECT * FROM Status")
+        row = self.cursor.fetchone()
+
+        return row[1] if row else None
+
+    def GetLastRefreshTime(self):
+
+        self.cursor.execute("SELECT Refresh_Time FROM LastRefresh WHERE Refresh_ID = 1")
+        row = self.cursor.fetchone()
+
+        return row[0] if row else None
+
+    # Only used on the read replica, whose Status mirrors the primary's
+    def SetRefreshState(self, refresh_state):
+
+        self.cursor.execute("UPDATE Status SET Refresh_State = ? WHERE Status_ID = 1", (refresh_state,))
+        self.conn.commit()
+
+    # Replaces every telemetry row and the refresh time (and state, when given) in a single transaction, readers see either the
+    # old or the new catalog
+    def ReplaceSpaceObjectTelemetry(self, rows, refresh_time, refresh_state=None):
+
+        self.EnsureSpaceObjectTelemetry()
+
+        try:
+            self.cursor.execute("DELETE FROM SpaceObjectTelemetry")
+            self.BulkInsert(TELEMETRY_INSERT, rows)
+            self.cursor.execute("UPDATE LastRefresh SET Refresh_Time = ? WHERE Refresh_ID = 1", (refresh_time,))
+            if refresh_state is not None:
+                self.cursor.execute("UPDATE Status SET Refresh_State = ? WHERE Status_ID = 1", (refresh_state,))
+            self.conn.commit()
+
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    # Creates the Conjunctions table if it is missing. Rows are looked up by satellite, so the index leads with SATELLITE_ID.
+    def EnsureConjunctions(self):
+
+        if self.backend.TableExists(self.cursor, 'Conjunctions'):
+            return
+
+        self.conn.execute(""" CREATE TABLE Conjunctions (
+                                    SATELLITE_ID VARCHAR(50),
+                                    OBJECT_ID VARCHAR(50),
+                                    CLOSEST_APPROACH_TIME DATETIME2,
+                                    CLOSEST_APPROACH_DISTANCE FLOAT,
+                                    PROBABILITY FLOAT,
+                                    RISK_LEVEL VARCHAR(50),
+                                    REFRESH_TIME DATETIME2
+                            )""")
+
+        self.conn.execute("CREATE INDEX IX_Conjunctions_Satellite ON Conjunctions (SATELLITE_ID, CLOSEST_APPROACH_DISTANCE);")
         self.conn.commit()
 
-#Object Pool + Singleton implementation for DB Read
+    # Replaces the screened conjunctions with those of a new screening run, in a single transaction
+    @Timed()
+    def ReplaceConjunctions(self, conjunctions, refresh_time):
+
+        rows = [(conjunction['satellite_id'], conjunction['debris_id'], conjunction['closest_approach_time'].replace(tzinfo=None),
+                 conjunction['closest_approach_distance'], conjunction['probability'], conjunction['risk_level'], refresh_time)
+                for conjunction in conjunctions]
+
+        self.ReplaceConjunctionRows(rows)
+
+        if self.replica is not None:
+            self.replica.ReplaceConjunctionRows(rows)
+
+    def ReplaceConjunctionRows(self, rows):
+
+        self.EnsureConjunctions()
+
+        try:
+            self.cursor.execute("DELETE FROM Conjunctions")
+            self.BulkInsert(CONJUNCTIONS_INSERT, rows)
+            self.conn.commit()
+
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    # Inserts new objects and updates changed ones, in the backend's dialect. Nothing is committed here, the caller owns the transaction.
+    @Timed()
+    def UpsertTelemetryRows(self, rows):
+
+        self.backend.UpsertTelemetryRows(self.cursor, self.BulkInsert, rows)
+
+    # Delta refresh: streams only GP records with an epoch after the last refresh (minus a lookback) and writes only objects
+    # whose CREATION_DATE changed, instead of dropping and rewriting the whole table. An empty table gets the full 30 day pull.
+    @Timed()
+    def SyncSpaceObjectTelemetry(self):
+
+        self.EnsureSpaceObjectTelemetry()
+
+        self.cursor.execute("SELECT OBJECT_ID, CREATION_DATE FROM SpaceObjectTelemetry")
+        stored_dates = {row[0]: row[1] for row in self.cursor.fetchall()}
+
+        since = None
+        if stored_dates:
+            self.cursor.execute("SELECT Refresh_Time FROM LastRefresh WHERE Refresh_ID = 1")
+            row = self.cursor.fetchone()
+
+            # GP records are published some time after their epoch, the lookback catches ones that appeared since the last refresh
+            if row is not None and row[0] is not None:
+                since = row[0] - self.incremental_lookback
+
+        APISession = SpaceTrackAPI()
+        changed_records = self.DeduplicateRecords(APISession.StreamResponse(since), stored_dates)
+
+        try:
+            if changed_records:
+                self.UpsertTelemetryRows([self.GetTelemetryRow(item) for item in changed_records.values()])
+
+            # Same 30 day window as the full pull: objects that stopped receiving element sets age out
+            self.cursor.execute("DELETE FROM SpaceObjectTelemetry WHERE EPOCH < ?", (datetime.utcnow() - self.retention,))
+
+            self.SetLastRefreshTime()
+            self.conn.commit()
+
+        except Exception:
+            self.conn.rollback()
+            raise
+
+        self.SyncReplica()
+
+        print(f"Telemetry sync complete. {len(changed_records)} objects inserted or updated.")
+
+#Object Pool + Singleton implementation for DB Read.
+#Thread-safe and bounded: acquire blocks (up to a timeout) when every connection is in use, connections are opened on demand
+#between min_size and max_size, and connections that sat idle are health-checked and transparently replaced when dead.
+#With lazy set (lazystartup=1) the pool is created empty and min_size connections are opened in the background, so creating it never waits on the database.
 class DBReadPool:
 
     _instance = None
 
-    def __init__(self, size):
+    #The singleton reads the primary database. A pool on the read replica is created by DBRead, with the replica's backend.
+    def __init__(self, size, min_size=None, timeout=None, backend=None, lazy=None):
 
-        if DBReadPool._instance != None:
-            raise Exception("%s is a Singleton object. It can only be instantiated once." % type(self).__name__)
-        else:
-            DBReadPool._instance = self
+        if backend is None:
+            if DBReadPool._instance != None:
+                raise Exception("%s is a Singleton object. It can only be instantiated once." % type(self).__name__)
+            else:
+                DBReadPool._instance = self
 
-        self.conn = DBConnectionString()
-        self.conn_string = self.conn.GetConnectionString()
+        self.backend = backend or GetStorageBackend()
 
-        #array for the pool
-        self._reusableconnections = []
+        self.max_size = size
+        self.min_size = min(size, min_size if min_size is not None else int(os.getenv('dbpoolminsize', size)))
+        self.timeout = timeout if timeout is not None else float(os.getenv('dbpooltimeout', 30))
+        self.health_check_interval = float(os.getenv('dbpoolhealthcheckseconds', 60)) # idle time after which a connection is checked before reuse
 
-        #filling up the pool with DB connections
-        for _ in range(size):
-            self.conn = pyodbc.connect(self.conn_string)
-            self._reusableconnections.append(self.conn.cursor())
+        #idle cursors with the time they were released, most recently used last
+        self._reusableconnections = deque()
+        self._size = 0
+        self._condition = threading.Condition()
 
-    def acquire(self):
-        return self._reusableconnections.pop()
+        #wait-time and utilization statistics
+        self._stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "timeouts": 0, "reconnects": 0, "in_use": 0, "peak_in_use": 0}
+
+        #the timeout counter is exposed from zero, not only after the first timeout
+        Increment("eosca_db_pool_timeouts_total", 0)
+
+        #filling up the pool with DB connections, in the background when starting lazily
+        self.lazy = lazy if lazy is not None else os.getenv('lazystartup', '0') == '1'
+        if self.lazy:
+            threading.Thread(target=self.Fill, args=(self.min_size, False), daemon=True).start()
+        else:
+            self.Fill(self.min_size)
+
+    #Opens up to count idle connections at once, connection setup is mostly spent waiting on the server.
+    #Slots are reserved first, so concurrent acquires never take the pool past max_size.
+    def Fill(self, count, raise_errors=True):
+
+        with self._condition:
+            count = min(count, self.max_size - self._size)
+            self._size += max(count, 0)
+
+        if count <= 0:
+            return
+
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [executor.submit(self._Connect) for _ in range(count)]
+
+        errors = []
+        with self._condition:
+            for future in futures:
+                try:
+                    self._reusableconnections.append((future.result(), time.monotonic()))
+                except Exception as e:
+                    self._size -= 1
+                    errors.append(e)
+            self._condition.notify_all()
+
+        if errors and raise_errors:
+            raise errors[0]
+
+    def _Connect(self):
+
+        return self.backend.Connect().cursor()
+
+    @staticmethod
+    def _Close(reusable):
+
+        try:
+            reusable.connection.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _IsAlive(reusable):
+
+        try:
+            reusable.execute("SELECT 1")
+            reusable.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self, timeout=None):
+
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        reusable = None
+
+        with self._condition:
+            while True:
+                if self._reusableconnections:
+                    reusable, released = self._reusableconnections.pop()
+                    break
+
+                #Grow on demand up to max_size, the connection itself is opened outside the lock
+                if self._size < self.max_size:
+                    self._size += 1
+                    released = None
+                    break
+
+                remaining = timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    Increment("eosca_db_pool_timeouts_total")
+                    raise TimeoutError(f"No database connection became available within {timeout} seconds.")
+
+                self._condition.wait(remaining)
+
+            waited = time.monotonic() - started
+            Observe("eosca_db_pool_wait_seconds", waited)
+            self._stats["acquired"] += 1
+            self._stats["wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+            if waited > 0.001:
+                self._stats["waited"] += 1
+            self._stats["in_use"] += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._stats["in_use"])
+
+        try:
+            if reusable is None:
+                reusable = self._Connect()
+
+            #A connection that sat idle may have been dropped by the server or a load balancer
+            elif time.monotonic() - released > self.health_check_interval and not self._IsAlive(reusable):
+                reusable = self.reconnect(reusable)
+
+        except Exception:
+            self._Discard()
+            raise
+
+        return reusable
 
     def release(self, reusable):
-        self._reusableconnections.append(reusable)
 
-#Executing DB read functions
+        with self._condition:
+            self._reusableconnections.append((reusable, time.monotonic()))
+            self._stats["in_use"] -= 1
+            self._condition.notify()
+
+    #Replaces a dead connection with a fresh one, the caller keeps holding the pool slot
+    def reconnect(self, reusable):
+
+        self._Close(reusable)
+
+        with self._condition:
+            self._stats["reconnects"] += 1
+
+        return self._Connect()
+
+    #Gives up a pool slot whose connection could not be (re)opened
+    def _Discard(self):
+
+        with self._condition:
+            self._size -= 1
+            self._stats["in_use"] -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+
+        reusable = self.acquire(timeout)
+        try:
+            yield reusable
+        except self.backend.Error:
+            #The connection may be the cause, never hand a broken one to the next caller
+            if not self._IsAlive(reusable):
+                self._Close(reusable)
+                self._Discard()
+                raise
+            self.release(reusable)
+            raise
+        except BaseException:
+            self.release(reusable)
+            raise
+        else:
+            self.release(reusable)
+
+    def GetStats(self):
+
+        with self._condition:
+            stats = dict(self._stats)
+            stats["size"] = self._size
+            stats["idle"] = len(self._reusableconnections)
+            stats["min_size"] = self.min_size
+            stats["max_size"] = self.max_size
+
+        stats["utilization"] = stats["in_use"] / self.max_size
+        stats["mean_wait_seconds"] = stats["wait_seconds"] / stats["acquired"] if stats["acquired"] else 0.0
+
+        return stats
+
+#Keeps the local read replica of a node in step with the primary. The replica is filled when the node starts, its catalog is copied
+#again whenever its LastRefresh falls behind the primary's (e.g. another node ran the refresh), the screened conjunctions whenever
+#they changed, and Status is mirrored so /refresh/status reports the primary's refresh. The primary is probed at most once per
+#replicacheckseconds.
+class ReplicaSync:
+
+    def __init__(self, primary_pool, backend):
+
+        self.primary_pool = primary_pool
+        self.writer = DBWrite(backend)
+        self.check_interval = float(os.getenv('replicacheckseconds', 30))
+
+        self._last_check = float('-inf')
+        self._lock = threading.Lock()
+
+        #A replica filled by an earlier run is served until the first check, even when the primary cannot be reached
+        self.ready = self.HasCatalog()
+
+    #The replica has a catalog to serve: the telemetry table exists and has been refreshed at least once
+    def HasCatalog(self):
+
+        return self.writer.backend.TableExists(self.writer.cursor, 'SpaceObjectTelemetry') and self.writer.GetLastRefreshTime() is not None
+
+    def QueryPrimary(self, sql_query):
+
+        with self.primary_pool.connection() as cursor:
+            cursor.execute(sql_query)
+            return [tuple(row) for row in cursor.fetchall()]
+
+    # Signature of the screened conjunctions, to tell whether they changed since the last copy
+    @staticmethod
+    def GetConjunctionsVersion(cursor):
+
+        cursor.execute("SELECT COUNT(*), MAX(REFRESH_TIME) FROM Conjunctions")
+        count, refresh_time = cursor.fetchone()
+
+        #SQLite returns the aggregate as text, SQL Server as a datetime: both print the same
+        return count, None if refresh_time is None else str(refresh_time)
+
+    #Copies whatever changed on the primary. One thread checks at a time, the others carry on with what the replica holds.
+    def Check(self, force=False):
+
+        if not force and time.monotonic() - self._last_check < self.check_interval:
+            return
+
+        if not self._lock.acquire(blocking=False):
+            return
+
+        try:
+            self._last_check = time.monotonic()
+            self.Sync()
+
+        #The replica keeps serving what it has, the next check tries again
+        except Exception as e:
+            print(f"Read replica sync failed: {e}")
+
+        finally:
+            self._lock.release()
+
+    @Timed()
+    def Sync(self):
+
+        refresh_time = self.QueryPrimary("SELECT Refresh_Time FROM LastRefresh WHERE Refresh_ID = 1")[0][0]
+        refresh_state = self.QueryPrimary("SELECT * FROM Status")[0][1]
+
+        #A table being rewritten is not copied, the replica keeps the previous version until the refresh has finished
+        if refresh_time is not None and refresh_time != self.writer.GetLastRefreshTime() and refresh_state != 1:
+            self.writer.ReplaceSpaceObjectTelemetry(self.QueryPrimary(TELEMETRY_SELECT), refresh_time, refresh_state)
+            print(f"Read replica synced to the catalog of {refresh_time}.")
+
+        elif refresh_state != self.writer.GetRefreshState():
+            self.writer.SetRefreshState(refresh_state)
+
+        with self.primary_pool.connection() as cursor:
+            conjunctions_version = self.GetConjunctionsVersion(cursor) if self.primary_pool.backend.TableExists(cursor, 'Conjunctions') else None
+
+        if conjunctions_version is not None and conjunctions_version != self.GetConjunctionsVersion(self.writer.cursor):
+            self.writer.ReplaceConjunctionRows(self.QueryPrimary(CONJUNCTIONS_SELECT))
+
+        self.ready = self.HasCatalog()
+
+#Executing DB read functions. Every call keeps its cursor and rows in local variables, so one DBRead is safe to share between request threads.
+#With a read replica configured (dbreplica), reads are served from it once it holds a catalog and from the primary until then.
 class DBRead:
 
     def __init__(self):
 
-        #instantiating the pool with a size
-        self.pool = DBReadPool(12)
+        replica_backend = GetReplicaBackend()
+
+        #instantiating the pools with a size. Next to a replica the primary only serves until the replica is filled, it keeps no idle connections.
+        self.primary_pool = DBReadPool(12, min_size=0 if replica_backend is not None else None)
+        self.replica_pool = DBReadPool(12, backend=replica_backend) if replica_backend is not None else None
+
+        #Filled from the primary at startup, in the background when starting lazily
+        self.replica = ReplicaSync(self.primary_pool, replica_backend) if replica_backend is not None else None
+        if self.replica is not None:
+            if self.primary_pool.lazy:
+                threading.Thread(target=self.replica.Check, args=(True,), daemon=True).start()
+            else:
+                self.replica.Check(force=True)
 
         # Defining the maximum number of closest approaches to obtain
         self.numberofcas = 50
 
-        self.satellites = []
-        self.satelliteTLE = []
+        # Maximum number of IDs per IN-list in batch lookups, valid on either database
+        self.in_list_size = min(pool.backend.in_list_size for pool in (self.primary_pool, self.replica_pool) if pool is not None)
+
+        #Process-local copy of the catalog, reloaded only when LastRefresh.Refresh_Time advances
+        self.cache = CatalogCache(self.GetCatalogRows, self.GetLastDataRefreshTime, self.GetRefreshState)
+
+        #Search index built per catalog version when the catalog cache is disabled
+        self._search_index = None
+        self._search_index_lock = threading.Lock()
+
+    # Pool reads are served from: the replica once it holds a catalog, the primary otherwise
+    @property
+    def pool(self):
+
+        if self.replica is not None and self.replica.ready:
+            return self.replica_pool
+
+        return self.primary_pool
+
+    # Runs one read query on a pooled connection and returns its rows (or the first row with fetch_one).
+    # A connection that turns out to be dead is replaced and the query is retried once.
+    def Query(self, sql_query, parameters=(), fetch_one=False):
+
+        for attempt in range(2):
+            pool = self.pool
+            try:
+                with pool.connection() as cursor:
+                    cursor.execute(sql_query, parameters)
+                    return cursor.fetchone() if fetch_one else cursor.fetchall()
+
+            except pool.backend.connection_errors:
+                if attempt == 1:
+                    raise
+
+    # Readiness probe: a pooled connection of the database reads are served from can be had within timeout seconds, and that
+    # database holds a catalog (the telemetry table exists and has been refreshed). Returns (ready, reason).
+    def CheckReadiness(self, timeout=2):
+
+        pool = self.pool
+
+        try:
+            with pool.connection(timeout) as cursor:
+                if not pool.backend.TableExists(cursor, 'SpaceObjectTelemetry'):
+                    return False, "The catalog has not been loaded yet."
+
+                cursor.execute("SELECT Refresh_Time FROM LastRefresh WHERE Refresh_ID = 1")
+                row = cursor.fetchone()
+
+        except Exception as e:
+            return False, str(e)
+
+        if row is None or row[0] is None:
+            return False, "The catalog has never been refreshed."
+
+        return True, None
+
+    # Catches the replica up with the primary. Every probe of the catalog version goes through here, it is throttled by ReplicaSync
+    # unless forced (e.g. right after this process refreshed the telemetry).
+    def CheckReplica(self, force=False):
+
+        if self.replica is not None:
+            self.replica.Check(force)
 
     # Function to get the values from RefreshState table
+    @Timed()
     def GetRefreshState(self):
 
-        self.conn = self.pool.acquire()
-        self.conn.execute("SELECT * FROM Status")
-        self.rows = self.conn.fetchall()
-    
-        # release the conn
-        self.pool.release(self.conn)
+        self.CheckReplica()
+
+        rows = self.Query("SELECT * FROM Status")
 
         # Returning rows
-        return self.rows[0][1]
+        return rows[0][1]
     
+    @Timed()
     def GetLastDataRefreshTime(self):
 
-        self.conn = self.pool.acquire()
-        self.conn.execute("SELECT * FROM LastRefresh")
-        self.rows = self.conn.fetchall()
-    
-        # release the conn
-        self.pool.release(self.conn)
+        self.CheckReplica()
+
+        rows = self.Query("SELECT * FROM LastRefresh")
 
         # Returning rows
-        return self.rows[0][1]
+        return rows[0][1]
     
+    @Timed()
     def GetSatellites(self):
 
-        self.conn = self.pool.acquire()
-        self.conn.execute("SELECT OBJECT_NAME, OBJECT_ID FROM SpaceObjectTelemetry WHERE OBJECT_TYPE = 'PAYLOAD'")
-        self.rows = self.conn.fetchall()
-    
-        # release the conn
-        self.pool.release(self.conn)
-
-        # Convert fetched data to a list of dictionaries
-        self.satellites = [{"ObjectName": row[0], "ObjectID": row[1]} for row in self.rows]
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            return catalog.satellites
 
+        rows = self.Query("SELECT OBJECT_NAME, OBJECT_ID FROM SpaceObjectTelemetry WHERE OBJECT_TYPE = 'PAYLOAD'")
 
-        # Returning rows
-        return self.satellites
+        # Convert fetched data to a list of dictionaries
+        return [{"ObjectName": row[0], "ObjectID": row[1]} for row in rows]
     
+    @Timed()
     def GetSatelliteTLE(self, SatelliteID):
 
-        self.conn = self.pool.acquire()
-        sql_query = "SELECT OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2 FROM SpaceObjectTelemetry WHERE OBJECT_ID = ?"
-        self.conn.execute(sql_query, (SatelliteID,))
-        self.row = self.conn.fetchone()
-    
-        # release the conn
-        self.pool.release(self.conn)
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            return catalog.GetTLE(SatelliteID)
 
-        # Convert fetched data to a list of dictionaries
-        if self.row:
-            self.satelliteTLE = [self.row[0], self.row[1], self.row[2], self.row[3]]
-        else:
-            self.satelliteTLE = []  # In case there is no result for the given SatelliteID
+        sql_query = "SELECT OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2 FROM SpaceObjectTelemetry WHERE OBJECT_ID = ?"
+        row = self.Query(sql_query, (SatelliteID,), fetch_one=True)
 
-        # Returning rows
-        return self.satelliteTLE
+        # In case there is no result for the given SatelliteID an empty list is returned
+        return [row[0], row[1], row[2], row[3]] if row else []
     
+    @Timed()
     def GetDebris(self):
 
-        self.conn = self.pool.acquire()
-        self.conn.execute("SELECT OBJECT_NAME, OBJECT_ID FROM SpaceObjectTelemetry WHERE OBJECT_TYPE = 'DEBRIS'")
-        self.rows = self.conn.fetchall()
-    
-        # release the conn
-        self.pool.release(self.conn)
-
-        # Convert fetched data to a list of dictionaries
-        self.debris = [{"ObjectName": row[0], "ObjectID": row[1]} for row in self.rows]
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            return catalog.debris
 
+        rows = self.Query("SELECT OBJECT_NAME, OBJECT_ID FROM SpaceObjectTelemetry WHERE OBJECT_TYPE = 'DEBRIS'")
 
-        # Returning rows
-        return self.debris
+        # Convert fetched data to a list of dictionaries
+        return [{"ObjectName": row[0], "ObjectID": row[1]} for row in rows]
     
+    @Timed()
     def GetDebrisTLEs(self):
 
-        self.conn = self.pool.acquire()
-        sql_query = "SELECT OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2 FROM SpaceObjectTelemetry WHERE OBJECT_TYPE = 'DEBRIS'"
-        self.conn.execute(sql_query)
-        rows = self.conn.fetchall()
-    
-        # release the conn
-        self.pool.release(self.conn)
-
-         # Initialize a list to hold all the TLEs
-        self.DebrisTLEs = []
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            return catalog.debris_tles
 
-        # Convert fetched data to a list of dictionaries
-        if rows:
-            for row in rows:
-                # Append each TLE set to the list
-                self.DebrisTLEs.append([row[0], row[1], row[2], row[3]])
-        else:
-            self.DebrisTLEs = []  # In case there are no results
+        sql_query = "SELECT OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2 FROM SpaceObjectTelemetry WHERE OBJECT_TYPE = 'DEBRIS'"
+        rows = self.Query(sql_query)
 
         # Return the list of TLEs
-        return self.DebrisTLEs
+        return [[row[0], row[1], row[2], row[3]] for row in rows]
     
+    @Timed()
     def GetDebrisTLEForObject(self,objectid):
 
-        self.conn = self.pool.acquire()
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            return catalog.GetTLE(objectid)
+
         sql_query = "SELECT OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2 FROM SpaceObjectTelemetry WHERE OBJECT_ID = ?"
-        self.conn.execute(sql_query, (objectid,))
-        self.row = self.conn.fetchone()
-    
-        # release the conn
-        self.pool.release(self.conn)
+        row = self.Query(sql_query, (objectid,), fetch_one=True)
 
-        # Convert fetched data to a list of dictionaries
-        if self.row:
-            self.debrisTLE = [self.row[0], self.row[1], self.row[2], self.row[3]]
+        # In case there is no result for the given object an empty list is returned
+        return [row[0], row[1], row[2], row[3]] if row else []
+
+    # TLEs of many objects in as few queries as possible, as a dict keyed by OBJECT_ID. Unknown IDs are left out.
+    @Timed()
+    def GetTLEsForObjects(self, ObjectIDs):
+
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            return {ObjectID: catalog.tles[ObjectID] for ObjectID in ObjectIDs if ObjectID in catalog.tles}
+
+        ObjectIDs = list(dict.fromkeys(ObjectIDs))
+        TLEs = {}
+
+        # Chunked IN-lists keep every query under the backend's parameter limit
+        for i in range(0, len(ObjectIDs), self.in_list_size):
+            chunk = ObjectIDs[i:i + self.in_list_size]
+            sql_query = "SELECT OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2 FROM SpaceObjectTelemetry WHERE OBJECT_ID IN (%s)" % ", ".join("?" * len(chunk))
+
+            for row in self.Query(sql_query, tuple(chunk)):
+                TLEs[row[0]] = [row[0], row[1], row[2], row[3]]
+
+        return TLEs
+
+    @Timed()
+    def GetDebrisTLEsInAltitudeBand(self, LowerAltitude, UpperAltitude):
+
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            return catalog.GetDebrisTLEsInAltitudeBand(LowerAltitude, UpperAltitude)
+
+        # Debris whose perigee/apogee shell overlaps [LowerAltitude, UpperAltitude]. Rows without a shell are kept so they are never silently skipped.
+        sql_query = """SELECT OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2 FROM SpaceObjectTelemetry
+                       WHERE OBJECT_TYPE = 'DEBRIS' AND ((PERIGEE <= ? AND APOGEE >= ?) OR PERIGEE IS NULL OR APOGEE IS NULL)"""
+        rows = self.Query(sql_query, (UpperAltitude, LowerAltitude))
+
+        # Return the list of TLEs
+        return [[row[0], row[1], row[2], row[3]] for row in rows]
+
+    @Timed()
+    def GetAllTLEs(self):
+
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            return catalog.all_tles
+
+        sql_query = "SELECT OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2 FROM SpaceObjectTelemetry ORDER BY OBJECT_ID"
+        rows = self.Query(sql_query)
+
+        # Return the list of TLEs for every object in the catalog
+        return [[row[0], row[1], row[2], row[3]] for row in rows]
+
+    # TLEs of every payload and debris object, and a mask of the payloads among them, for catalog-wide screening
+    @Timed()
+    def GetScreeningObjects(self):
+
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            rows = [(TLE, catalog.object_types[TLE[0]]) for TLE in catalog.all_tles if catalog.object_types[TLE[0]] in ('PAYLOAD', 'DEBRIS')]
         else:
-            self.debrisTLE = []  # In case there is no result for the given SatelliteID
+            sql_query = "SELECT OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2, OBJECT_TYPE FROM SpaceObjectTelemetry WHERE OBJECT_TYPE IN ('PAYLOAD', 'DEBRIS') ORDER BY OBJECT_ID"
+            rows = [([row[0], row[1], row[2], row[3]], row[4]) for row in self.Query(sql_query)]
 
-        # Returning rows
-        return self.debrisTLE
-    
\ No newline at end of file
+        return [row[0] for row in rows], [row[1] == 'PAYLOAD' for row in rows]
+
+    # Screened conjunctions of a satellite, closest first, in the same shape as a risk assessment table.
+    # Empty until a screening run has created the Conjunctions table.
+    @Timed()
+    def GetConjunctions(self, SatelliteID):
+
+        with self.pool.connection() as cursor:
+            if not self.pool.backend.TableExists(cursor, 'Conjunctions'):
+                return []
+
+        sql_query = """SELECT OBJECT_ID, CLOSEST_APPROACH_TIME, CLOSEST_APPROACH_DISTANCE, PROBABILITY, RISK_LEVEL FROM Conjunctions
+                       WHERE SATELLITE_ID = ? ORDER BY CLOSEST_APPROACH_DISTANCE"""
+        rows = self.Query(sql_query, (SatelliteID,))
+
+        return [{
+            "Time of Closest Approach": row[1].strftime("%Y-%m-%d %H:%M:%S") if row[1] else "N/A",
+            "Closest Approach Distance (km)": row[2],
+            "Object": row[0],
+            "Probability of Collision": row[3],
+            "Risk Severity": row[4]
+        } for row in rows]
+
+    # Refresh time of the catalog being served, probed at most once per cache probe interval
+    def GetCatalogVersion(self):
+
+        catalog = self.cache.GetCatalog()
+        if catalog is not None and catalog.refresh_time is not None:
+            return catalog.refresh_time
+
+        return self.GetLastDataRefreshTime()
+
+    # Full catalog rows used to fill the catalog cache
+    @Timed()
+    def GetCatalogRows(self):
+
+        sql_query = "SELECT OBJECT_ID, OBJECT_NAME, OBJECT_TYPE, TLE_LINE0, TLE_LINE1, TLE_LINE2, PERIGEE, APOGEE, NORAD_CAT_ID FROM SpaceObjectTelemetry"
+
+        return [tuple(row) for row in self.Query(sql_query)]
+
+    # Search index of the catalog being served. It comes with the catalog snapshot, without the cache one is built per catalog version.
+    def GetSearchIndex(self):
+
+        catalog = self.cache.GetCatalog()
+        if catalog is not None:
+            return catalog.search_index
+
+        version = self.GetLastDataRefreshTime()
+
+        with self._search_index_lock:
+            if self._search_index is None or self._search_index[0] != version:
+                self._search_index = (version, CatalogSearchIndex.FromCatalogRows(self.GetCatalogRows()))
+
+            return self._search_index[1]
@@ -0,0 +1,278 @@
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import threading
+import time
+import numpy as np
+
+from models.Propagation import TimeGrid, PropagateSatrecs
+from models.Catalog import Catalog
+
+#Precomputed positions of the whole catalog on a one minute grid, written once per catalog version and memory-mapped read-only by every worker process.
+#Files per version: <key>.catalog.npz (the catalog of the version, see Catalog.Save), <key>.positions.f32 (float32, objects x times x 3, km, TEME) and <key>.index.json (grid and object ids).
+#The index is written last, so its presence marks a complete store.
+class EphemerisStore:
+
+    def __init__(self, directory=None):
+
+        self.directory = directory or os.getenv('ephemerisdir', 'ephemeris')
+        self.horizon = timedelta(hours=float(os.getenv('ephemerishours', 48))) # covers the 24 hour assessment window for a full day after each refresh
+        self.time_step = timedelta(minutes=1)
+        self.chunk_size = 512 # objects propagated per block while building
+        self.lock_timeout = 3600 # seconds
+
+        self.key = None
+        self.start_time = None
+        self.count = 0
+        self.object_ids = []
+        self._rows = {}
+        self._positions = None
+
+    #Only the location and version travel to worker processes, each process opens (and maps) a version once and reuses it
+    def __reduce__(self):
+
+        return (OpenEphemerisStore, (self.key, self.directory))
+
+    @staticmethod
+    def GetVersionKey(RefreshTime):
+
+        if isinstance(RefreshTime, datetime):
+            return RefreshTime.strftime("%Y%m%dT%H%M%S%f")
+
+        return "".join(character for character in str(RefreshTime) if character.isalnum())
+
+    def _GetPath(self, key, suffix):
+
+        return os.path.join(self.directory, key + suffix)
+
+    def IsBuilt(self, key):
+
+        return os.path.exists(self._GetPath(key, ".index.json"))
+
+    def IsCatalogPublished(self, key):
+
+        return os.path.exists(self._GetPath(key, ".catalog.npz"))
+
+    #Writes a catalog version (a Catalog or TLE rows), so worker processes can load the catalog without touching the database
+    def PublishCatalog(self, key, TLEs):
+
+        catalog = TLEs if isinstance(TLEs, Catalog) else Catalog.FromTLEs(TLEs)
+
+        os.makedirs(self.directory, exist_ok=True)
+        catalog_path = self._GetPath(key, ".catalog.npz")
+        temporary_path = catalog_path + ".%d.%d.tmp" % (os.getpid(), threading.get_ident())
+
+        catalog.Save(temporary_path)
+        os.replace(temporary_path, catalog_path)
+
+    def Build(self, key, catalog, start_time=None):
+
+        if not self.IsCatalogPublished(key):
+            self.PublishCatalog(key, catalog)
+
+        #Start on a whole minute so request grids can be sliced straight out of the store
+        start_time = (start_time or datetime.now(timezone.utc)).replace(second=0, microsecond=0)
+        grid = TimeGrid(start_time, self.horizon, self.time_step)
+
+        positions_path = self._GetPath(key, ".positions.f32")
+        positions = np.memmap(positions_path + ".tmp", dtype=np.float32, mode='w+', shape=(max(len(catalog), 1), grid.count, 3))
+
+        #Satrecs are parsed a block at a time and dropped again, the builder never holds the whole catalog's
+        for i in range(0, len(catalog), self.chunk_size):
+            rows = range(i, min(i + self.chunk_size, len(catalog)))
+            positions[i:i + len(rows)] = PropagateSatrecs(catalog.ParseSatrecs(rows), grid)
+
+        positions.flush()
+        del positions
+        os.replace(positions_path + ".tmp", positions_path)
+
+        metadata = {
+            "key": key,
+            "start_time": start_time.isoformat(),
+            "step_seconds": grid.step_seconds,
+            "count": grid.count,
+            "object_ids": catalog.GetObjectIDs()
+        }
+
+        metadata_path = self._GetPath(key, ".index.json")
+        with open(metadata_path + ".tmp", "w") as metadata_file:
+            json.dump(metadata, metadata_file)
+        os.replace(metadata_path + ".tmp", metadata_path)
+
+        self.RemoveStaleVersions(key)
+
+    #Builds the store for a catalog version on a background thread. A lock file makes sure only one process per host does the work.
+    def BuildInBackground(self, key, LoadCatalog):
+
+        if self.IsBuilt(key):
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        lock_path = self._GetPath(key, ".lock")
+
+        #A lock left behind by a builder that died is ignored once it is older than the lock timeout
+        if os.path.exists(lock_path) and time.time() - os.path.getmtime(lock_path) > self.lock_timeout:
+            os.remove(lock_path)
+
+        try:
+            lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.close(lock)
+        except FileExistsError:
+            return None
+
+        def build():
+            try:
+                self.Build(key, LoadCatalog())
+            except Exception as e:
+                print(f"Failed to build the ephemeris store for catalog version {key}: {e}")
+            finally:
+                os.remove(lock_path)
+
+        builder = threading.Thread(target=build, daemon=True)
+        builder.start()
+
+        return builder
+
+    #Keeps the new version and the one before it, readers that still map an older file keep their mapping after the unlink
+    def RemoveStaleVersions(self, key):
+
+        keys = sorted(set(name[:-len(".catalog.npz")] for name in os.listdir(self.directory) if name.endswith(".catalog.npz")))
+        stale = [stale_key for stale_key in keys if stale_key != key][:-1]
+
+        for stale_key in stale:
+            for suffix in (".index.json", ".positions.f32", ".catalog.npz"):
+                try:
+                    os.remove(self._GetPath(stale_key, suffix))
+                except FileNotFoundError:
+                    pass
+
+    #Switches this reader to a catalog version. Returns False if that version has not been built yet.
+    def Open(self, key):
+
+        if self.key == key:
+            return True
+
+        if not self.IsBuilt(key):
+            return False
+
+        with open(self._GetPath(key, ".index.json")) as metadata_file:
+            metadata = json.load(metadata_file)
+
+        self.key = key
+        self.start_time = datetime.fromisoformat(metadata["start_time"])
+        self.time_step = timedelta(seconds=metadata["step_seconds"])
+        self.count = metadata["count"]
+        self.object_ids = metadata["object_ids"]
+        self._rows = {object_id: row for row, object_id in enumerate(self.object_ids)}
+        self._positions = None
+
+        return True
+
+    def GetPositionsArray(self):
+
+        if self._positions is None:
+            self._positions = np.memmap(self._GetPath(self.key, ".positions.f32"), dtype=np.float32, mode='r',
+                                        shape=(max(len(self.object_ids), 1), self.count, 3))
+
+        return self._positions
+
+    #Grid of `duration` starting at the first stored sample at or after start_time, or None if the store does not cover it at `time_step`
+    def GetTimeGrid(self, start_time, duration, time_step):
+
+        if self.key is None or time_step != self.time_step:
+            return None
+
+        step_seconds = self.time_step.total_seconds()
+        first = int(np.ceil((start_time - self.start_time).total_seconds() / step_seconds))
+        grid_start = self.start_time + first * self.time_step
+        grid = TimeGrid(grid_start, duration, time_step)
+
+        if first < 0 or first + grid.count > self.count:
+            return None
+
+        grid.ephemeris_offset = first
+        return grid
+
+    #Positions (N x T x 3, km) of the objects over a grid from GetTimeGrid, and a mask of the objects that were found in the store
+    def GetTrajectories(self, object_ids, grid):
+
+        rows = np.array([self._rows.get(object_id, -1) for object_id in object_ids], dtype=np.int64)
+        found = rows >= 0
+
+        trajectories = np.full((len(object_ids), grid.count, 3), np.nan)
+        if np.any(found):
+            first = grid.ephemeris_offset
+            if grid.sample_indices is None:
+                trajectories[found] = self.GetPositionsArray()[rows[found], first:first + grid.count]
+            else:
+                trajectories[found] = self.GetPositionsArray()[np.ix_(rows[found], first + grid.sample_indices)]
+
+        return trajectories, found
+
+    #Epoch and positions of one object sampled every `step` between two times, or (None, None) if the store does not cover them
+    def GetSampledTrajectory(self, object_id, start_time, end_time, step):
+
+        row = self._rows.get(object_id)
+        if row is None:
+            return None, None
+
+        step_seconds = self.time_step.total_seconds()
+        first = int(np.floor((start_time - self.start_time).total_seconds() / step_seconds))
+        last = int(np.ceil((end_time - self.start_time).total_seconds() / step_seconds))
+        stride = max(1, int(round(step.total_seconds() / step_seconds)))
+
+        if first < 0 or last >= self.count:
+            return None, None
+
+        indices = np.arange(first, last + stride, stride)
+        indices = indices[indices < self.count]
+
+        return self.start_time + first * self.time_step, np.asarray(self.GetPositionsArray()[row, indices], dtype=np.float64)
+
+_open_stores = {}
+
+#Opened stores are shared per process and per version, so every request and task for a version reuses one memory map.
+#Returns None if the version has not been built yet.
+def OpenEphemerisStore(key, directory=None):
+
+    directory = directory or os.getenv('ephemerisdir', 'ephemeris')
+    store = _open_stores.get((directory, key))
+
+    if store is None:
+        store = EphemerisStore(directory)
+        if not store.Open(key):
+            return None
+
+        #Only the current and previous versions stay mapped
+        for stale in [cached for cached in _open_stores if cached[0] == directory][:-1]:
+            _open_stores.pop(stale, None)
+        _open_stores[(directory, key)] = store
+
+    return store
+
+_loaded_catalogs = {}
+
+#Catalog of a published catalog version, loaded once per process. Returns None if the version has not been published.
+def LoadCatalog(key, directory=None):
+
+    directory = directory or os.getenv('ephemerisdir', 'ephemeris')
+    catalog = _loaded_catalogs.get((directory, key))
+
+    if catalog is None:
+        try:
+            catalog = Catalog.Load(os.path.join(directory, key + ".catalog.npz"))
+        except FileNotFoundError:
+            return None
+
+        for stale in [cached for cached in _loaded_catalogs if cached[0] == directory][:-1]:
+            _loaded_catalogs.pop(stale, None)
+        _loaded_catalogs[(directory, key)] = catalog
+
+    return catalog
+
+#Row of every object id in a published catalog version, or None if the version has not been published
+def GetCatalogIndex(key, directory=None):
+
+    catalog = LoadCatalog(key, directory)
+
+    return None if catalog is None else catalog.GetIndex()
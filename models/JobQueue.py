@@ -0,0 +1,132 @@
+from datetime import datetime, timezone
+import os
+import queue
+import threading
+import time
+import uuid
+
+#A queued piece of background work, e.g. a risk assessment. Progress is reported as (objects processed, total objects).
+class Job:
+
+    def __init__(self, kind, parameters, run):
+
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.parameters = parameters
+        self.status = "queued"
+        self.processed = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.created_time = datetime.now(timezone.utc)
+        self.finished_time = None
+
+        self._run = run
+        self._finished = None
+
+    #Matches the assessor's progress callback, the running results themselves are not kept on the job
+    def SetProgress(self, processed, total, partial_result=None):
+
+        self.processed = processed
+        self.total = total
+
+    def IsFinished(self):
+
+        return self.status in ("done", "failed")
+
+    def GetStatus(self):
+
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "processed": self.processed,
+            "total": self.total,
+            "error": self.error,
+            "created_time": self.created_time.isoformat(),
+            "finished_time": self.finished_time.isoformat() if self.finished_time else None
+        }
+
+#Bounded local job queue. A fixed number of runner threads (maxjobs) take jobs off the queue, so CPU-heavy work
+#is decoupled from request handling and at most maxqueuedjobs jobs wait for a runner.
+class JobQueue:
+
+    def __init__(self, max_jobs=None, max_queued=None):
+
+        self.max_jobs = max_jobs or int(os.getenv('maxjobs', 2))
+        self.max_queued = max_queued or int(os.getenv('maxqueuedjobs', 32))
+        self.retention = float(os.getenv('jobretentionseconds', 3600)) # finished jobs are forgotten after this long
+
+        self._queue = queue.Queue(maxsize=self.max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._runners = []
+
+    #Starts the runner threads on first use, so importing the app does not spawn them
+    def _StartRunners(self):
+
+        with self._lock:
+            if self._runners:
+                return
+
+            for i in range(self.max_jobs):
+                runner = threading.Thread(target=self._RunJobs, name="JobRunner-%d" % i, daemon=True)
+                runner.start()
+                self._runners.append(runner)
+
+    def _RunJobs(self):
+
+        while True:
+            job = self._queue.get()
+
+            try:
+                job.status = "running"
+                job.result = job._run(job)
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e)
+                job.status = "failed"
+            finally:
+                job.finished_time = datetime.now(timezone.utc)
+                job._finished = time.monotonic()
+                self._queue.task_done()
+
+    def _RemoveExpiredJobs(self):
+
+        now = time.monotonic()
+
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.IsFinished() and now - job._finished > self.retention]:
+                del self._jobs[job_id]
+
+    #Queues run(job) and returns the job straight away. Raises queue.Full when the queue is at capacity.
+    def Submit(self, kind, parameters, run):
+
+        self._StartRunners()
+        self._RemoveExpiredJobs()
+
+        job = Job(kind, parameters, run)
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.job_id]
+            raise
+
+        return job
+
+    def GetJob(self, job_id):
+
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def GetStats(self):
+
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+
+        return {status: statuses.count(status) for status in ("queued", "running", "done", "failed")}
@@ -0,0 +1,238 @@
+import bisect
+import cProfile
+from contextlib import contextmanager
+import functools
+import os
+import threading
+import time
+
+#Latency buckets in seconds, from a cached catalog read to a full catalog assessment
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+#Help text of every metric family, also the order they are exposed in
+FAMILIES = {
+    "eosca_request_seconds": ("histogram", "Latency of API requests by endpoint, method and status."),
+    "eosca_stage_seconds": ("histogram", "Latency of the instrumented stages of a request, a refresh or a worker task."),
+    "eosca_worker_pool_wait_seconds": ("histogram", "Time a task waited in the worker pool queue before a worker picked it up."),
+    "eosca_db_pool_wait_seconds": ("histogram", "Time spent waiting for a pooled database connection."),
+    "eosca_db_pool_timeouts_total": ("counter", "Requests for a pooled database connection that timed out."),
+    "eosca_objects_propagated_total": ("counter", "Objects propagated with sgp4, one per object per propagation call."),
+    "eosca_sgp4_calls_total": ("counter", "State vectors evaluated by sgp4.")
+}
+
+class Histogram:
+
+    def __init__(self, buckets=BUCKETS):
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def Observe(self, value):
+
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def Add(self, counts, total, count):
+
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+#Stages timed on this thread while a request profile is active
+_profile = threading.local()
+
+#Process-local histograms and counters, keyed by (family, labels). Worker processes record into their own registry and ship it
+#back with every task result (see Drain and Merge), so /metrics covers the work done in the pool as well.
+class MetricsRegistry:
+
+    def __init__(self):
+
+        self.enabled = os.getenv('metrics', '1') != '0'
+
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+        #Workers are forked from a multi-threaded process, see _ResetInChild
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._ResetInChild)
+
+    def Observe(self, family, value, **labels):
+
+        if not self.enabled:
+            return
+
+        key = (family, tuple(sorted(labels.items())))
+
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.Observe(value)
+
+    def Increment(self, family, value=1, **labels):
+
+        if not self.enabled:
+            return
+
+        key = (family, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    #A forked worker starts with a copy of its parent's metrics, they are dropped so they are not shipped back a second time.
+    #The lock is replaced rather than acquired: a request thread of the parent may have held it at fork time, and in the child
+    #nothing would ever release it.
+    def _ResetInChild(self):
+
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    #Everything recorded since the last drain, as plain data that pickles cheaply, and starts again from zero
+    def Drain(self):
+
+        with self._lock:
+            histograms = {key: (histogram.counts, histogram.sum, histogram.count) for key, histogram in self._histograms.items()}
+            counters = self._counters
+            self._histograms = {}
+            self._counters = {}
+
+        return histograms, counters
+
+    def Merge(self, drained):
+
+        histograms, counters = drained
+
+        with self._lock:
+            for key, (counts, total, count) in histograms.items():
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram()
+                histogram.Add(counts, total, count)
+
+            for key, value in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + value
+
+    #Prometheus text exposition format. Gauges are {name: (help, value)} read from the caller's own statistics.
+    def GetPrometheusText(self, gauges=None):
+
+        with self._lock:
+            histograms = {key: (list(histogram.counts), histogram.sum, histogram.count) for key, histogram in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for family, (kind, description) in FAMILIES.items():
+
+            lines.append("# HELP %s %s" % (family, description))
+            lines.append("# TYPE %s %s" % (family, kind))
+
+            for (name, labels), (counts, total, count) in sorted(histograms.items()):
+                if name != family:
+                    continue
+
+                cumulative = 0
+                for bound, bucket_count in zip(BUCKETS + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    lines.append("%s_bucket%s %d" % (family, _FormatLabels(labels + (("le", "+Inf" if bound == float('inf') else repr(bound)),)), cumulative))
+                lines.append("%s_sum%s %r" % (family, _FormatLabels(labels), total))
+                lines.append("%s_count%s %d" % (family, _FormatLabels(labels), count))
+
+            for (name, labels), value in sorted(counters.items()):
+                if name == family:
+                    lines.append("%s%s %r" % (family, _FormatLabels(labels), value))
+
+        for name, (description, value) in (gauges or {}).items():
+            lines.append("# HELP %s %s" % (name, description))
+            lines.append("# TYPE %s gauge" % name)
+            lines.append("%s %r" % (name, float(value)))
+
+        return "\n".join(lines) + "\n"
+
+def _FormatLabels(labels):
+
+    if not labels:
+        return ""
+
+    return "{" + ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for name, value in labels) + "}"
+
+Registry = MetricsRegistry()
+
+def Observe(family, value, **labels):
+
+    Registry.Observe(family, value, **labels)
+
+def Increment(family, value=1, **labels):
+
+    Registry.Increment(family, value, **labels)
+
+#Times a stage into eosca_stage_seconds, and into the breakdown of the request being profiled on this thread
+@contextmanager
+def Span(stage):
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        Registry.Observe("eosca_stage_seconds", elapsed, stage=stage)
+
+        stages = getattr(_profile, "stages", None)
+        if stages is not None:
+            stages.append((stage, elapsed))
+
+#Decorator form of Span, named after the function (e.g. DBRead.GetDebrisTLEs) unless a stage is given
+def Timed(stage=None):
+
+    def Decorate(function):
+
+        name = stage or function.__qualname__
+
+        @functools.wraps(function)
+        def Wrapper(*args, **kwargs):
+            with Span(name):
+                return function(*args, **kwargs)
+
+        return Wrapper
+
+    return Decorate
+
+#Opt-in profile of a single request on the current thread: the time spent in each stage (for a Server-Timing header)
+#and, with use_cprofile, a cProfile of the whole request.
+class RequestProfile:
+
+    def __init__(self, use_cprofile=False):
+
+        _profile.stages = self.stages = []
+        self.profiler = None
+
+        if use_cprofile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def Finish(self):
+
+        if self.profiler is not None:
+            self.profiler.disable()
+        _profile.stages = None
+
+    #Total time per stage in first-seen order, e.g. DBRead.GetSatelliteTLE;dur=1.2, CollisionRiskAssessor.AssessCollisionRiskParallel;dur=830.4
+    def GetServerTiming(self):
+
+        totals = {}
+        for stage, elapsed in self.stages:
+            totals[stage] = totals.get(stage, 0.0) + elapsed
+
+        return ", ".join("%s;dur=%.1f" % (stage, elapsed * 1000.0) for stage, elapsed in totals.items())
+
+    #Writes the cProfile stats (readable with pstats or snakeviz) and returns the file path
+    def Dump(self, directory, name):
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "%s-%d-%s.prof" % (time.strftime("%Y%m%dT%H%M%S"), threading.get_ident(), name))
+        self.profiler.dump_stats(path)
+
+        return path
@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+import math
+
+MU_EARTH = 398600.8 # km^3/s^2 (WGS72)
+RADIUS_EARTH = 6378.135 # km (WGS72)
+
+#Epoch of a TLE from line 1 (two digit year and fractional day of year)
+def GetTLEEpoch(TLE_LINE1):
+
+    year = int(TLE_LINE1[18:20])
+    year += 1900 if year >= 57 else 2000
+    day_of_year = float(TLE_LINE1[20:32])
+
+    return datetime(year, 1, 1) + timedelta(days=day_of_year - 1)
+
+#Perigee and apogee altitudes (km), inclination (degrees) and epoch of an object, derived from its mean elements
+def GetOrbitalShell(TLE_LINE1, TLE_LINE2):
+
+    inclination = float(TLE_LINE2[8:16])
+    eccentricity = float("0." + TLE_LINE2[26:33].strip())
+    mean_motion = float(TLE_LINE2[52:63]) * 2.0 * math.pi / 86400.0 # rad/s
+
+    semi_major_axis = (MU_EARTH / mean_motion**2) ** (1.0 / 3.0)
+
+    return {
+        "perigee": semi_major_axis * (1.0 - eccentricity) - RADIUS_EARTH,
+        "apogee": semi_major_axis * (1.0 + eccentricity) - RADIUS_EARTH,
+        "inclination": inclination,
+        "epoch": GetTLEEpoch(TLE_LINE1)
+    }
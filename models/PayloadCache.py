@@ -0,0 +1,66 @@
+import gzip
+import hashlib
+import threading
+
+#Brotli is optional, without it payloads are only stored gzip-compressed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+#A response body serialized once and stored in every encoding a client may ask for, with an ETag for conditional requests
+class CompressedPayload:
+
+    def __init__(self, body, etag):
+
+        self.etag = etag
+        self.encodings = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+
+        if brotli is not None:
+            self.encodings["br"] = brotli.compress(body, quality=11)
+
+    #The smallest stored encoding the request accepts. Accept-Encoding q-values of 0 rule an encoding out, identity is always acceptable.
+    def GetEncoding(self, accept_encodings):
+
+        accepted = [encoding for encoding in self.encodings if encoding != "identity" and accept_encodings[encoding] > 0]
+
+        return min(accepted, key=lambda encoding: len(self.encodings[encoding])) if accepted else "identity"
+
+    #If-None-Match uses the weak comparison: a W/ prefix added by a proxy still matches
+    def IsNotModified(self, if_none_match):
+
+        return if_none_match.contains_weak(self.etag)
+
+#Payloads that only change when the catalog is refreshed, built once per catalog version. The ETag is derived from the version,
+#so it changes exactly when LastRefresh does.
+class PayloadCache:
+
+    def __init__(self):
+
+        self._payloads = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def GetETag(name, version):
+
+        return hashlib.sha1(("%s|%s" % (name, version)).encode()).hexdigest()[:20]
+
+    #build returns the body as bytes and only runs when the version of the payload changed
+    def GetPayload(self, name, version, build):
+
+        payload = self._payloads.get(name)
+        if payload is not None and payload[0] == version:
+            return payload[1]
+
+        #One thread builds a new version, the others wait for it instead of serializing the catalog again
+        with self._lock:
+            payload = self._payloads.get(name)
+            if payload is None or payload[0] != version:
+                payload = self._payloads[name] = (version, CompressedPayload(build(), self.GetETag(name, version)))
+
+        return payload[1]
+
+    def Clear(self):
+
+        with self._lock:
+            self._payloads.clear()
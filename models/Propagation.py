@@ -0,0 +1,108 @@
+import copy
+from datetime import timedelta
+import math
+import numpy as np
+from sgp4.api import Satrec, SatrecArray, jday
+
+from models.Metrics import Increment
+
+#Shared time grid for a request. Every object is propagated over the same split Julian dates so positions line up index by index.
+class TimeGrid:
+
+    def __init__(self, start_time, duration, time_step):
+
+        self.start_time = start_time
+        self.step_seconds = time_step.total_seconds()
+        self.count = int(math.ceil(duration.total_seconds() / self.step_seconds))
+
+        #Seconds elapsed since start_time for every point on the grid
+        self.offsets = np.arange(self.count, dtype=np.float64) * self.step_seconds
+
+        jd, fr = jday(start_time.year, start_time.month, start_time.day,
+                      start_time.hour, start_time.minute, start_time.second + start_time.microsecond * 1e-6)
+
+        #sgp4 only cares about jd + fr, so the whole-day part is kept constant and the offsets are added to the fraction
+        self.jd = np.full(self.count, jd)
+        self.fr = fr + self.offsets / 86400.0
+
+        #Index of the first sample in the ephemeris store when the grid was sliced out of it
+        self.ephemeris_offset = None
+
+        #Samples of the original grid this grid is made of, None when it is not a subgrid
+        self.sample_indices = None
+
+    #Grid made of a subset of this grid's samples (e.g. every n-th one). Offsets stay relative to this grid's start.
+    def GetSubgrid(self, indices):
+
+        subgrid = copy.copy(self)
+        subgrid.count = len(indices)
+        subgrid.offsets = self.offsets[indices]
+        subgrid.jd = self.jd[indices]
+        subgrid.fr = self.fr[indices]
+        subgrid.sample_indices = indices if self.sample_indices is None else self.sample_indices[indices]
+
+        return subgrid
+
+    def GetTime(self, index):
+
+        return self.GetTimeAtOffset(self.offsets[index])
+
+    def GetTimeAtOffset(self, seconds):
+
+        return self.start_time + timedelta(seconds=float(seconds))
+
+#Objects propagated and state vectors evaluated, for the sgp4 counters on /metrics
+def CountPropagation(objects, samples):
+
+    Increment("eosca_objects_propagated_total", objects)
+    Increment("eosca_sgp4_calls_total", objects * samples)
+
+#Parses the two TLE lines of an [OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2] row
+def ParseSatrec(TLE):
+
+    return Satrec.twoline2rv(TLE[2], TLE[3])
+
+#Positions (T x 3, km, TEME) of a single object over the grid. Failed propagation points are returned as NaN.
+def PropagateSatrec(satrec, grid):
+
+    e, r, v = satrec.sgp4_array(grid.jd, grid.fr)
+    r[e != 0] = np.nan
+    CountPropagation(1, grid.count)
+
+    return r
+
+#Positions (N x T x 3, km, TEME) of many objects over the grid, propagated in a single call
+def PropagateSatrecs(satrecs, grid):
+
+    if len(satrecs) == 0:
+        return np.empty((0, grid.count, 3))
+
+    e, r, v = SatrecArray(satrecs).sgp4(grid.jd, grid.fr)
+    r[e != 0] = np.nan
+    CountPropagation(len(satrecs), grid.count)
+
+    return r
+
+#Positions and velocities (N x T x 3, km and km/s, TEME) of many objects over the grid. Failed propagation points are returned as NaN.
+def PropagateSatrecStates(satrecs, grid):
+
+    if len(satrecs) == 0:
+        return np.empty((0, grid.count, 3)), np.empty((0, grid.count, 3))
+
+    e, r, v = SatrecArray(satrecs).sgp4(grid.jd, grid.fr)
+    r[e != 0] = np.nan
+    v[e != 0] = np.nan
+    CountPropagation(len(satrecs), grid.count)
+
+    return r, v
+
+#Distance matrix (N x T) between a reference trajectory (T x 3) and a stack of trajectories (N x T x 3)
+def GetRangeMatrix(reference_positions, positions):
+
+    relative = positions - reference_positions[np.newaxis, :, :]
+    ranges = np.sqrt(np.einsum('ntk,ntk->nt', relative, relative))
+
+    #Points where either object failed to propagate can never be the closest approach
+    ranges[np.isnan(ranges)] = np.inf
+
+    return ranges
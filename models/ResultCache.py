@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+import os
+import threading
+import time
+
+#TTL/LRU cache of assessment results with single-flight coalescing: while a result is being computed, identical
+#requests wait for that computation instead of starting their own.
+#Keys carry the catalog version and a time bucket, so a refresh or the passing of a bucket never serves a stale result.
+class ResultCache:
+
+    def __init__(self, max_entries=None, ttl=None, bucket_seconds=None):
+
+        self.max_entries = max_entries or int(os.getenv('resultcacheentries', 128))
+        self.ttl = ttl if ttl is not None else float(os.getenv('resultcacheseconds', 300))
+        self.bucket_seconds = bucket_seconds or float(os.getenv('resultbucketseconds', 300))
+
+        self._results = OrderedDict() # key -> (result, expiry)
+        self._in_flight = {} # key -> Future
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    #Assessments start "now", requests within the same bucket share one time grid's worth of results
+    def GetKey(self, *parameters):
+
+        return parameters + (int(time.time() // self.bucket_seconds),)
+
+    def GetOrCompute(self, key, compute):
+
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._results.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._results[key]
+
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        #Another request is already computing this result, wait for it (failures are raised to every waiter)
+        if not owner:
+            return future.result()
+
+        #Whatever stops the computation (KeyboardInterrupt and SystemExit included) resolves the future, so waiters never hang on it
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._results[key] = (result, time.monotonic() + self.ttl)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+            del self._in_flight[key]
+
+        future.set_result(result)
+
+        return result
+
+    def Clear(self):
+
+        with self._lock:
+            self._results.clear()
+
+    def GetStats(self):
+
+        with self._lock:
+            return {"results": len(self._results), "in_flight": len(self._in_flight), "hits": self.hits,
+                    "misses": self.misses, "coalesced": self.coalesced}
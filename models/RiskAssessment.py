@@ -1,10 +1,15 @@
+from concurrent.futures import FIRST_COMPLETED, wait
 from datetime import datetime, timedelta, timezone
+import heapq
 import numpy as np
-from concurrent.futures import  ProcessPoolExecutor
-from models.SpaceObjects import DebrisElement, SatelliteElement
-import os
-from satellite_czml import satellite_czml as sczml
-import json
+from models.SpaceObjects import DebrisElement
+from models.CZMLWriter import CZMLWriter
+from models.Propagation import TimeGrid, ParseSatrec, PropagateSatrecs, PropagateSatrecStates, GetRangeMatrix
+from models.ClosestApproach import SolveClosestApproaches, GetMissDistanceBounds
+from models.OrbitalElements import GetOrbitalShell, RADIUS_EARTH
+from models.EphemerisStore import GetCatalogIndex
+from models.WorkerPool import WorkerPool, AssessCatalogChunk, AssessTLEChunk, AssessFleetCatalogChunk, AssessFleetTLEChunk
+from models.Metrics import Span, Timed
 
 class RiskAssessment:
     def __init__(self, debris_id, closest_approach_time, closest_approach_distance, probability, risk_level):
@@ -24,9 +29,15 @@ class CollisionRiskAssessor:
         self.radius_debris = 0.10 # km (worst case scenario: debris field)
         self.risk_boundary = self.margin_of_error + self.threshold_distance #The sum of margin_of_error and threshold_distance, representing a distance beyond which the risk of collision is considered extremely low.
         self.collision_radius = self.radius_satellite + self.radius_debris
-        self.start_time = datetime.now(timezone.utc)
+        self.start_time = datetime.now(timezone.utc) # start of the grid of the last assessment, the CZML of its scene covers the same window
         self.duration = timedelta(hours=24)
         self.time_step = timedelta(minutes=1)
+        self.prefilter_margin = 50.0 # km Allowance on top of risk_boundary for short-period perturbations and decay that mean-element perigee/apogee do not capture
+        self.candidates_per_object = None # coarse range minima per debris object refined to a sub-second time of closest approach, lowest first (None refines every minimum; the lowest coarse sample is not always the closest approach)
+        self.chunk_memory_budget = 64 * 1024 * 1024 # bytes of positions a single worker chunk may hold
+        self.max_results = 50 # closest debris objects kept in the assessment
+        self.coarse_strides = (8, 2) # sample spacing (in grid steps) of the coarse scans that prune debris before the full-resolution scan
+        self.bound_margin = 1.05 # allowance on top of two-body gravity for the perturbations sgp4 adds to the relative acceleration
 
     @staticmethod
     def calculate_distance(pos1, pos2):
@@ -59,52 +70,361 @@ class CollisionRiskAssessor:
         else:
             return "Undefined"
     
-    def assess_risk_for_single_debris(self,satellite_tle, debris_tle, timeinterval):
+    def GetAltitudeBand(self, satellite_tle):
+
+        #Debris outside this altitude band can never come within risk_boundary of the satellite
+        shell = GetOrbitalShell(satellite_tle[2], satellite_tle[3])
+        margin = self.risk_boundary + self.prefilter_margin
+
+        return shell["perigee"] - margin, shell["apogee"] + margin
+
+    #Band covering the altitude bands of every satellite of a fleet, the debris of all of them are read in one query
+    def GetFleetAltitudeBand(self, satellite_tles):
+
+        bands = [self.GetAltitudeBand(satellite_tle) for satellite_tle in satellite_tles]
+
+        return min(band[0] for band in bands), max(band[1] for band in bands)
+
+    def GetTimeGrid(self, timeinterval, ephemeris=None):
 
-        satellite = SatelliteElement(satellite_tle)
-        debris = DebrisElement(debris_tle)
-        
-        closest_approach_distance = float('inf')
-        closest_approach_time = None
-        current_time = datetime.utcnow()
-        end_time = current_time + timedelta(hours=24)
+        start_time = datetime.now(timezone.utc)
         time_step = timedelta(minutes=timeinterval)
-        
-        while current_time < end_time:
-            r_satellite = satellite.get_position(current_time)
-            r_debris = debris.get_position(current_time)
-            
-            distance = self.calculate_distance(r_satellite, r_debris)
-            if distance < closest_approach_distance:
-                closest_approach_distance = distance
-                closest_approach_time = current_time
-            
-            current_time += time_step
-        
+
+        #Prefer a grid aligned with the precomputed ephemeris so trajectories can be sliced instead of propagated
+        grid = ephemeris.GetTimeGrid(start_time, self.duration, time_step) if ephemeris is not None else None
+
+        #One grid per request, shared by the satellite and every debris object
+        if grid is None:
+            grid = TimeGrid(start_time, self.duration, time_step)
+
+        self.start_time = grid.start_time
+
+        return grid
+
+    @staticmethod
+    def GetTrajectories(tles, satrecs, grid, ephemeris=None):
+
+        if ephemeris is None or grid.ephemeris_offset is None:
+            return PropagateSatrecs(satrecs, grid)
+
+        #Objects missing from the store (e.g. added after it was built) are propagated on the spot
+        trajectories, found = ephemeris.GetTrajectories([tle[0] for tle in tles], grid)
+        missing = np.flatnonzero(~found)
+        if len(missing):
+            trajectories[missing] = PropagateSatrecs([satrecs[i] for i in missing], grid)
+
+        return trajectories
+
+    def GetResult(self, debris_id, closest_approach_distance, closest_approach_time):
 
         probability = self.calculate_probability(closest_approach_distance)
         risk_level = self.determine_risk_level(probability)
-        
+
         return {
-            "debris_id": debris.object_id,
+            "debris_id": debris_id,
             "closest_approach_time": closest_approach_time,
             "closest_approach_distance": closest_approach_distance,
             "probability": probability,
             "risk_level": risk_level
         }
-            
 
-    def AssessCollisionRiskParallel(self, satellite_tle, debris_tles, TimeInterval):
+    #Staged coarse scans that drop debris whose miss distance provably cannot make the top_k. Returns the indices of the debris that survive.
+    @Timed()
+    def PruneDebris(self, satellite_tle, satellite_satrec, debris_tles, debris_satrecs, grid, top_k, prune_bound=float('inf')):
+
+        survivors = np.arange(len(debris_tles))
+
+        #Lowest radius each object reaches, with the same allowance the altitude prefilter uses for the mean elements
+        satellite_lowest_radius = GetOrbitalShell(satellite_tle[2], satellite_tle[3])["perigee"] + RADIUS_EARTH - self.prefilter_margin
+        lowest_radii = np.array([GetOrbitalShell(debris_tle[2], debris_tle[3])["perigee"] for debris_tle in debris_tles]) + RADIUS_EARTH - self.prefilter_margin
+
+        for stride in self.coarse_strides:
+
+            if len(survivors) <= top_k or stride <= 1:
+                break
+
+            #Every stride-th sample of the grid, and its last sample so no point of the window is more than half a stride from a sample
+            indices = np.arange(0, grid.count, stride)
+            if indices[-1] != grid.count - 1:
+                indices = np.append(indices, grid.count - 1)
+            subgrid = grid.GetSubgrid(indices)
+
+            satellite_positions, satellite_velocities = PropagateSatrecStates([satellite_satrec], subgrid)
+            debris_positions, debris_velocities = PropagateSatrecStates([debris_satrecs[i] for i in survivors], subgrid)
+
+            lower_bounds, upper_bounds = GetMissDistanceBounds(debris_positions - satellite_positions, debris_velocities - satellite_velocities,
+                                                               stride * grid.step_seconds / 2, lowest_radii[survivors], satellite_lowest_radius, self.bound_margin)
+
+            #A sampled range is an upper bound on the object's miss distance, so the k-th smallest one bounds the k-th best miss distance
+            if len(upper_bounds) >= top_k:
+                prune_bound = min(prune_bound, np.partition(upper_bounds, top_k - 1)[top_k - 1])
+
+            #The full-resolution scan may read float32 positions from the ephemeris store, which are good to about a metre
+            survivors = survivors[lower_bounds <= prune_bound + 1e-3]
+
+        return survivors
+
+    #With top_k, only debris that can still be among the top_k closest (and closer than prune_bound) are assessed at full resolution and returned
+    @Timed()
+    def assess_risk_for_debris_batch(self, satellite_tle, debris_tles, grid, candidates_per_object=None, ephemeris=None, debris_satrecs=None, top_k=None, prune_bound=float('inf')):
+
+        satellite_satrec = ParseSatrec(satellite_tle)
+        if debris_satrecs is None:
+            debris_satrecs = [ParseSatrec(debris_tle) for debris_tle in debris_tles]
+
+        #Staging only pays off when the debris have to be propagated, positions sliced from the ephemeris store cost next to nothing
+        if top_k is not None and (ephemeris is None or grid.ephemeris_offset is None):
+            survivors = self.PruneDebris(satellite_tle, satellite_satrec, debris_tles, debris_satrecs, grid, top_k, prune_bound)
+            debris_tles = [debris_tles[i] for i in survivors]
+            debris_satrecs = [debris_satrecs[i] for i in survivors]
+
+        with Span("CollisionRiskAssessor.GetTrajectories"):
+            satellite_positions = self.GetTrajectories([satellite_tle], [satellite_satrec], grid, ephemeris)[0]
+            debris_positions = self.GetTrajectories(debris_tles, debris_satrecs, grid, ephemeris)
+
+        #Coarse scan over the (objects x times) range matrix, then range-rate root finding around each local minimum
+        with Span("CollisionRiskAssessor.SolveClosestApproaches"):
+            ranges = GetRangeMatrix(satellite_positions, debris_positions)
+            closest_offsets, closest_distances = SolveClosestApproaches(satellite_satrec, debris_satrecs, grid, ranges, candidates_per_object)
+
+        risk_assessments = []
+        for debris_tle, closest_offset, closest_distance in zip(debris_tles, closest_offsets, closest_distances):
+
+            if np.isinf(closest_distance):
+                risk_assessments.append(self.GetResult(debris_tle[0], float('inf'), None))
+            else:
+                risk_assessments.append(self.GetResult(debris_tle[0], float(closest_distance), grid.GetTimeAtOffset(closest_offset)))
+
+        #Only the results that can still make the top_k travel back
+        if top_k is not None:
+            risk_assessments = [assessment for assessment in heapq.nsmallest(top_k, risk_assessments, key=lambda x: (x['closest_approach_distance'], x['debris_id']))
+                                if assessment['closest_approach_distance'] <= prune_bound]
+
+        return risk_assessments
+
+    #Assesses every satellite of a fleet against one batch of debris, propagating the debris once. Each satellite only sees the debris whose
+    #perigee/apogee shell (debris_shells, derived from the TLEs when None) overlaps its own altitude band. Returns one list of results per satellite,
+    #with top_k the closest top_k of each that are closer than its prune bound.
+    @Timed()
+    def assess_fleet_for_debris_batch(self, satellite_tles, debris_tles, grid, candidates_per_object=None, ephemeris=None, debris_satrecs=None, debris_shells=None, top_k=None, prune_bounds=None):
+
+        satellite_satrecs = [ParseSatrec(satellite_tle) for satellite_tle in satellite_tles]
+        if debris_satrecs is None:
+            debris_satrecs = [ParseSatrec(debris_tle) for debris_tle in debris_tles]
+
+        if debris_shells is None:
+            shells = [GetOrbitalShell(debris_tle[2], debris_tle[3]) for debris_tle in debris_tles]
+            debris_shells = (np.array([shell["perigee"] for shell in shells]), np.array([shell["apogee"] for shell in shells]))
+        debris_perigee, debris_apogee = debris_shells
+
+        if prune_bounds is None:
+            prune_bounds = [float('inf')] * len(satellite_tles)
+
+        #Propagated debris also get their velocities, so each satellite can drop the debris that provably cannot make its top_k before the
+        #closest approach solver runs. Positions sliced from the ephemeris store have no velocities and every debris object is solved.
+        debris_velocities = None
+        with Span("CollisionRiskAssessor.GetTrajectories"):
+            if top_k is not None and (ephemeris is None or grid.ephemeris_offset is None):
+                satellite_positions, satellite_velocities = PropagateSatrecStates(satellite_satrecs, grid)
+                debris_positions, debris_velocities = PropagateSatrecStates(debris_satrecs, grid)
+            else:
+                satellite_positions = self.GetTrajectories(satellite_tles, satellite_satrecs, grid, ephemeris)
+                debris_positions = self.GetTrajectories(debris_tles, debris_satrecs, grid, ephemeris)
+
+        lowest_radii = debris_perigee + RADIUS_EARTH - self.prefilter_margin
+
+        fleet_assessments = []
+        for s, (satellite_tle, satellite_satrec, prune_bound) in enumerate(zip(satellite_tles, satellite_satrecs, prune_bounds)):
+
+            lower_altitude, upper_altitude = self.GetAltitudeBand(satellite_tle)
+            rows = np.flatnonzero((debris_perigee <= upper_altitude) & (debris_apogee >= lower_altitude))
+
+            #The staged coarse scans of PruneDebris, on samples of the states already propagated instead of propagating again
+            if debris_velocities is not None:
+                with Span("CollisionRiskAssessor.PruneDebris"):
+                    satellite_lowest_radius = GetOrbitalShell(satellite_tle[2], satellite_tle[3])["perigee"] + RADIUS_EARTH - self.prefilter_margin
+
+                    for stride in self.coarse_strides:
+
+                        if len(rows) <= top_k or stride <= 1:
+                            break
+
+                        indices = np.arange(0, grid.count, stride)
+                        if indices[-1] != grid.count - 1:
+                            indices = np.append(indices, grid.count - 1)
+
+                        lower_bounds, upper_bounds = GetMissDistanceBounds(debris_positions[np.ix_(rows, indices)] - satellite_positions[s, indices],
+                                                                           debris_velocities[np.ix_(rows, indices)] - satellite_velocities[s, indices],
+                                                                           stride * grid.step_seconds / 2, lowest_radii[rows], satellite_lowest_radius, self.bound_margin)
+
+                        if len(upper_bounds) >= top_k:
+                            prune_bound = min(prune_bound, np.partition(upper_bounds, top_k - 1)[top_k - 1])
+
+                        rows = rows[lower_bounds <= prune_bound + 1e-3]
+
+            with Span("CollisionRiskAssessor.SolveClosestApproaches"):
+                ranges = GetRangeMatrix(satellite_positions[s], debris_positions[rows])
+                closest_offsets, closest_distances = SolveClosestApproaches(satellite_satrec, [debris_satrecs[i] for i in rows], grid, ranges, candidates_per_object)
+
+            risk_assessments = []
+            for row, closest_offset, closest_distance in zip(rows, closest_offsets, closest_distances):
+
+                if np.isinf(closest_distance):
+                    risk_assessments.append(self.GetResult(debris_tles[row][0], float('inf'), None))
+                else:
+                    risk_assessments.append(self.GetResult(debris_tles[row][0], float(closest_distance), grid.GetTimeAtOffset(closest_offset)))
+
+            if top_k is not None:
+                risk_assessments = [assessment for assessment in heapq.nsmallest(top_k, risk_assessments, key=lambda x: (x['closest_approach_distance'], x['debris_id']))
+                                    if assessment['closest_approach_distance'] <= prune_bound]
+
+            fleet_assessments.append(risk_assessments)
+
+        return fleet_assessments
+
+    def assess_risk_for_single_debris(self,satellite_tle, debris_tle, timeinterval):
+
+        return self.assess_risk_for_debris_batch(satellite_tle, [debris_tle], self.GetTimeGrid(timeinterval))[0]
+
+    #states is the number of (objects x times x 3) arrays a chunk holds: 1 for positions, 2 for positions and velocities
+    def GetDebrisChunks(self, debris, grid, workers, states=1):
+
+        #Enough chunks to keep every worker busy, but small enough that a chunk's position array stays within the memory budget
+        objects_per_chunk = max(1, min(int(np.ceil(len(debris) / (workers * 4))),
+                                       self.chunk_memory_budget // (grid.count * 3 * 8 * states)))
+
+        return [debris[i:i + objects_per_chunk] for i in range(0, len(debris), objects_per_chunk)]
+
+    #Debris in the published catalog travel as row indices, the warm workers already hold their parsed Satrecs.
+    #Returns those row indices and the TLEs of the debris that are not in the catalog.
+    @staticmethod
+    def GetCatalogRows(debris_tles, CatalogKey=None):
+
+        catalog_index = GetCatalogIndex(CatalogKey) if CatalogKey is not None else None
+        if catalog_index is None:
+            return np.empty(0, dtype=np.int64), debris_tles
+
+        indices = np.array([catalog_index.get(debris_tle[0], -1) for debris_tle in debris_tles], dtype=np.int64)
+        uncatalogued_tles = [debris_tle for debris_tle, index in zip(debris_tles, indices) if index < 0]
+
+        return indices[indices >= 0], uncatalogued_tles
+
+    #Yields (objects processed, total objects, running top results) once before any chunk finishes and again every time one does.
+    #Only the closest max_results assessments are kept between chunks, debris that cannot make them are pruned inside the workers.
+    def AssessCollisionRiskIncremental(self, satellite_tle, debris_tles, TimeInterval, Ephemeris=None, CatalogKey=None):
+
+        grid = self.GetTimeGrid(TimeInterval, Ephemeris)
+        pool = WorkerPool.GetInstance()
+
+        indices, uncatalogued_tles = self.GetCatalogRows(debris_tles, CatalogKey)
+
+        tasks = [(AssessCatalogChunk, (self, CatalogKey, satellite_tle, chunk, grid, Ephemeris), len(chunk)) for chunk in self.GetDebrisChunks(indices, grid, pool.workers)]
+        tasks += [(AssessTLEChunk, (self, satellite_tle, chunk, grid, Ephemeris), len(chunk)) for chunk in self.GetDebrisChunks(uncatalogued_tles, grid, pool.workers)]
+        tasks.reverse()
+
+        processed = 0
+        risk_assessments_sorted = []
+        pending = {}
+
+        #Chunks are submitted a few at a time, so later chunks are pruned against the best results found so far
+        def SubmitChunks():
+            prune_bound = self.GetPruneBound(risk_assessments_sorted)
+            while tasks and len(pending) < pool.workers * 2:
+                function, arguments, size = tasks.pop()
+                pending[pool.Submit(function, *arguments, prune_bound)] = size
+
+        SubmitChunks()
+        yield processed, len(debris_tles), risk_assessments_sorted
+
+        while pending:
+            done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                processed += pending.pop(future)
+
+                #Ties are broken on the debris id, so the order does not depend on which chunk finished first
+                with Span("CollisionRiskAssessor.MergeResults"):
+                    risk_assessments_sorted = heapq.nsmallest(self.max_results, risk_assessments_sorted + future.result(),
+                                                              key=lambda x: (x['closest_approach_distance'], x['debris_id']))
+
+            SubmitChunks()
+            yield processed, len(debris_tles), risk_assessments_sorted
+
+    #Miss distance a debris object has to beat to enter the top results, infinite while there are fewer than max_results
+    def GetPruneBound(self, risk_assessments_sorted):
+
+        if len(risk_assessments_sorted) < self.max_results:
+            return float('inf')
+
+        return risk_assessments_sorted[self.max_results - 1]['closest_approach_distance']
+
+    #Fleet version of AssessCollisionRiskIncremental: one pass over the debris for every satellite, so screening a fleet costs about one propagation
+    #of the debris catalog instead of one per satellite. The running top results are a list per satellite, and so are the prune bounds.
+    def AssessFleetRiskIncremental(self, satellite_tles, debris_tles, TimeInterval, Ephemeris=None, CatalogKey=None):
+
+        grid = self.GetTimeGrid(TimeInterval, Ephemeris)
+        pool = WorkerPool.GetInstance()
+
+        indices, uncatalogued_tles = self.GetCatalogRows(debris_tles, CatalogKey)
+
+        #Fleet chunks hold the debris velocities as well as their positions
+        tasks = [(AssessFleetCatalogChunk, (self, CatalogKey, satellite_tles, chunk, grid, Ephemeris), len(chunk)) for chunk in self.GetDebrisChunks(indices, grid, pool.workers, 2)]
+        tasks += [(AssessFleetTLEChunk, (self, satellite_tles, chunk, grid, Ephemeris), len(chunk)) for chunk in self.GetDebrisChunks(uncatalogued_tles, grid, pool.workers, 2)]
+        tasks.reverse()
+
+        processed = 0
+        fleet_assessments_sorted = [[] for _ in satellite_tles]
+        pending = {}
+
+        def SubmitChunks():
+            prune_bounds = [self.GetPruneBound(risk_assessments_sorted) for risk_assessments_sorted in fleet_assessments_sorted]
+            while tasks and len(pending) < pool.workers * 2:
+                function, arguments, size = tasks.pop()
+                pending[pool.Submit(function, *arguments, prune_bounds)] = size
+
+        SubmitChunks()
+        yield processed, len(debris_tles), fleet_assessments_sorted
+
+        while pending:
+            done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                processed += pending.pop(future)
+
+                with Span("CollisionRiskAssessor.MergeResults"):
+                    fleet_assessments_sorted = [heapq.nsmallest(self.max_results, risk_assessments_sorted + chunk_assessments,
+                                                                key=lambda x: (x['closest_approach_distance'], x['debris_id']))
+                                                for risk_assessments_sorted, chunk_assessments in zip(fleet_assessments_sorted, future.result())]
+
+            SubmitChunks()
+            yield processed, len(debris_tles), fleet_assessments_sorted
+
+    #Returns the top results of every satellite of the fleet, in the order of satellite_tles
+    @Timed()
+    def AssessFleetRiskParallel(self, satellite_tles, debris_tles, TimeInterval, Ephemeris=None, CatalogKey=None, Progress=None):
+
+        fleet_assessments_sorted = [[] for _ in satellite_tles]
+
+        for processed, total, fleet_assessments_sorted in self.AssessFleetRiskIncremental(satellite_tles, debris_tles, TimeInterval, Ephemeris, CatalogKey):
+            if Progress is not None:
+                Progress(processed, total, fleet_assessments_sorted)
+
+        return fleet_assessments_sorted
+
+    #Progress, if given, is called with (objects processed, total objects, running top results) every time a chunk finishes
+    @Timed()
+    def AssessCollisionRiskParallel(self, satellite_tle, debris_tles, TimeInterval, Ephemeris=None, CatalogKey=None, Progress=None):
 
-        with ProcessPoolExecutor(max_workers=int(os.getenv('maxworkers'))) as executor:
-            futures = [executor.submit(self.assess_risk_for_single_debris, satellite_tle, debris_tle, TimeInterval) for debris_tle in debris_tles]
-            risk_assessments = [future.result() for future in futures]
+        risk_assessments_sorted = []
 
-            risk_assessments_sorted = sorted(risk_assessments, key=lambda x: x['closest_approach_distance'], reverse=False)[:50]
+        for processed, total, risk_assessments_sorted in self.AssessCollisionRiskIncremental(satellite_tle, debris_tles, TimeInterval, Ephemeris, CatalogKey):
+            if Progress is not None:
+                Progress(processed, total, risk_assessments_sorted)
 
         return risk_assessments_sorted
     
     @staticmethod
+    @Timed()
     def GetAssessmentJSON(RiskAssessments):
 
             risk_assessments_json = []
@@ -124,35 +444,37 @@ class CollisionRiskAssessor:
             return risk_assessments_json
     
     @staticmethod
-    def UpdateCZMLPostAssessment(DBReadConnection, SatelliteObject, RiskAssessmentsJSON):
+    @Timed()
+    def UpdateCZMLPostAssessment(DebrisTLEs, SatelliteObject, RiskAssessmentsJSON, StartTime, Ephemeris=None, Cache=None):
 
-        CZMLObjects = []
+        #The scene covers the assessment's window, StartTime being the start of its grid
+        StartTime = SatelliteObject.GetWindowStart(StartTime, Ephemeris)
 
-        satellite_czml_object = SatelliteObject.GetCZMLObject() 
+        #Markers in the post-assessment scene are drawn without an outline
+        outline_color = [0, 0, 0, 0]
 
-        CZMLObjects.append(satellite_czml_object)
+        CZMLObjects = [SatelliteObject]
 
         for debris in RiskAssessmentsJSON:
 
-            DebrisTLEObjects = DBReadConnection.GetDebrisTLEForObject(debris['Object'])
+            #TLEs loaded for the assessment, keyed by ObjectID
+            DebrisTLEObjects = DebrisTLEs[debris['Object']]
 
             debris_object = DebrisElement(DebrisTLEObjects,debris['Risk Severity'])
 
-            debris_czml_object = debris_object.GetCZMLObject()
+            CZMLObjects.append(debris_object)
 
-            CZMLObjects.append(debris_czml_object)
+        czml_packets = [SatelliteObject.GetCZMLDocumentPacket(StartTime, speed_multiplier=1)]
 
-        czml_obj = sczml(satellite_list=CZMLObjects, speed_multiplier=1)
-        
-        for key in list(czml_obj.satellites.keys()):
-            last_debris_key = key
-            czml_obj.satellites[last_debris_key].build_marker(rebuild=True,
-                        outlineColor=[0, 0, 0, 0],
-                        )
+        for czml_object in CZMLObjects:
 
-        czml_string = czml_obj.get_czml()
-        czml_python = json.loads(czml_string)
+            build = lambda czml_object=czml_object: czml_object.GetCZMLPacket(StartTime, Ephemeris, outline_color)
 
-        czml_obj.satellites.clear()
+            #Packets come from the CZML cache when one is given
+            if Cache is not None:
+                czml_packets.append(Cache.GetPacket(czml_object, StartTime, build, outline_color))
+            else:
+                czml_packets.append(build())
 
-        return czml_python
\ No newline at end of file
+        #The CZML document as bytes, ready to be embedded in the response as is
+        return CZMLWriter.GetDocument(czml_packets)
@@ -0,0 +1,186 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+import os
+import numpy as np
+from sgp4.api import SatrecArray
+
+from models.Propagation import TimeGrid
+from models.Catalog import Catalog
+from models.ClosestApproach import RefineMinima
+from models.RiskAssessment import CollisionRiskAssessor
+
+#Neighbouring cells of a cell, itself included
+_NEIGHBOUR_OFFSETS = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+
+#Pairs of points (i < j) closer than `distance` with at least one point in `primary` (every point when it is None), found by bucketing
+#the points into a grid of cells `distance` wide. Only points in the same or adjacent cells are compared, so the cost grows with
+#the number of points rather than its square.
+def FindClosePairs(positions, distance, primary=None):
+
+    points = np.flatnonzero(~np.isnan(positions).any(axis=1))
+    if len(points) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+    cells = np.floor(positions[points] / distance).astype(np.int64)
+    cells -= cells.min(axis=0) - 1 # one empty cell of padding on every side keeps neighbour keys unique
+    shape = cells.max(axis=0) + 2
+
+    keys = (cells[:, 0] * shape[1] + cells[:, 1]) * shape[2] + cells[:, 2]
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    #Neighbourhoods are only searched around the primary points
+    queries = np.arange(len(points)) if primary is None else np.flatnonzero(primary[points])
+    is_query = np.zeros(len(points), dtype=bool)
+    is_query[queries] = True
+
+    first_points = []
+    second_points = []
+    for dx, dy, dz in _NEIGHBOUR_OFFSETS:
+
+        neighbour_keys = keys[queries] + (dx * shape[1] + dy) * shape[2] + dz
+        lo = np.searchsorted(sorted_keys, neighbour_keys, side='left')
+        counts = np.searchsorted(sorted_keys, neighbour_keys, side='right') - lo
+
+        #Every query point paired with every point of the neighbouring cell
+        first = np.repeat(queries, counts)
+        second = order[np.repeat(lo, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)]
+
+        #A pair of two query points is found from both ends, it is kept once
+        keep = ~is_query[second] | (first < second)
+
+        first_points.append(first[keep])
+        second_points.append(second[keep])
+
+    first = points[np.concatenate(first_points)]
+    second = points[np.concatenate(second_points)]
+    distances = np.linalg.norm(positions[first] - positions[second], axis=1)
+    close = distances <= distance
+
+    first, second = np.minimum(first[close], second[close]), np.maximum(first[close], second[close])
+
+    return first, second, distances[close]
+
+#Lowest sample of every pass: consecutive samples of the same pair form one pass, a pair can have several passes in the window
+def _GetPassMinima(first, second, samples, distances):
+
+    order = np.lexsort((samples, second, first))
+    first, second, samples, distances = first[order], second[order], samples[order], distances[order]
+
+    new_pass = np.ones(len(first), dtype=bool)
+    new_pass[1:] = (first[1:] != first[:-1]) | (second[1:] != second[:-1]) | (samples[1:] != samples[:-1] + 1)
+    passes = np.cumsum(new_pass)
+
+    order = np.lexsort((distances, passes))
+    lowest = order[np.r_[True, passes[order][1:] != passes[order][:-1]]] if len(order) else order
+
+    return first[lowest], second[lowest], samples[lowest], distances[lowest]
+
+#Objects held by each screening worker: the catalog of the run and its parsed Satrecs
+_screening_catalog = {}
+
+def _InitScreeningWorker(catalog, primary):
+
+    _screening_catalog["satrecs"] = catalog.GetSatrecs()
+    _screening_catalog["array"] = SatrecArray(_screening_catalog["satrecs"])
+    _screening_catalog["primary"] = primary
+
+#Propagates every object over one block of the grid and returns the lowest sample of every pass closer than the screening distance
+def ScreenTimeBlock(grid, first_sample, screening_distance):
+
+    e, r, v = _screening_catalog["array"].sgp4(grid.jd, grid.fr)
+    r[e != 0] = np.nan
+    primary = _screening_catalog["primary"]
+
+    blocks = []
+    for sample in range(grid.count):
+        #Only pairs that involve at least one primary object (a payload) are of interest
+        first, second, distances = FindClosePairs(r[:, sample], screening_distance, primary)
+        blocks.append((first, second, np.full(len(first), first_sample + sample), distances))
+
+    return _GetPassMinima(*(np.concatenate(columns) for columns in zip(*blocks)))
+
+#Refines the lowest sample of each pass to the time of closest approach, one group of passes sharing a first object at a time
+def RefinePairs(grid, first, second, samples, distances):
+
+    satrecs = _screening_catalog["satrecs"]
+    refined_offsets = np.empty(len(first))
+    refined_distances = np.empty(len(first))
+
+    boundaries = np.flatnonzero(np.diff(first)) + 1
+    for group in np.split(np.arange(len(first)), boundaries):
+        if len(group) == 0:
+            continue
+
+        #RefineMinima reads coarse ranges at (row, column), only the sampled minima are needed
+        rows = np.arange(len(group))
+        ranges = np.full((len(group), grid.count), np.inf)
+        ranges[rows, samples[group]] = distances[group]
+
+        offsets, group_distances = RefineMinima(satrecs[first[group[0]]], [satrecs[i] for i in second[group]], grid, ranges, rows, samples[group])
+        refined_offsets[group] = offsets
+        refined_distances[group] = group_distances
+
+    return refined_offsets, refined_distances
+
+#All-vs-all conjunction screening of a catalog over the assessment window. Every pair with at least one payload that comes within
+#risk_boundary is refined to its time of closest approach and rated like a single-satellite risk assessment.
+class ConjunctionScreener:
+
+    def __init__(self):
+
+        self.assessor = CollisionRiskAssessor()
+        self.duration = self.assessor.duration
+        self.time_step = timedelta(seconds=float(os.getenv('screeningstepseconds', 20)))
+        self.max_relative_speed = 16.0 # km/s, head-on collision of two objects in low earth orbit
+        self.block_size = 90 # samples propagated per worker task
+        self.workers = int(os.getenv('maxworkers', os.cpu_count() or 1))
+
+    #Pairs closer than this at some sample may come within risk_boundary between samples
+    def GetScreeningDistance(self):
+
+        return self.assessor.risk_boundary + self.max_relative_speed * self.time_step.total_seconds() / 2
+
+    #TLEs are [OBJECT_ID, TLE_LINE0, TLE_LINE1, TLE_LINE2] rows, primary marks the payloads. Returns a list of conjunction dicts.
+    def Screen(self, tles, primary, start_time=None):
+
+        primary = np.asarray(primary, dtype=bool)
+        grid = TimeGrid(start_time or datetime.now(timezone.utc), self.duration, self.time_step)
+        screening_distance = self.GetScreeningDistance()
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_InitScreeningWorker, initargs=(Catalog.FromTLEs(tles), primary)) as executor:
+
+            #Time blocks are independent. A pass cut by a block boundary is simply refined from both sides.
+            futures = [executor.submit(ScreenTimeBlock, grid.GetSubgrid(np.arange(first, min(first + self.block_size, grid.count))), first, screening_distance)
+                       for first in range(0, grid.count, self.block_size)]
+            first, second, samples, distances = (np.concatenate(columns) for columns in zip(*[future.result() for future in futures]))
+
+            #Passes, sorted by their first object, are split evenly over the workers for refinement
+            order = np.argsort(first, kind='stable')
+            first, second, samples, distances = first[order], second[order], samples[order], distances[order]
+            chunks = [chunk for chunk in np.array_split(np.arange(len(first)), self.workers * 4) if len(chunk)]
+            futures = [executor.submit(RefinePairs, grid, first[chunk], second[chunk], samples[chunk], distances[chunk]) for chunk in chunks]
+            refined = [future.result() for future in futures]
+
+        offsets = np.concatenate([result[0] for result in refined]) if refined else np.empty(0)
+        distances = np.concatenate([result[1] for result in refined]) if refined else np.empty(0)
+
+        #Closest pass of every pair
+        order = np.lexsort((distances, second, first))
+        closest = order[np.r_[True, (first[order][1:] != first[order][:-1]) | (second[order][1:] != second[order][:-1])]] if len(order) else order
+
+        conjunctions = []
+        for i, j, offset, distance in zip(first[closest], second[closest], offsets[closest], distances[closest]):
+
+            if distance > self.assessor.risk_boundary:
+                continue
+
+            result = self.assessor.GetResult(tles[j][0], float(distance), grid.GetTimeAtOffset(offset))
+
+            #One row per payload in the pair, so each satellite finds its conjunctions under its own id
+            if primary[i]:
+                conjunctions.append(dict(result, satellite_id=tles[i][0]))
+            if primary[j]:
+                conjunctions.append(dict(result, satellite_id=tles[j][0], debris_id=tles[i][0]))
+
+        return conjunctions
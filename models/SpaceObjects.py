@@ -1,36 +1,91 @@
-from satellite_czml import satellite_czml as sczml
-from satellite_czml import satellite as sat
 from abc import ABC
 from datetime import datetime, timedelta, timezone
 from sgp4.api import Satrec
 from sgp4.conveniences import jday
 
+from models.CZMLWriter import CZMLWriter
+from models.Propagation import TimeGrid, PropagateSatrec
+
+#Elements are created per debris object on every assessment, so they only hold their id and TLE. The styling every element shares
+#lives on the class, the description is built when it is read and the Satrec is parsed the first time it is needed.
+#The CZML window is not part of an element: every request passes the start of its own window (see GetWindowStart).
 class DesignElementTemplate(ABC):
 
-    start_time = datetime.now(timezone.utc)
-    end_time = start_time + timedelta(days=1)
+    __slots__ = ('object_id', 'name', 'TLE', 'show_path', '_satrec')
+
+    window_duration = timedelta(days=1)
+
+    show_label = False
+    color = (250, 250, 255)
+    marker_scale = 20
+    speed_multiplier = 1
 
     def __init__(self):
         self.object_id = ""
-        self.show_path = False  
-        self.show_label = False  
-        self.use_default_image = False
-        self.color = [250,250,255]
-        self.marker_scale= 20
-        self.speed_multiplier = 1
+        self.show_path = False
         self.TLE = []
-        self.description = ""
         self.name = ""
+        self._satrec = None
 
-    def GetCZMLObject(self):
+    @property
+    def satrec(self):
 
-        self.spaceobj = sat(self.TLE, use_default_image=self.use_default_image, description=self.description,
-                             color = self.color, marker_scale=self.marker_scale,
-                            show_path=self.show_path,show_label=self.show_label,
-                            start_time=self.start_time, end_time=self.end_time)
+        if self._satrec is None:
+            self._satrec = Satrec.twoline2rv(*self.TLE[1:])
+
+        return self._satrec
+
+    @property
+    def description(self):
+
+        return ""
+
+    #Start of the CZML window of a request that starts at start_time (e.g. its assessment grid). It is floored to a whole CZML sample
+    #step, counted from the start of the ephemeris store when there is one, so the window can be sliced from the store and requests
+    #a few minutes apart share cached packets.
+    @staticmethod
+    def GetWindowStart(start_time, ephemeris=None):
+
+        sample_step = CZMLWriter(start_time, start_time).sample_step
+        origin = ephemeris.start_time if ephemeris is not None and ephemeris.start_time <= start_time else datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+        return origin + ((start_time - origin) // sample_step) * sample_step
+
+    @classmethod
+    def GetCZMLWriter(cls, start_time):
+
+        return CZMLWriter(start_time, start_time + cls.window_duration)
+
+    #Positions (km) of this object sampled every `step` over the writer's window and the extra samples the interpolation needs.
+    #They are sliced from the precomputed ephemeris when it covers them and propagated in one vectorized call otherwise.
+    def GetSampledPositions(self, writer, ephemeris=None):
+
+        if ephemeris is not None:
+            epoch, positions = ephemeris.GetSampledTrajectory(self.object_id, writer.start_time, writer.start_time + writer.GetSampleDuration(), writer.sample_step)
+            if positions is not None:
+                return epoch, positions
+
+        return writer.start_time, PropagateSatrec(self.satrec, TimeGrid(writer.start_time, writer.GetSampleDuration(), writer.sample_step))
+
+    #A single CZML packet for this object over the window starting at start_time, written straight to bytes
+    def GetCZMLPacket(self, start_time, ephemeris=None, outline_color=None):
+
+        writer = self.GetCZMLWriter(start_time)
+        epoch, positions = self.GetSampledPositions(writer, ephemeris)
+
+        return writer.GetObjectPacket(self, epoch, positions, outline_color)
+
+    #Everything that changes how the packet looks, used in CZML cache keys
+    def GetStyleKey(self, outline_color=None):
+
+        return (tuple(self.color), self.marker_scale, self.show_path, self.show_label, self.description, tuple(outline_color) if outline_color is not None else None)
+
+    #The document packet that precedes the object packets, matching satellite_czml's clock settings
+    @classmethod
+    def GetCZMLDocumentPacket(cls, start_time, speed_multiplier=1):
+
+        return cls.GetCZMLWriter(start_time).GetDocumentPacket(speed_multiplier)
 
-        return self.spaceobj
-    
     def getTLE(self):
 
         return self.TLE
@@ -50,6 +105,9 @@ class DesignElementTemplate(ABC):
         self.show_path = not self.show_path
 
 class SatelliteElement(DesignElementTemplate):
+
+    __slots__ = ()
+
     def __init__(self, TLE):
         super().__init__()
 
@@ -57,45 +115,56 @@ class SatelliteElement(DesignElementTemplate):
         self.name = TLE[1]
         self.TLE = TLE[1:]
         self.show_path = True  #overriding super
-        self.satrec = Satrec.twoline2rv(*self.TLE[1:])
-        self.description='Satellite ID: ' + self.object_id + '<br>Name: ' + self.name
 
-    def GetCZMLString(self):
+    @property
+    def description(self):
+
+        return 'Satellite ID: ' + self.object_id + '<br>Name: ' + self.name
+
+    #The CZML document of this satellite alone, over the window of a request that starts at start_time
+    def GetCZMLString(self, start_time, ephemeris=None, cache=None):
+
+        start_time = self.GetWindowStart(start_time, ephemeris)
+
+        #Packets come from the CZML cache when one is given
+        if cache is not None:
+            SatelliteCZMLPacket = cache.GetPacket(self, start_time, lambda: self.GetCZMLPacket(start_time, ephemeris))
+        else:
+            SatelliteCZMLPacket = self.GetCZMLPacket(start_time, ephemeris)
 
-        SatelliteCZMLObject = self.GetCZMLObject()
-        SatelliteList = [SatelliteCZMLObject]
-        CZMLObject = sczml(satellite_list=SatelliteList, speed_multiplier=self.speed_multiplier)
-        CZMLString = CZMLObject.get_czml()
-        LastKey = list(CZMLObject.satellites.keys())[-1]
-        CZMLObject.satellites.pop(LastKey, None)
+        return CZMLWriter.GetDocument([self.GetCZMLDocumentPacket(start_time, self.speed_multiplier), SatelliteCZMLPacket])
 
-        return CZMLString
+#Color and marker scale of debris by risk rating
+RISK_STYLES = {
+    "Critical": ((108, 52, 131), 16),
+    "High": ((169, 50, 38), 12),
+    "Medium": ((209, 200, 25), 8),
+    "Low": ((19, 141, 117), 6)
+}
 
 class DebrisElement(DesignElementTemplate):
+
+    __slots__ = ('risk',)
+
     def __init__(self, TLE, risk=None):
         super().__init__()
 
         self.object_id = TLE[0]
         self.TLE = TLE[1:]
         self.show_path = False  #overriding super
-        self.satrec = Satrec.twoline2rv(*self.TLE[1:])
-        self.description='Object ID: ' + self.object_id + '<br>Name: ' + self.name       
-
-        if risk == "Critical":
-            self.color = [108, 52, 131]
-            self.marker_scale= 16
-
-        elif risk == "High":
-            self.color = [169, 50, 38]
-            self.marker_scale= 12
-        
-        elif risk == "Medium":
-            self.color = [209, 200, 25]
-            self.marker_scale= 8
-        
-        elif risk == "Low":
-            self.color = [19, 141, 117]
-            self.marker_scale= 6
-        
-        else:
-            self.color = [250,250,255]
\ No newline at end of file
+        self.risk = risk
+
+    @property
+    def description(self):
+
+        return 'Object ID: ' + self.object_id + '<br>Name: ' + self.name
+
+    @property
+    def color(self):
+
+        return RISK_STYLES[self.risk][0] if self.risk in RISK_STYLES else DesignElementTemplate.color
+
+    @property
+    def marker_scale(self):
+
+        return RISK_STYLES[self.risk][1] if self.risk in RISK_STYLES else DesignElementTemplate.marker_scale
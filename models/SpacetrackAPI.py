@@ -1,6 +1,7 @@
 #Import Pip libraries
 import requests
 import os
+import json
 
 class SpaceTrackAPI:
 
@@ -8,6 +9,8 @@ class SpaceTrackAPI:
 
         self.APIHost = "https://www.space-track.org/"
         self.GPEndpoint = "basicspacedata/query/class/gp/decay_date/null-val/epoch/%3Enow-30/orderby/norad_cat_id/"
+        self.GPIncrementalEndpoint = "basicspacedata/query/class/gp/decay_date/null-val/epoch/%3E{since}/orderby/norad_cat_id/"
+        self.StreamChunkSize = 1024 * 1024 # characters read from the response at a time while streaming
         self.APIResponseFormat = "format/json"
         self.session = requests.Session()
         self.__apiusername = os.getenv('apiusername')
@@ -33,3 +36,65 @@ class SpaceTrackAPI:
             return response.json()
         else:
             raise Exception(f"Failed to fetch data. Status code: {response.status_code}")
+
+    #GP records streamed one at a time while the response downloads, instead of loading the whole catalog JSON into memory.
+    #With `since` (a datetime) only records whose epoch is later than it are requested.
+    def StreamResponse(self, since=None):
+        if since is None:
+            url = self.APIHost + self.GPEndpoint + self.APIResponseFormat
+        else:
+            url = self.APIHost + self.GPIncrementalEndpoint.format(since=since.strftime("%Y-%m-%dT%H:%M:%S")) + self.APIResponseFormat
+
+        with self.session.get(url, stream=True) as response:
+            if response.status_code != 200:
+                raise Exception(f"Failed to fetch data. Status code: {response.status_code}")
+
+            print("SpaceTrack API Auth Successful. Streaming Data.")
+            response.encoding = response.encoding or "utf-8"
+
+            yield from self.ParseJSONArray(response.iter_content(chunk_size=self.StreamChunkSize, decode_unicode=True))
+
+    #Incrementally decodes a JSON array arriving in text chunks, yielding each element as soon as it is complete
+    @staticmethod
+    def ParseJSONArray(chunks):
+        decoder = json.JSONDecoder()
+        buffer = ""
+        position = 0
+        started = False
+
+        for chunk in chunks:
+            buffer = buffer[position:] + chunk
+            position = 0
+
+            while True:
+                #Skip whitespace and the separators between elements
+                while position < len(buffer) and buffer[position] in " \t\r\n,":
+                    position += 1
+
+                if position == len(buffer):
+                    break
+
+                if not started:
+                    if buffer[position] != "[":
+                        raise Exception("Expected a JSON array from the Space-Track API.")
+                    started = True
+                    position += 1
+                    continue
+
+                if buffer[position] == "]":
+                    return
+
+                try:
+                    element, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    break #the element is not complete yet, wait for the next chunk
+
+                #In a valid array an element is always followed by ',' or ']', so one ending the buffer may still be cut short
+                if end == len(buffer):
+                    break
+
+                position = end
+                yield element
+
+        if buffer[position:].strip():
+            raise Exception("The Space-Track API response ended in the middle of the JSON array.")
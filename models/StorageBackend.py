@@ -0,0 +1,212 @@
+from dotenv import load_dotenv
+from datetime import datetime
+import os
+import sqlite3
+
+#Defining the connection string to the DB that can be utilized by multiple DB connection objects - reducing code duplication
+class DBConnectionString:
+
+    def __init__(self):
+
+        #Load Env Variables and Construct Connection String
+        load_dotenv()
+        self.__driver=os.getenv('driver')
+        self.__server = os.getenv('server')
+        self.__database = os.getenv('database')
+        self.__sqlusername = os.getenv('sqlusername')
+        self.__sqlpassword = os.getenv('sqlpassword')
+        self.__conn_string = 'DRIVER='+self.__driver+';SERVER=tcp:'+self.__server+';PORT=1433;DATABASE='+self.__database+';UID='+self.__sqlusername+';PWD='+ self.__sqlpassword + ';TrustServerCertificate=yes;'
+
+
+    def GetConnectionString(self):
+        return self.__conn_string
+
+#A storage backend opens DB-API connections and owns the few statements whose syntax differs between databases.
+#DBRead, DBReadPool and DBWrite only talk to their backend, so the same code runs against SQL Server or an embedded SQLite file.
+#
+#    Error             base exception of the driver
+#    connection_errors exceptions after which a connection is assumed dead and the query is retried
+#    in_list_size      largest IN-list a single query may carry
+
+#Remote SQL Server through pyodbc, the primary database
+class SQLServerBackend:
+
+    name = "sqlserver"
+    in_list_size = 1000 # well under SQL Server's 2100 parameter limit
+
+    def __init__(self):
+
+        #Imported here, so the embedded backend runs on machines without an ODBC driver manager
+        import pyodbc
+
+        self.pyodbc = pyodbc
+        self.conn_string = DBConnectionString().GetConnectionString()
+        self.Error = pyodbc.Error
+        self.connection_errors = (pyodbc.OperationalError, pyodbc.InterfaceError)
+
+    def Connect(self, timeout=0):
+
+        return self.pyodbc.connect(self.conn_string, timeout=timeout)
+
+    @staticmethod
+    def PrepareBulkInsert(cursor):
+
+        cursor.fast_executemany = True
+
+    @staticmethod
+    def TableExists(cursor, table):
+
+        cursor.execute("SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_NAME = ?", (table,))
+
+        return cursor.fetchone()[0] != 0
+
+    # Upper-cased names of the columns of a table
+    @staticmethod
+    def GetColumns(cursor, table):
+
+        cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ?", (table,))
+
+        return {row[0].upper() for row in cursor.fetchall()}
+
+    @staticmethod
+    def AddColumn(cursor, table, column, column_type):
+
+        cursor.execute(f"ALTER TABLE {table} ADD {column} {column_type};")
+
+    @staticmethod
+    def IndexExists(cursor, table, index):
+
+        cursor.execute("SELECT COUNT(*) FROM sys.indexes WHERE name = ? AND object_id = OBJECT_ID(?)", (index, table))
+
+        return cursor.fetchone()[0] != 0
+
+    # Inserts new objects and updates changed ones through a staging table and a MERGE
+    @staticmethod
+    def UpsertTelemetryRows(cursor, bulk_insert, rows):
+
+        cursor.execute("DROP TABLE IF EXISTS #SpaceObjectTelemetryStaging;")
+        cursor.execute("SELECT TOP 0 * INTO #SpaceObjectTelemetryStaging FROM SpaceObjectTelemetry;")
+
+        bulk_insert('''
+                INSERT INTO #SpaceObjectTelemetryStaging (CREATION_DATE, OBJECT_NAME, OBJECT_ID, NORAD_CAT_ID, OBJECT_TYPE, TLE_LINE0, TLE_LINE1, TLE_LINE2, PERIGEE, APOGEE, INCLINATION, EPOCH)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+
+        cursor.execute('''
+                MERGE SpaceObjectTelemetry AS target
+                USING #SpaceObjectTelemetryStaging AS source ON target.OBJECT_ID = source.OBJECT_ID
+                WHEN MATCHED THEN UPDATE SET
+                    CREATION_DATE = source.CREATION_DATE, OBJECT_NAME = source.OBJECT_NAME, NORAD_CAT_ID = source.NORAD_CAT_ID,
+                    OBJECT_TYPE = source.OBJECT_TYPE, TLE_LINE0 = source.TLE_LINE0, TLE_LINE1 = source.TLE_LINE1, TLE_LINE2 = source.TLE_LINE2,
+                    PERIGEE = source.PERIGEE, APOGEE = source.APOGEE, INCLINATION = source.INCLINATION, EPOCH = source.EPOCH
+                WHEN NOT MATCHED THEN INSERT (CREATION_DATE, OBJECT_NAME, OBJECT_ID, NORAD_CAT_ID, OBJECT_TYPE, TLE_LINE0, TLE_LINE1, TLE_LINE2, PERIGEE, APOGEE, INCLINATION, EPOCH)
+                    VALUES (source.CREATION_DATE, source.OBJECT_NAME, source.OBJECT_ID, source.NORAD_CAT_ID, source.OBJECT_TYPE, source.TLE_LINE0,
+                            source.TLE_LINE1, source.TLE_LINE2, source.PERIGEE, source.APOGEE, source.INCLINATION, source.EPOCH);
+                ''')
+
+        cursor.execute("DROP TABLE #SpaceObjectTelemetryStaging;")
+
+#DATETIME2 columns are stored as ISO 8601 text and read back as datetimes, like pyodbc returns them from SQL Server
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATETIME2", lambda value: datetime.fromisoformat(value.decode()))
+
+#Embedded SQLite file in WAL mode: readers never block the refresh and the refresh never blocks readers.
+#Used on its own to run the whole API on one machine, or as the co-located read replica of SQL Server (see dbreplica).
+class SQLiteBackend:
+
+    name = "sqlite"
+    in_list_size = 900 # older SQLite builds allow at most 999 parameters per statement
+    Error = sqlite3.Error
+    connection_errors = (sqlite3.OperationalError, sqlite3.InterfaceError)
+
+    def __init__(self, path):
+
+        self.path = path
+        self.busy_timeout = float(os.getenv('sqlitebusyseconds', 30))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        #WAL is a property of the database file, set once. The status tables SQL Server is provisioned with are created here.
+        conn = self.Connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("CREATE TABLE IF NOT EXISTS LastRefresh (Refresh_ID INTEGER PRIMARY KEY, Refresh_Time DATETIME2)")
+            conn.execute("INSERT OR IGNORE INTO LastRefresh (Refresh_ID, Refresh_Time) VALUES (1, NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS Status (Status_ID INTEGER PRIMARY KEY, Refresh_State INT)")
+            conn.execute("INSERT OR IGNORE INTO Status (Status_ID, Refresh_State) VALUES (1, 0)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    #Pooled connections move between request threads, one thread at a time
+    def Connect(self, timeout=None):
+
+        conn = sqlite3.connect(self.path, timeout=timeout or self.busy_timeout, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL;")
+
+        return conn
+
+    @staticmethod
+    def PrepareBulkInsert(cursor):
+
+        pass
+
+    @staticmethod
+    def TableExists(cursor, table):
+
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+
+        return cursor.fetchone()[0] != 0
+
+    # Upper-cased names of the columns of a table
+    @staticmethod
+    def GetColumns(cursor, table):
+
+        cursor.execute(f"PRAGMA table_info({table})")
+
+        return {row[1].upper() for row in cursor.fetchall()}
+
+    @staticmethod
+    def AddColumn(cursor, table, column, column_type):
+
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type};")
+
+    @staticmethod
+    def IndexExists(cursor, table, index):
+
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND name = ?", (table, index))
+
+        return cursor.fetchone()[0] != 0
+
+    # Inserts new objects and updates changed ones in one pass, no staging table needed
+    @staticmethod
+    def UpsertTelemetryRows(cursor, bulk_insert, rows):
+
+        bulk_insert('''
+                INSERT INTO SpaceObjectTelemetry (CREATION_DATE, OBJECT_NAME, OBJECT_ID, NORAD_CAT_ID, OBJECT_TYPE, TLE_LINE0, TLE_LINE1, TLE_LINE2, PERIGEE, APOGEE, INCLINATION, EPOCH)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (OBJECT_ID) DO UPDATE SET
+                    CREATION_DATE = excluded.CREATION_DATE, OBJECT_NAME = excluded.OBJECT_NAME, NORAD_CAT_ID = excluded.NORAD_CAT_ID,
+                    OBJECT_TYPE = excluded.OBJECT_TYPE, TLE_LINE0 = excluded.TLE_LINE0, TLE_LINE1 = excluded.TLE_LINE1, TLE_LINE2 = excluded.TLE_LINE2,
+                    PERIGEE = excluded.PERIGEE, APOGEE = excluded.APOGEE, INCLINATION = excluded.INCLINATION, EPOCH = excluded.EPOCH
+                ''', rows)
+
+#Backend of the primary database, chosen by dbbackend: sqlserver (default) or sqlite, the file at sqlitepath
+def GetStorageBackend():
+
+    load_dotenv()
+
+    if os.getenv('dbbackend', 'sqlserver') == 'sqlite':
+        return SQLiteBackend(os.getenv('sqlitepath', 'eosca.db'))
+
+    return SQLServerBackend()
+
+#Local read replica at dbreplica, if one is configured. DBRead serves from it and every refresh of the primary is copied into it.
+def GetReplicaBackend():
+
+    load_dotenv()
+
+    path = os.getenv('dbreplica')
+
+    return SQLiteBackend(path) if path else None
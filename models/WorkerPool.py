@@ -0,0 +1,137 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import os
+import threading
+import time
+
+from models.EphemerisStore import LoadCatalog
+from models.Metrics import Registry, Observe
+
+#Catalog held by each worker process: one catalog version, with its Satrecs parsed
+_worker_catalog = {"key": None, "catalog": None}
+
+def _GetWorkerCatalog(key):
+
+    #Parsed once per catalog version, every later chunk for the same version reuses the Satrecs
+    if _worker_catalog["key"] != key:
+        catalog = LoadCatalog(key)
+        if catalog is None:
+            raise Exception(f"Catalog version {key} has not been published.")
+
+        _worker_catalog["key"] = None
+        catalog.GetSatrecs()
+        _worker_catalog["catalog"] = catalog
+        _worker_catalog["key"] = key
+
+    return _worker_catalog["catalog"]
+
+#Runs an assessment over a chunk of catalog row indices inside a worker. Only debris that can still make the assessor's top results
+#(closer than prune_bound, the current k-th best miss distance) are returned.
+def AssessCatalogChunk(assessor, key, satellite_tle, indices, grid, ephemeris, prune_bound=float('inf')):
+
+    catalog = _GetWorkerCatalog(key)
+    debris_tles = catalog.GetTLEs(indices)
+    debris_satrecs = catalog.GetSatrecs(indices)
+
+    return assessor.assess_risk_for_debris_batch(satellite_tle, debris_tles, grid, assessor.candidates_per_object, ephemeris, debris_satrecs,
+                                                 assessor.max_results, prune_bound)
+
+#Runs an assessment over a chunk of raw TLE rows inside a worker, for objects that are not in a published catalog
+def AssessTLEChunk(assessor, satellite_tle, debris_tles, grid, ephemeris, prune_bound=float('inf')):
+
+    return assessor.assess_risk_for_debris_batch(satellite_tle, debris_tles, grid, assessor.candidates_per_object, ephemeris, None,
+                                                 assessor.max_results, prune_bound)
+
+#Fleet versions of the two above: every debris object of the chunk is propagated once and assessed against each satellite of the fleet.
+#The catalog already carries the debris perigee and apogee the per-satellite altitude bands are checked against.
+def AssessFleetCatalogChunk(assessor, key, satellite_tles, indices, grid, ephemeris, prune_bounds=None):
+
+    catalog = _GetWorkerCatalog(key)
+    debris_tles = catalog.GetTLEs(indices)
+    debris_satrecs = catalog.GetSatrecs(indices)
+
+    return assessor.assess_fleet_for_debris_batch(satellite_tles, debris_tles, grid, assessor.candidates_per_object, ephemeris, debris_satrecs,
+                                                  (catalog.perigee[indices], catalog.apogee[indices]), assessor.max_results, prune_bounds)
+
+def AssessFleetTLEChunk(assessor, satellite_tles, debris_tles, grid, ephemeris, prune_bounds=None):
+
+    return assessor.assess_fleet_for_debris_batch(satellite_tles, debris_tles, grid, assessor.candidates_per_object, ephemeris, None,
+                                                  None, assessor.max_results, prune_bounds)
+
+#Runs a task inside a worker and returns its result with the metrics the worker recorded while running it
+def _RunTask(submitted, function, *args):
+
+    Observe("eosca_worker_pool_wait_seconds", max(0.0, time.time() - submitted))
+
+    return function(*args), Registry.Drain()
+
+#App-wide process pool, started once and sized by maxworkers. Singleton like DBWrite, but obtained through GetInstance so every caller shares it.
+class WorkerPool:
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+
+        if WorkerPool._instance != None:
+            raise Exception("%s is a Singleton object. It can only be instantiated once." % type(self).__name__)
+        else:
+            WorkerPool._instance = self
+
+        self.workers = int(os.getenv('maxworkers'))
+        self._lock = threading.Lock()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    @classmethod
+    def GetInstance(cls):
+
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls()
+
+        return cls._instance
+
+    #Returns a future of function(*args). The worker's metrics are merged into this process's registry when the task completes.
+    def Submit(self, function, *args):
+
+        executor = self.executor
+
+        try:
+            task = executor.submit(_RunTask, time.time(), function, *args)
+
+        #A worker that died takes the executor down with it, start a fresh one (once, however many threads noticed) and carry on
+        except BrokenProcessPool:
+            with self._lock:
+                if self.executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+            task = self.executor.submit(_RunTask, time.time(), function, *args)
+
+        future = Future()
+
+        def Unwrap(task):
+            try:
+                result, metrics = task.result()
+            except BaseException as e:
+                future.set_exception(e)
+                return
+
+            Registry.Merge(metrics)
+            future.set_result(result)
+
+        task.add_done_callback(Unwrap)
+
+        return future
+
+    #Replaces the executor with one of a different size, e.g. to compare worker counts. Work already submitted finishes first.
+    def Resize(self, workers):
+
+        with self._lock:
+            self.executor.shutdown(wait=True)
+            self.workers = workers
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def Shutdown(self):
+
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,37 @@
+#Catalog-wide conjunction screening for EOSCA. Run it from the command line after each telemetry refresh:
+#
+#    python screening.py
+#
+#Every payload and debris object in SpaceObjectTelemetry is screened against every other one over the next 24 hours,
+#and the conjunctions of each satellite are written to the Conjunctions table.
+
+import sys
+import time
+
+from models.DBConnection import DBRead, DBWrite, DBConnTest
+from models.Screening import ConjunctionScreener
+
+def RunScreening():
+
+    DBReadConnection = DBRead()
+
+    #The catalog version the conjunctions are computed for
+    RefreshTime = DBReadConnection.GetLastDataRefreshTime()
+    TLEs, Payloads = DBReadConnection.GetScreeningObjects()
+
+    print(f"Screening {len(TLEs)} objects ({sum(Payloads)} payloads)...")
+    StartTime = time.monotonic()
+
+    Conjunctions = ConjunctionScreener().Screen(TLEs, Payloads)
+
+    print(f"Found {len(Conjunctions)} conjunctions in {time.monotonic() - StartTime:.1f} s.")
+
+    DBWrite().ReplaceConjunctions(Conjunctions, RefreshTime)
+
+if __name__ == '__main__':
+
+    if not DBConnTest().TestConnection():
+        print("Unable to connect to the database after multiple retries. Please check the database status.")
+        sys.exit(1)
+
+    RunScreening()
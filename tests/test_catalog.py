@@ -0,0 +1,20 @@
+#Catalog arrays built from TLE rows
+import pickle
+
+from benchmarks.catalog import GenerateCatalog, GetTLERows
+from models.Catalog import Catalog
+
+#Names whose UTF-8 encoding is longer than their character count keep every character
+def test_non_ascii_names_round_trip(tmp_path):
+
+    tles = GetTLERows(GenerateCatalog(5, 1))
+    tles[0][1] = "0 ÉTOILE-Ωμέγα 衛星"
+    tles[1][1] = "0 Ä"
+    catalog = Catalog.FromTLEs(tles)
+
+    assert catalog.names.itemsize == max(len(tle[1].encode()) for tle in tles)
+    assert catalog.GetTLEs() == tles
+
+    catalog.Save(str(tmp_path / "catalog.npz"))
+    assert Catalog.Load(str(tmp_path / "catalog.npz")).GetTLEs() == tles
+    assert pickle.loads(pickle.dumps(catalog)).GetTLEs() == tles
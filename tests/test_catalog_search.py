@@ -0,0 +1,110 @@
+#Catalog listing search: matching, filters and keyset pagination
+import pytest
+
+from models.CatalogSearch import CatalogSearchIndex
+
+#OBJECT_ID, OBJECT_NAME, OBJECT_TYPE, PERIGEE, APOGEE, NORAD_CAT_ID
+ROWS = [
+    ("1998-067A", "ISS (ZARYA)", "PAYLOAD", 413.0, 422.0, 25544),
+    ("1999-025DZ", "FENGYUN 1C DEB", "DEBRIS", 750.0, 900.0, 29228),
+    ("2019-029A", "STARLINK-24", "PAYLOAD", 540.0, 550.0, 44235),
+    ("2019-029B", "Starlink-61", "PAYLOAD", 545.0, 555.0, 44236),
+    ("2020-001C", "FALCON 9 R/B", "ROCKET BODY", 200.0, 1200.0, 44913),
+    ("2021-002D", "COSMOS 2251 DEB", "DEBRIS", None, None, 33764),
+    ("2022-010A", "NOAA 21", "PAYLOAD", 810.0, 830.0, 54234)
+]
+
+@pytest.fixture(scope="module")
+def index():
+
+    return CatalogSearchIndex(ROWS)
+
+def GetIDs(items):
+
+    return [item["ObjectID"] for item in items]
+
+#Prefix search matches the start of the name, OBJECT_ID or NORAD id, case-insensitively, in listing order
+@pytest.mark.parametrize("query, expected", [
+    ("starlink", ["2019-029A", "2019-029B"]),
+    ("STAR", ["2019-029A", "2019-029B"]),
+    ("2019-029", ["2019-029A", "2019-029B"]),
+    ("4423", ["2019-029A", "2019-029B"]),
+    ("deb", []),
+    ("x", [])
+])
+def test_prefix_match(index, query, expected):
+
+    items, cursor, total = index.Search(query)
+
+    assert GetIDs(items) == expected
+    assert cursor is None and total == len(expected)
+
+#Substring search matches anywhere in those fields
+@pytest.mark.parametrize("query, expected", [
+    ("deb", ["1999-025DZ", "2021-002D"]),
+    ("r/b", ["2020-001C"]),
+    ("-029", ["2019-029A", "2019-029B"]),
+    ("423", ["2019-029A", "2019-029B", "2022-010A"])
+])
+def test_substring_match(index, query, expected):
+
+    assert GetIDs(index.Search(query, substring=True)[0]) == expected
+
+#The band keeps objects whose perigee/apogee shell overlaps it, and objects without a shell only when no band is asked for
+@pytest.mark.parametrize("band, expected", [
+    ((None, None), [row[0] for row in ROWS]),
+    ((500, 600), ["2019-029A", "2019-029B", "2020-001C"]),
+    ((551, None), ["1999-025DZ", "2019-029B", "2020-001C", "2022-010A"]),
+    ((None, 420), ["1998-067A", "2020-001C"]),
+    ((1201, None), [])
+])
+def test_altitude_band(index, band, expected):
+
+    assert GetIDs(index.Search(min_altitude=band[0], max_altitude=band[1], limit=100)[0]) == expected
+
+def test_filters_combine(index):
+
+    items, cursor, total = index.Search("2019", object_types=["PAYLOAD"], min_altitude=548, fields=("ObjectID", "Perigee"))
+
+    assert items == [{"ObjectID": "2019-029A", "Perigee": 540.0}, {"ObjectID": "2019-029B", "Perigee": 545.0}]
+    assert GetIDs(index.Search(object_types=["DEBRIS", "ROCKET BODY"])[0]) == ["1999-025DZ", "2020-001C", "2021-002D"]
+
+def GetAllPages(index, limit, **filters):
+
+    pages = []
+    cursor = None
+    while True:
+        items, cursor, total = index.Search(limit=limit, cursor=cursor, **filters)
+        pages.append(GetIDs(items))
+        if cursor is None:
+            return pages
+
+#Pages follow each other without repeats or gaps, and the last one has no cursor
+@pytest.mark.parametrize("limit", [1, 2, 3, 7, 50])
+def test_pagination(index, limit):
+
+    pages = GetAllPages(index, limit)
+
+    assert sum(pages, []) == [row[0] for row in ROWS]
+    assert all(len(page) == limit for page in pages[:-1])
+    assert GetAllPages(index, limit, object_types=["PAYLOAD"]) == GetAllPages(CatalogSearchIndex([row for row in ROWS if row[2] == "PAYLOAD"]), limit)
+
+#A refresh between two pages rebuilds the index: objects still in the catalog are neither repeated nor skipped,
+#objects removed from it are not served and objects added after the cursor are
+@pytest.mark.parametrize("split", range(1, len(ROWS)))
+def test_pagination_across_rebuild(index, split):
+
+    first, cursor, _ = index.Search(limit=split)
+    served = GetIDs(first)
+
+    #The object the cursor points at and one after it leave the catalog, one object is added before the cursor and one after it
+    removed = {served[-1], ROWS[split + 1][0] if split + 1 < len(ROWS) else None}
+    added = [("1990-001A", "EARLY", "PAYLOAD", 500.0, 510.0, 20001), ("2030-001A", "LATE", "PAYLOAD", 500.0, 510.0, 90001)]
+    rebuilt = CatalogSearchIndex(sorted([row for row in ROWS if row[0] not in removed] + added))
+
+    while cursor is not None:
+        items, cursor, _ = rebuilt.Search(limit=2, cursor=cursor)
+        served += GetIDs(items)
+
+    assert len(served) == len(set(served))
+    assert served == [row[0] for row in ROWS[:split]] + [row[0] for row in ROWS[split:] if row[0] not in removed] + ["2030-001A"]
@@ -0,0 +1,52 @@
+#Closest approaches from the coarse scan and refinement, checked against a brute-force scan at 1 s resolution
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import pytest
+
+from benchmarks.catalog import GenerateCatalog, GetTLERows
+from models.Propagation import TimeGrid, ParseSatrec, PropagateSatrecs, GetRangeMatrix
+from models.ClosestApproach import SolveClosestApproaches
+from models.RiskAssessment import CollisionRiskAssessor
+
+START = datetime(2026, 10, 1, 6, tzinfo=timezone.utc)
+DURATION = timedelta(hours=6)
+
+#Satellite and the debris that pass within a few hundred km of it, from a synthetic catalog
+@pytest.fixture(scope="module")
+def encounters():
+
+    tles = GetTLERows(GenerateCatalog(3000, 3, epoch=datetime(2026, 10, 1, tzinfo=timezone.utc)))
+    satellite = ParseSatrec(tles[4])
+    debris = [ParseSatrec(tle) for i, tle in enumerate(tles) if i != 4]
+
+    grid = TimeGrid(START, DURATION, timedelta(minutes=1))
+    coarse = GetRangeMatrix(PropagateSatrecs([satellite], grid)[0], PropagateSatrecs(debris, grid)).min(axis=1)
+
+    return satellite, [debris[i] for i in np.flatnonzero(coarse < 300)]
+
+def BruteForceMissDistances(satellite, debris, start, duration):
+
+    grid = TimeGrid(start, duration, timedelta(seconds=1))
+
+    return GetRangeMatrix(PropagateSatrecs([satellite], grid)[0], PropagateSatrecs(debris, grid)).min(axis=1)
+
+#The request's start second moves the coarse samples, the refined miss distances must not move with them. The assessor's own
+#candidates_per_object is used, so its default is covered as well.
+@pytest.mark.parametrize("start_second", [0, 7, 21, 42, 49])
+def test_refined_miss_distances_match_brute_force(encounters, start_second):
+
+    satellite, debris = encounters
+    start = START + timedelta(seconds=start_second)
+    duration = DURATION - timedelta(minutes=1)
+
+    grid = TimeGrid(start, duration, timedelta(minutes=1))
+    ranges = GetRangeMatrix(PropagateSatrecs([satellite], grid)[0], PropagateSatrecs(debris, grid))
+    offsets, distances = SolveClosestApproaches(satellite, debris, grid, ranges, CollisionRiskAssessor().candidates_per_object)
+
+    #A 1 s scan can only overestimate the true minimum: its closest sample is at most half a second, or 8 km at a 16 km/s relative speed,
+    #along the straight-line pass from it
+    expected = BruteForceMissDistances(satellite, debris, start, duration + timedelta(seconds=1))
+
+    assert len(debris) > 0
+    assert np.all(distances <= expected + 1e-3)
+    assert np.all(distances >= np.sqrt(np.maximum(expected**2 - 8.0**2, 0.0)) - 1e-3)
@@ -0,0 +1,56 @@
+#CZML packets over a request's window, sliced from an ephemeris store built after the process started
+from datetime import datetime, timedelta, timezone
+import json
+
+import numpy as np
+import pytest
+
+from benchmarks.catalog import GenerateCatalog, GetTLERows
+from models.Catalog import Catalog
+from models.CZMLCache import CZMLCache
+from models.EphemerisStore import EphemerisStore, OpenEphemerisStore
+from models.SpaceObjects import SatelliteElement
+
+EPOCH = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+
+    tles = GetTLERows(GenerateCatalog(50, 1, epoch=EPOCH))
+    directory = str(tmp_path_factory.mktemp("ephemeris"))
+
+    EphemerisStore(directory).Build("v1", Catalog.FromTLEs(tles), start_time=EPOCH + timedelta(hours=6))
+
+    return tles, OpenEphemerisStore("v1", directory)
+
+#The window starts with the request, never before the store, so its positions are sliced from the store instead of propagated
+@pytest.mark.parametrize("minutes", [0, 3, 17, 600])
+def test_window_is_sliced_from_the_store(store, minutes):
+
+    tles, ephemeris = store
+    element = SatelliteElement(tles[0])
+    start_time = element.GetWindowStart(ephemeris.start_time + timedelta(minutes=minutes, seconds=20), ephemeris)
+
+    assert ephemeris.start_time <= start_time <= ephemeris.start_time + timedelta(minutes=minutes, seconds=20)
+
+    writer = element.GetCZMLWriter(start_time)
+    epoch, positions = ephemeris.GetSampledTrajectory(element.object_id, writer.start_time, writer.start_time + writer.GetSampleDuration(), writer.sample_step)
+    assert epoch == start_time
+
+    #Same samples as propagating the window, to the store's float32 precision. The slice also includes the sample at the end.
+    sliced_epoch, sliced = element.GetSampledPositions(writer, ephemeris)
+    propagated_epoch, propagated = element.GetSampledPositions(writer)
+    assert sliced_epoch == propagated_epoch == start_time
+    assert np.allclose(sliced[:len(propagated)], propagated, atol=0.01)
+
+def test_satellite_document_covers_the_request_window(store):
+
+    tles, ephemeris = store
+    element = SatelliteElement(tles[0])
+    request_time = ephemeris.start_time + timedelta(hours=2, minutes=7)
+
+    document = json.loads(element.GetCZMLString(request_time, ephemeris, CZMLCache()))
+    clock_start = datetime.fromisoformat(document[0]["clock"]["interval"].split("/")[0])
+
+    assert request_time - timedelta(minutes=5) < clock_start <= request_time
+    assert document[1]["position"]["epoch"] == clock_start.isoformat()
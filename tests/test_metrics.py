@@ -0,0 +1,27 @@
+#Metrics recorded inside forked worker processes
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import pytest
+
+from models.Metrics import Registry, Increment
+
+def CountInWorker():
+
+    Increment("eosca_sgp4_calls_total", 3)
+
+    return Registry.Drain()
+
+#A worker forked while a request thread of the parent holds the registry lock must not inherit it locked
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs the fork start method")
+def test_worker_forked_while_registry_is_locked():
+
+    Increment("eosca_sgp4_calls_total", 5)
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork")) as executor:
+        with Registry._lock:
+            future = executor.submit(CountInWorker)
+            histograms, counters = future.result(timeout=30)
+
+    #The parent's counts stay in the parent
+    assert counters == {("eosca_sgp4_calls_total", ()): 3}
@@ -0,0 +1,80 @@
+#Single-flight coalescing and failure handling of the assessment result cache
+import threading
+
+import pytest
+
+from models.ResultCache import ResultCache
+
+#Identical requests that arrive while a result is being computed wait for it instead of computing it again
+def test_identical_requests_are_coalesced():
+
+    cache = ResultCache(max_entries=8, ttl=60, bucket_seconds=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(10)
+        return "result"
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.GetOrCompute("key", compute)))
+    owner.start()
+    started.wait(10)
+
+    waiters = [threading.Thread(target=lambda: results.append(cache.GetOrCompute("key", compute))) for _ in range(4)]
+    for waiter in waiters:
+        waiter.start()
+
+    #Every waiter has found the in-flight computation before it finishes
+    while cache.GetStats()["coalesced"] < len(waiters):
+        threading.Event().wait(0.01)
+    release.set()
+
+    for thread in [owner] + waiters:
+        thread.join(10)
+
+    assert results == ["result"] * 5
+    assert len(calls) == 1
+    assert cache.GetStats() == {"results": 1, "in_flight": 0, "hits": 0, "misses": 1, "coalesced": 4}
+    assert cache.GetOrCompute("key", compute) == "result"
+    assert cache.GetStats()["hits"] == 1
+
+#A failed computation is raised to the request that ran it and to every waiter, and the next request computes it again
+@pytest.mark.parametrize("error", [ValueError("failed"), KeyboardInterrupt()])
+def test_failures_are_not_cached(error):
+
+    cache = ResultCache(max_entries=8, ttl=60, bucket_seconds=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(10)
+        raise error
+
+    raised = []
+    def request():
+        try:
+            cache.GetOrCompute("key", fail)
+        except BaseException as e:
+            raised.append(e)
+
+    owner = threading.Thread(target=request)
+    owner.start()
+    started.wait(10)
+    waiter = threading.Thread(target=request)
+    waiter.start()
+    while cache.GetStats()["coalesced"] < 1:
+        threading.Event().wait(0.01)
+    release.set()
+
+    owner.join(10)
+    waiter.join(10)
+
+    assert not waiter.is_alive()
+    assert raised == [error, error]
+    assert cache.GetStats()["in_flight"] == 0
+    assert cache.GetOrCompute("key", lambda: "result") == "result"
@@ -0,0 +1,100 @@
+#Streaming decode of the Space-Track GP response
+import json
+
+import pytest
+
+from models.SpacetrackAPI import SpaceTrackAPI
+
+RECORDS = [
+    {"OBJECT_ID": "1998-067A", "OBJECT_NAME": "ISS (ZARYA)", "NORAD_CAT_ID": "25544", "PERIGEE": "413.1"},
+    {"OBJECT_ID": "2019-029B", "OBJECT_NAME": "STARLINK \"TEST\" [A], {B}", "NORAD_CAT_ID": "44235", "PERIGEE": None},
+    {"OBJECT_ID": "2020-001C", "OBJECT_NAME": "DEB ]\\[ ,}{ \\\"", "NORAD_CAT_ID": "44913", "TLE": ["1 ", "2 "]},
+    {"OBJECT_ID": "2021-002D", "OBJECT_NAME": "ÉTOILE Ωμέγα 衛星", "NORAD_CAT_ID": "47000", "PERIGEE": 550}
+]
+
+def Split(text, size):
+
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+#Every split of the document, down to one character per chunk, yields the same records: elements cut across chunks,
+#and quotes, brackets and commas inside strings, never end an element early
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 64, 10 ** 6])
+def test_records_split_across_chunks(indent, size):
+
+    text = json.dumps(RECORDS, indent=indent, ensure_ascii=False)
+
+    assert list(SpaceTrackAPI.ParseJSONArray(Split(text, size))) == RECORDS
+
+#A number at the end of a chunk may continue in the next one
+def test_number_split_across_chunks():
+
+    assert list(SpaceTrackAPI.ParseJSONArray(["[12", "34, 5", "6]"])) == [1234, 56]
+
+def test_empty_array():
+
+    assert list(SpaceTrackAPI.ParseJSONArray([" [", " ", "]"])) == []
+
+def test_truncated_response():
+
+    text = json.dumps(RECORDS)
+
+    with pytest.raises(Exception, match="ended in the middle"):
+        list(SpaceTrackAPI.ParseJSONArray(Split(text[:-20], 5)))
+
+def test_not_an_array():
+
+    with pytest.raises(Exception, match="Expected a JSON array"):
+        list(SpaceTrackAPI.ParseJSONArray(['{"error": "login"}']))
+
+class FakeResponse:
+
+    def __init__(self, text, status_code=200):
+
+        self.text = text
+        self.status_code = status_code
+        self.encoding = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *args):
+
+        return False
+
+    def iter_content(self, chunk_size, decode_unicode):
+
+        assert decode_unicode and self.encoding == "utf-8"
+        return iter(Split(self.text, chunk_size))
+
+class FakeSession:
+
+    def __init__(self, response):
+
+        self.response = response
+        self.urls = []
+
+    def get(self, url, stream=False):
+
+        assert stream
+        self.urls.append(url)
+        return self.response
+
+#StreamResponse feeds the decoder the response in chunks of StreamChunkSize characters
+def test_stream_response_in_chunks():
+
+    api = SpaceTrackAPI(immediate_auth=False)
+    api.session = FakeSession(FakeResponse(json.dumps(RECORDS, ensure_ascii=False)))
+    api.StreamChunkSize = 5
+
+    assert list(api.StreamResponse()) == RECORDS
+    assert api.session.urls == [api.APIHost + api.GPEndpoint + api.APIResponseFormat]
+
+def test_stream_response_error():
+
+    api = SpaceTrackAPI(immediate_auth=False)
+    api.session = FakeSession(FakeResponse("", status_code=500))
+
+    with pytest.raises(Exception, match="Status code: 500"):
+        list(api.StreamResponse())